@@ -0,0 +1,159 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, List, Optional
+
+from app.core.config import settings
+from app.core.tracing import run_traced
+
+
+class ServerBusyError(Exception):
+    """Thread havuzu ve bekleme kuyruğu doluyken gelen isteklerde fırlatılır (HTTP 503)."""
+
+
+class CancelToken:
+    """
+    İstemci bağlantıyı kapattığında havuzda çalışan işi durdurmak için kullanılır.
+    Veritabanı katmanı çalışan sorgunun kesme (interrupt/cancel) fonksiyonunu
+    on_cancel ile kaydeder; cancel() çağrılınca bunlar başka bir thread'den çalıştırılır.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._callbacks: List[Callable[[], Any]] = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], Any]) -> Iterator[None]:
+        """Blok süresince iptal edilirse 'callback' çağrılır (zaten iptal edildiyse hemen)."""
+        with self._lock:
+            self._callbacks.append(callback)
+            cancelled = self.cancelled
+        if cancelled:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._callbacks.remove(callback)
+
+
+# İsteğe ait iptal belirteci; run() contextvars'ı kopyaladığı için havuzdaki thread'lerde de görünür
+current_cancel_token: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar(
+    "current_cancel_token", default=None
+)
+
+
+class BlockingExecutor:
+    """
+    Engelleyici (blocking) işleri -LLM çağrısı, SQLAlchemy sorguları, pandas/openpyxl-
+    event loop dışında, sınırlı bir thread havuzunda çalıştırır.
+
+    Aynı anda en fazla 'max_workers' iş çalışır, 'max_queue' kadarı sırada bekler.
+    Sıra da doluysa yeni işler beklemeye alınmaz, ServerBusyError ile reddedilir
+    (backpressure); böylece yavaş bir LLM çağrısı tüm worker'ı kilitleyemez.
+    """
+
+    # run_until_disconnect'in istemci bağlantısını kontrol etme aralığı (saniye)
+    DISCONNECT_POLL_SECONDS = 0.5
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="datachat-worker")
+        self._pending = 0  # Çalışan + sırada bekleyen iş sayısı (sadece event loop'tan değişir)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def ensure_capacity(self):
+        """Havuz ve bekleme kuyruğu doluysa ServerBusyError fırlatır."""
+        if self._pending >= self.max_workers + self.max_queue:
+            raise ServerBusyError("Sunucu şu anda çok yoğun, lütfen birazdan tekrar deneyin.")
+
+    async def run(self, func: Callable[..., Any], *args, reject_when_busy: bool = True, **kwargs) -> Any:
+        """
+        Fonksiyonu havuzda çalıştırır ve sonucunu bekler.
+        reject_when_busy=False ise havuz dolu olsa da sıraya girilir (örn. yarım kalmış bir
+        export akışının devamı reddedilmemeli).
+        """
+        if reject_when_busy:
+            self.ensure_capacity()
+
+        self._pending += 1
+        try:
+            # contextvars (örn. istek bazlı izleme bilgisi) thread'e taşınsın
+            context = contextvars.copy_context()
+            call = functools.partial(context.run, run_traced, func, *args, **kwargs)
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        finally:
+            self._pending -= 1
+
+    async def run_until_disconnect(
+        self, is_disconnected: Callable[[], Awaitable[bool]], func: Callable[..., Any], *args, **kwargs
+    ) -> Any:
+        """
+        run() gibi, ancak iş sürerken istemcinin bağlantıyı kapatıp kapatmadığı kontrol
+        edilir; kapattıysa işin CancelToken'ı iptal edilir (çalışan sorgu durdurulur).
+        """
+        token = CancelToken()
+        current_cancel_token.set(token)
+        task = asyncio.ensure_future(self.run(func, *args, **kwargs))
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=self.DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if not token.cancelled and await is_disconnected():
+                token.cancel()
+
+    async def iterate(self, iterator: Iterator[Any]) -> AsyncIterator[Any]:
+        """
+        Senkron bir generator'ı (örn. export akışı) her adımı havuzda çalışacak şekilde
+        async generator'a çevirir. Akış başladıktan sonra reddedilmez, sıraya girer.
+        """
+        sentinel = object()
+        try:
+            while True:
+                item = await self.run(next, iterator, sentinel, reject_when_busy=False)
+                if item is sentinel:
+                    break
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                await self.run(close, reject_when_busy=False)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Singleton Instance (Uygulama boyunca tek bir havuz olacak)
+blocking_pool = BlockingExecutor(settings.WORKER_THREADS, settings.WORKER_QUEUE_SIZE)
+
+
+# Spekülatif SQL adaylarının havuzu: adaylar blocking_pool'da çalışan bir isteğin içinden
+# başlatıldığı için aynı havuzda beklemeleri kilitlenmeye yol açabilir; ayrı ve sınırlı tutulur
+candidate_pool = ThreadPoolExecutor(max_workers=settings.SPECULATIVE_MAX_PARALLEL, thread_name_prefix="datachat-candidate")
@@ -1,4 +1,5 @@
 import os
+from typing import List
 from dotenv import load_dotenv
 
 # .env dosyasını ortam değişkenlerine yükle
@@ -21,6 +22,28 @@ class Settings:
     # Ajanın yaratıcılık seviyesi (SQL için 0'a yakın olmalı)
     TEMPERATURE = 0.0
     
+    # LLM istemcisi: boşsa Groq kullanılır. "modül:Sınıf" verilirse o sınıf autogen
+    # ModelClient olarak kaydedilir (örn. benchmarks.fake_llm:ScriptedLLMClient ile API
+    # anahtarı olmadan, betiklenmiş cevaplarla ölçüm yapmak için)
+    LLM_CLIENT = os.getenv("LLM_CLIENT", "")
+    
+    # Tek bir LLM isteğinin (sistem mesajı + soru) token bütçesi; aşılırsa sohbet geçmişi
+    # ve şemadaki kategorik değer ipuçları kısaltılır
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+    
+    # Şemada bu sayıdan fazla tablo varsa prompt'a sadece soruyla en ilgili (BM25) bu kadar
+    # tablo ve JOIN komşuları konur; şema blokları SCHEMA_TOKEN_BUDGET'ı aşmaz. Bilinmeyen
+    # tablo/kolon hatasında seçim her denemede genişletilir.
+    SCHEMA_PRUNE_TOP_K = int(os.getenv("SCHEMA_PRUNE_TOP_K", "8"))
+    SCHEMA_TOKEN_BUDGET = int(os.getenv("SCHEMA_TOKEN_BUDGET", "3000"))
+    
+    # Spekülatif SQL adayları: 1'den büyükse ilk denemede bu kadar aday sorgu (farklı yaklaşım
+    # ipuçları ve sıcaklıkla) aynı anda istenir, her biri paralel doğrulanıp çalıştırılır; ilk
+    # başarılı olan döner, diğerleri iptal edilir. 1: kapalı. İstek bazında /chat'e "candidates"
+    # ile verilebilir (en fazla SPECULATIVE_MAX_CANDIDATES)
+    SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "1"))
+    SPECULATIVE_MAX_CANDIDATES = int(os.getenv("SPECULATIVE_MAX_CANDIDATES", "4"))
+    
     # 3. Uygulama Bilgileri
     PROJECT_NAME = "DataChat Enterprise"
     VERSION = "1.0.0"
@@ -29,12 +52,141 @@ class Settings:
     # Kullanıcının yanlışlıkla tüm veritabanını çekmesini önlemek için varsayılan limit
     DEFAULT_SQL_LIMIT = 100
     
-    # Veritabanı sorgusu için zaman aşımı (saniye)
-    SQL_EXECUTION_TIMEOUT = 30
+    # Veritabanı sorgusu için zaman aşımı (saniye); aşan sorgu motor seviyesinde durdurulur
+    # ve hata LLM'e "daha ucuz bir sorgu yaz" diye geri beslenir. 0: sınırsız
+    SQL_EXECUTION_TIMEOUT = float(os.getenv("SQL_EXECUTION_TIMEOUT", "30"))
+    
+    # Çalıştırmadan önce EXPLAIN ile maliyet kontrolü: tahmini taranan satır sayısı bu sınırı
+    # aşan sorgular (örn. kartezyen çarpım) çalıştırılmaz, plan özetiyle LLM'e geri gönderilir
+    COST_GUARD_ENABLED = os.getenv("COST_GUARD_ENABLED", "true").lower() == "true"
+    COST_GUARD_MAX_ROWS = int(os.getenv("COST_GUARD_MAX_ROWS", "50000000"))
+    # Bu kadar satırdan büyük tabloların tam taraması maliyet raporunda işaretlenir
+    COST_GUARD_LARGE_TABLE_ROWS = int(os.getenv("COST_GUARD_LARGE_TABLE_ROWS", "1000000"))
+    
+    # Doğrulanmış SQL (AST) önbelleğinin kayıt sayısı; aynı SQL tekrar parse edilmez
+    SQL_AST_CACHE_SIZE = int(os.getenv("SQL_AST_CACHE_SIZE", "512"))
+    
+    # Sayfalı sonuçlar (/result/page): varsayılan ve en büyük sayfa boyutu
+    RESULT_PAGE_SIZE = int(os.getenv("RESULT_PAGE_SIZE", "100"))
+    RESULT_PAGE_SIZE_MAX = int(os.getenv("RESULT_PAGE_SIZE_MAX", "1000"))
+    
+    # Oturum başına açık tutulan en fazla sayfa imleci ve kullanılmayan imlecin ömrü (saniye)
+    RESULT_MAX_OPEN_CURSORS = int(os.getenv("RESULT_MAX_OPEN_CURSORS", "8"))
+    RESULT_CURSOR_TTL_SECONDS = int(os.getenv("RESULT_CURSOR_TTL_SECONDS", "300"))
+    
+    # Grafik verisi: yanıttaki seri en fazla bu kadar noktaya indirgenir (çizgi: LTTB,
+    # çubuk/pasta: ilk N kategori + "Diğer", geniş sayısal seri: histogram)
+    CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+    CHART_MAX_CATEGORIES = int(os.getenv("CHART_MAX_CATEGORIES", "20"))
+    CHART_HISTOGRAM_BINS = int(os.getenv("CHART_HISTOGRAM_BINS", "30"))
+    # İsteğe bağlı (varsayılan kapalı): sonuç LIMIT'e takıldıysa grafik için sorgu LIMIT'siz tekrar
+    # çalıştırılıp en fazla bu kadar satır okunur (grafik ilk sayfayla değil tüm sonuçla çizilir).
+    # İkinci çalıştırma da maliyet kontrolünden geçer. 0: kapalı, grafik alınan satırlardan çizilir
+    CHART_SOURCE_MAX_ROWS = int(os.getenv("CHART_SOURCE_MAX_ROWS", "0"))
+    
+    # Dışa aktarımda (export) izin verilen en fazla satır (sohbetteki LIMIT 100'den bağımsız)
+    EXPORT_MAX_ROWS = int(os.getenv("EXPORT_MAX_ROWS", "1000000"))
+    
+    # Dışa aktarımda veritabanından tek seferde çekilen satır sayısı (Parquet row group boyutu)
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))
+    
+    # Dosya yüklemelerinin yazıldığı bellek içi motor: "sqlite" veya "duckdb"
+    # DuckDB kolon tabanlı ve çok çekirdeklidir; GROUP BY/aggregate sorgularında çok daha hızlıdır.
+    UPLOAD_ENGINE = os.getenv("UPLOAD_ENGINE", "sqlite")
+    
+    # Dosya yükleme: CSV'nin tek seferde okunan satır sayısı ve INSERT başına satır sayısı
+    INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "50000"))
+    INGEST_INSERT_BATCH = int(os.getenv("INGEST_INSERT_BATCH", "5000"))
+    
+    # 5. Eşzamanlılık
+    # Engelleyici işlerin (LLM, SQL, pandas) çalıştığı thread sayısı ve bekleme kuyruğu.
+    # Kuyruk da doluysa yeni istekler 503 ile reddedilir.
+    WORKER_THREADS = int(os.getenv("WORKER_THREADS", "16"))
+    WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "64"))
+    
+    # Tüm isteklerin spekülatif SQL adaylarının çalıştığı ayrı havuzun thread sayısı; fazlası sırada bekler
+    SPECULATIVE_MAX_PARALLEL = int(os.getenv("SPECULATIVE_MAX_PARALLEL", "8"))
+    
+    # Uzak veritabanı bağlantı havuzu (aynı adrese bağlanan oturumlar tek havuzu paylaşır)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    
+    # 6. Oturum Yönetimi
+    # Bu kadar saniye kullanılmayan oturum (ve bellek içi DB'si) otomatik kapatılır
+    SESSION_IDLE_TTL_SECONDS = int(os.getenv("SESSION_IDLE_TTL_SECONDS", "3600"))
+    
+    # Tüm oturumların toplam bellek bütçesi; aşılırsa en eski erişilen oturumlar kapatılır
+    SESSION_MEMORY_BUDGET_BYTES = int(os.getenv("SESSION_MEMORY_BUDGET_BYTES", str(1024 * 1024 * 1024)))
+    
+    # Arka plan temizliğinin çalışma aralığı (saniye)
+    SESSION_SWEEP_INTERVAL_SECONDS = int(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+    
+    # Oturum başına saklanan en fazla sohbet geçmişi kaydı
+    SESSION_HISTORY_LIMIT = int(os.getenv("SESSION_HISTORY_LIMIT", "20"))
 
-# Ayarları başlat
-settings = Settings()
+    # Oturum deposu: "memory" (tek worker), "sqlite" (aynı makinedeki worker'lar) veya "redis".
+    # Paylaşılan depolarda yüklenen dosyalar SESSION_DATA_DIR altına yazılır ve her worker
+    # tarafından salt okunur açılır; böylece uvicorn --workers N ile çalıştırılabilir.
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+    SESSION_BACKEND_URL = os.getenv("SESSION_BACKEND_URL", "")  # SQLite dosya yolu veya redis:// adresi
+    SESSION_DATA_DIR = os.getenv("SESSION_DATA_DIR", "data/sessions")
 
-# Basit bir güvenlik kontrolü (Docker loglarında görünmesi için)
-if not settings.GROQ_API_KEY:
-    print("⚠️  UYARI: GROQ_API_KEY ortam değişkeni bulunamadı! Uygulama düzgün çalışmayabilir.")
\ No newline at end of file
+    # 7. Önbellekler
+    # Oturum başına sorgu sonucu önbelleğinin bellek bütçesi (byte)
+    RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+    # Soru -> SQL önbelleği: tekrar eden sorularda LLM çağrısı atlanır
+    SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1024"))
+    SQL_CACHE_TTL_SECONDS = int(os.getenv("SQL_CACHE_TTL_SECONDS", "3600"))
+    # 0: sadece birebir (normalize edilmiş) eşleşme; örn. 0.92: benzer soruları da eşle
+    SQL_CACHE_SIMILARITY = float(os.getenv("SQL_CACHE_SIMILARITY", "0"))
+
+    # 8. İndeks Danışmanı
+    # Yüklenen SQLite tablolarına, oturumun sorgu geçmişinde sık filtrelenen/birleştirilen/
+    # gruplanan kolonlar için arka planda indeks eklenir
+    INDEX_ADVISOR_ENABLED = os.getenv("INDEX_ADVISOR_ENABLED", "true").lower() == "true"
+    # Bir adayın indekslenmesi için geçmişte en az kaç farklı sorguda geçmesi gerekir
+    INDEX_ADVISOR_MIN_USES = int(os.getenv("INDEX_ADVISOR_MIN_USES", "2"))
+    # Bütçe: oturum başına en fazla indeks sayısı ve indekslerin toplam boyutu (byte)
+    INDEX_ADVISOR_MAX_INDEXES = int(os.getenv("INDEX_ADVISOR_MAX_INDEXES", "5"))
+    INDEX_ADVISOR_MAX_BYTES = int(os.getenv("INDEX_ADVISOR_MAX_BYTES", str(64 * 1024 * 1024)))
+    # Ölçülen hızlanma (önce/sonra) bundan azsa indeks geri alınır
+    INDEX_ADVISOR_MIN_SPEEDUP = float(os.getenv("INDEX_ADVISOR_MIN_SPEEDUP", "1.2"))
+    # Bir çalışmanın toplam süre bütçesi (saniye): danışman oturum kilidini tuttuğu için
+    # sonraki istekler en fazla bu kadar bekler; bitmeyen adaylar bir sonraki çalışmaya kalır
+    INDEX_ADVISOR_TIME_BUDGET = float(os.getenv("INDEX_ADVISOR_TIME_BUDGET", "2"))
+
+    # 9. İzleme (Tracing / Metrics)
+    # Yanıtlara aşama sürelerini içeren Server-Timing başlığı eklenir (tarayıcı DevTools'ta görünür)
+    SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+    # Yavaş istekler için örneklemeli profil (varsayılan kapalı); SLOW_REQUEST_SECONDS'tan uzun
+    # süren isteklerin en sık yığınları loglanır ve /debug/slow-requests'te son PROFILE_KEEP tanesi görünür
+    PROFILE_SLOW_REQUESTS = os.getenv("PROFILE_SLOW_REQUESTS", "false").lower() == "true"
+    SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "2"))
+    PROFILE_SAMPLE_INTERVAL_MS = int(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10"))
+    PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+    # 10. Açılış (Cold Start)
+    # Uygulama açılırken arka planda autogen/pandas yüklenir, LLM istemcisi kurulur ve örnek bir
+    # SQL ayrıştırılır; ilk istek bu tek seferlik maliyetleri ödemez. Port dinlemeyi geciktirmez.
+    WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+    def validate(self) -> List[str]:
+        """
+        Ayarların uyarıları. Import sırasında değil, uygulama açılırken (lifespan) kontrol
+        edilir; betikler ve ölçümler config'i içe aktarınca uyarı basılmaz.
+        """
+        warnings = []
+        if not self.GROQ_API_KEY and not self.LLM_CLIENT:
+            warnings.append("GROQ_API_KEY ortam değişkeni bulunamadı! Uygulama düzgün çalışmayabilir.")
+        if self.SPECULATIVE_CANDIDATES > self.SPECULATIVE_MAX_CANDIDATES:
+            warnings.append(
+                f"SPECULATIVE_CANDIDATES ({self.SPECULATIVE_CANDIDATES}) SPECULATIVE_MAX_CANDIDATES "
+                f"({self.SPECULATIVE_MAX_CANDIDATES}) ile sınırlanacak."
+            )
+        return warnings
+
+# Ayarları başlat
+settings = Settings()
\ No newline at end of file
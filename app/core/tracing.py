@@ -0,0 +1,241 @@
+import contextvars
+import logging
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STAGE_SECONDS = metrics.histogram(
+    "datachat_stage_seconds", "İstek aşamalarının süresi (schema, llm, validate, cost, execute, chart, ...)",
+    labels=("stage",),
+)
+REQUEST_SECONDS = metrics.histogram(
+    "datachat_http_request_seconds", "HTTP isteklerinin toplam süresi", labels=("method", "route", "status"),
+)
+
+
+class RequestTrace:
+    """
+    Tek bir isteğin aşama süreleri. Aşamalar (span) sırasıyla kaydedilir; yeniden denemelerde
+    aynı aşama deneme numarasıyla tekrar görünür. Havuzdaki thread'ler aynı nesneye yazar
+    (contextvars run() ile kopyalanır, nesne paylaşılır).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, Optional[str]]] = []
+        self._lock = threading.Lock()
+        # Profil için: isteğin işini yürüten thread'ler ve örneklenen yığınlar
+        self.threads: Counter = Counter()
+        self.samples: Counter = Counter()
+
+    def add(self, name: str, seconds: float, desc: Optional[str] = None):
+        with self._lock:
+            self.spans.append((name, seconds, desc))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Server-Timing başlığı: her aşama 'ad;dur=ms;desc="..."', en sonda toplam."""
+        with self._lock:
+            spans = list(self.spans)
+        entries = []
+        for name, seconds, desc in spans:
+            entry = f"{name};dur={seconds * 1000:.1f}"
+            if desc:
+                entry += f';desc="{desc}"'
+            entries.append(entry)
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+    def breakdown(self) -> Dict[str, float]:
+        """Aşama -> toplam süre (ms), yeniden denemeler toplanır."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for name, seconds, _ in self.spans:
+                totals[name] = totals.get(name, 0.0) + seconds * 1000
+        return {name: round(value, 1) for name, value in totals.items()}
+
+
+# İsteğin izi; TracingMiddleware kurar, blocking_pool thread'lerinde de görünür
+current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def span(name: str, attempt: Optional[int] = None, candidate: Optional[int] = None) -> Iterator[None]:
+    """
+    Bloğun süresini ölçer: aşama histogramına ve (varsa) isteğin izine yazar.
+    attempt / candidate verilirse Server-Timing açıklamasına deneme ve aday numarası eklenir.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        trace = current_trace.get()
+        if trace is not None:
+            desc = " ".join(
+                part for part in (
+                    f"deneme {attempt}" if attempt else "",
+                    f"aday {candidate + 1}" if candidate is not None else "",
+                ) if part
+            )
+            trace.add(name, elapsed, desc or None)
+
+
+def run_traced(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Havuzdaki bir thread'de çalışan işi isteğin izine bağlar (yavaş istek profili
+    bu thread'in yığınını örnekleyebilsin diye).
+    """
+    trace = current_trace.get()
+    if trace is None or not profiler.enabled:
+        return func(*args, **kwargs)
+    ident = threading.get_ident()
+    with trace._lock:
+        trace.threads[ident] += 1
+    try:
+        return func(*args, **kwargs)
+    finally:
+        with trace._lock:
+            trace.threads[ident] -= 1
+            if trace.threads[ident] <= 0:
+                del trace.threads[ident]
+
+
+class SlowRequestProfiler:
+    """
+    İsteğe bağlı (PROFILE_SLOW_REQUESTS) örneklemeli profilci: izlenen isteklerin işini
+    yürüten thread'lerin yığınları PROFILE_SAMPLE_INTERVAL_MS aralıkla tek bir arka plan
+    thread'inden okunur. SLOW_REQUEST_SECONDS'tan uzun süren isteklerin en sık yığınları
+    (flamegraph'ın 'collapsed' biçiminde) loglanır ve son PROFILE_KEEP tanesi saklanır.
+    Kapalıyken hiçbir maliyeti yoktur.
+    """
+
+    # Yığın başına en fazla çerçeve ve raporlanan en sık yığın sayısı
+    MAX_DEPTH = 48
+    TOP_STACKS = 15
+
+    def __init__(self):
+        self.enabled = settings.PROFILE_SLOW_REQUESTS
+        self.interval = settings.PROFILE_SAMPLE_INTERVAL_MS / 1000
+        self.recent: deque = deque(maxlen=settings.PROFILE_KEEP)
+        self._active: Dict[int, RequestTrace] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, trace: RequestTrace):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._active[id(trace)] = trace
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._sample_loop, name="datachat-profiler", daemon=True)
+                self._thread.start()
+
+    @classmethod
+    def _stack(cls, frame) -> str:
+        names = []
+        while frame is not None and len(names) < cls.MAX_DEPTH:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                traces = list(self._active.values())
+            if not traces:
+                continue
+            frames = sys._current_frames()
+            for trace in traces:
+                with trace._lock:
+                    idents = list(trace.threads)
+                for ident in idents:
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stack = self._stack(frame)
+                        with trace._lock:
+                            trace.samples[stack] += 1
+
+    def finish(self, trace: RequestTrace, method: str, path: str, status: int, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._active.pop(id(trace), None)
+        if seconds < settings.SLOW_REQUEST_SECONDS:
+            return
+        with trace._lock:
+            samples = Counter(trace.samples)
+        report = {
+            "method": method,
+            "path": path,
+            "status": status,
+            "seconds": round(seconds, 3),
+            "stages_ms": trace.breakdown(),
+            "samples": sum(samples.values()),
+            "sample_interval_ms": settings.PROFILE_SAMPLE_INTERVAL_MS,
+            "stacks": [[stack, count] for stack, count in samples.most_common(self.TOP_STACKS)],
+        }
+        self.recent.append(report)
+        logger.warning(
+            "Yavaş istek: %s %s %.2fs aşamalar=%s örnek=%d en sık yığın=%s",
+            method, path, seconds, report["stages_ms"], report["samples"],
+            ";".join(report["stacks"][0][0].split(";")[-3:]) if report["stacks"] else "-",
+        )
+
+
+# Singleton Instance
+profiler = SlowRequestProfiler()
+
+
+class TracingMiddleware:
+    """
+    Her HTTP isteği için bir RequestTrace açar; yanıt başlıklarına Server-Timing ekler
+    ve istek süresini histograma yazar. Akış (SSE, export) yanıtlarında başlık ilk
+    bayttan önce gönderildiği için sadece o ana kadarki aşamaları içerir.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = current_trace.set(trace)
+        profiler.start(trace)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.SERVER_TIMING_ENABLED:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            seconds = trace.elapsed()
+            # Etiket kardinalitesi sınırlı kalsın diye ham yol değil eşleşen route şablonu kullanılır
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(seconds, method=scope["method"], route=route, status=str(status))
+            profiler.finish(trace, scope["method"], route, status, seconds)
+            current_trace.reset(token)
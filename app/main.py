@@ -1,16 +1,47 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Header, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Header, Depends, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional
-import io
-import pandas as pd
+from typing import Awaitable, Callable, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import json
 
-from app.services.db_service import DatabaseManager
+from app.core.config import settings
+from app.core.concurrency import blocking_pool, candidate_pool, CancelToken, current_cancel_token, ServerBusyError
+from app.core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
+from app.core.tracing import TracingMiddleware, current_trace, profiler, span
+from app.services.columnar import ARROW_STREAM, arrow_table, encode_payload, negotiate
+from app.services.db_service import DatabaseManager, IngestProgress
+from app.services.engine_registry import engine_registry
+from app.services.export_service import ExportService
+from app.services.pagination import PageCursorError
 from app.services.llm_service import SQLAgentService
+from app.services.security import SQLValidator
 from app.services.session_manager import session_store
+from app.services.sql_cache import sql_cache
+from app.services.warmup import warm_up
 
-app = FastAPI(title="DataChat API", version="1.2 - Enterprise")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Basit bir güvenlik kontrolü (Docker loglarında görünmesi için)
+    for warning in settings.validate():
+        print(f"⚠️  UYARI: {warning}")
+    # Kullanılmayan oturumları temizleyen arka plan görevini başlat
+    session_store.start_sweeper()
+    # İlk isteğin tek seferlik maliyetleri (autogen, LLM istemcisi, sqlglot, pandas) arka planda
+    # ödenir; uygulama bu sırada istek kabul etmeye başlar
+    app.state.warmup = None
+    if settings.WARMUP_ON_STARTUP:
+        app.state.warmup = asyncio.ensure_future(blocking_pool.run(warm_up, reject_when_busy=False))
+    yield
+    if app.state.warmup is not None and not app.state.warmup.done():
+        app.state.warmup.cancel()
+    session_store.stop_sweeper()
+    blocking_pool.shutdown()
+    candidate_pool.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(title="DataChat API", version="1.2 - Enterprise", lifespan=lifespan)
 # --- CORS AYARLARI (YENİ) ---
 app.add_middleware(
     CORSMiddleware,
@@ -18,7 +49,97 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # GET, POST, DELETE vb. hepsi serbest
     allow_headers=["*"],  # Tüm başlıklara (Header) izin ver
+    expose_headers=["Server-Timing"],  # Tarayıcıdaki istemci aşama sürelerini okuyabilsin
 )
+# Aşama süreleri (Server-Timing) ve istek süresi histogramı
+app.add_middleware(TracingMiddleware)
+
+# --- Metrikler (/metrics her okunduğunda hesaplananlar) ---
+
+def _session_gauge(key: str):
+    return lambda: {(): session_store.stats()[key]}
+
+metrics.gauge("datachat_active_sessions", "Bu worker'daki aktif oturum sayısı", collect=_session_gauge("active_sessions"))
+metrics.gauge("datachat_session_memory_bytes", "Oturum veritabanlarının toplam bellek kullanımı", collect=_session_gauge("memory_bytes"))
+metrics.gauge("datachat_worker_pool_pending", "Thread havuzunda çalışan + sırada bekleyen iş sayısı", collect=lambda: {(): blocking_pool.pending})
+
+@app.exception_handler(ServerBusyError)
+async def server_busy_handler(request: Request, exc: ServerBusyError):
+    """Thread havuzu doluysa isteği bekletmek yerine hemen 503 döndür (backpressure)."""
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+# --- Yanıt formatı ---
+
+def _render_result(payload: dict, accept: Optional[str]):
+    """
+    Sorgu sonucu içeren yanıtı Accept başlığına göre hazırlar:
+        application/json (varsayılan): satır tabanlı 'data' listesi
+        application/vnd.datachat.columnar+json: kolon adları bir kez, tipli diziler ve NULL maskeleri
+        application/vnd.apache.arrow.stream: Arrow IPC (yanıtın geri kalanı şema metadata'sında)
+    """
+    media_type = negotiate(accept)
+    table = arrow_table(payload) if media_type == ARROW_STREAM else None
+    if table is None:
+        return encode_payload(payload, media_type)
+    try:
+        content = table.to_ipc(encode_payload(payload, media_type))
+    except ValueError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    return Response(content=content, media_type=ARROW_STREAM)
+
+class SessionStreamingResponse(StreamingResponse):
+    """
+    Oturum kilidi tutularak akıtılan yanıt. Kilit, body generator'ının finally'sinde değil
+    yanıtın sonunda bırakılır: istemci gövde başlamadan ayrılırsa (örn. başlıklar
+    gönderilirken bağlantı koparsa) generator hiç çalışmaz ve finally'si de çalışmaz.
+    'cleanup' (örn. imleci kapatmak) kilit bırakılmadan önce her durumda çağrılır.
+    """
+
+    def __init__(self, content, session, cleanup: Optional[Callable[[], Awaitable[None]]] = None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.session = session
+        self.cleanup = cleanup
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                if self.cleanup is not None:
+                    await self.cleanup()
+            finally:
+                self.session.lock.release()
+
+# --- Arka plan işleri ---
+
+# Çalışan arka plan görevleri (referans tutulmazsa görev bitmeden toplanabilir)
+_background_tasks: set = set()
+
+def _schedule_index_advisor(session):
+    """
+    Sohbet geçmişine yeni sorgu eklendiyse indeks danışmanını arka planda çalıştırır.
+    Veritabanına yazdığı için oturum kilidini bekler; yani bu yanıtı geciktirmez ama
+    oturumdaki diğer isteklerle sırayla çalışır: sonraki istek en fazla
+    INDEX_ADVISOR_TIME_BUDGET kadar bekler.
+    """
+    manager = session.db_manager
+    if manager is None or not manager.index_advisor.due(session.history):
+        return
+
+    async def advise():
+        async with session.lock:
+            # Bu arada veri kaynağı değiştiyse veya oturum kapandıysa eski veritabanına dokunma
+            if session.db_manager is not manager or manager.closed:
+                return
+            try:
+                await blocking_pool.run(manager.index_advisor.run, list(session.history))
+            except Exception as e:
+                print(f"Uyarı: İndeks danışmanı çalışamadı: {e}")
+
+    task = asyncio.create_task(advise())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
 # --- Bağımlılıklar (Dependencies) ---
 
 async def get_session_id(x_session_id: Optional[str] = Header(None)) -> str:
@@ -31,6 +152,24 @@ async def get_session_id(x_session_id: Optional[str] = Header(None)) -> str:
         raise HTTPException(status_code=401, detail="Geçersiz veya süresi dolmuş oturum.")
     return x_session_id
 
+def _get_session(session_id: str):
+    """Oturumu getirir; dependency'den sonra süpürücü tarafından kapatılmışsa 401."""
+    session = session_store.get_session(session_id)
+    if session is None:
+        raise HTTPException(status_code=401, detail="Geçersiz veya süresi dolmuş oturum.")
+    return session
+
+def _ensure_open(session, db_manager: Optional[DatabaseManager] = None):
+    """
+    Oturum kilidi alındıktan sonra çağrılır. Kilit beklenirken oturum süpürücü tarafından
+    kapatılmış veya (yeni yüklemeyle) istek başında alınan veritabanı yöneticisi kapatılmış
+    olabilir; dispose edilmiş veritabanına dokunmadan istek temiz bir hatayla biter.
+    """
+    if session.closed:
+        raise HTTPException(status_code=401, detail="Geçersiz veya süresi dolmuş oturum.")
+    if db_manager is not None and db_manager.closed:
+        raise HTTPException(status_code=409, detail="Veri kaynağı istek beklerken değişti, lütfen tekrar deneyin.")
+
 def get_db_manager(session_id: str = Depends(get_session_id)) -> DatabaseManager:
     """Geçerli oturumun veritabanı yöneticisini getirir."""
     session = session_store.get_session(session_id)
@@ -42,10 +181,16 @@ def get_db_manager(session_id: str = Depends(get_session_id)) -> DatabaseManager
 
 class QueryRequest(BaseModel):
     question: str
+    chart_points: Optional[int] = None # Grafik serisinin en fazla nokta sayısı (örn. grafik genişliği px)
+    candidates: Optional[int] = None # Paralel istenen aday SQL sayısı (boşsa SPECULATIVE_CANDIDATES)
+
+class PageRequest(BaseModel):
+    sql: str
+    page_size: Optional[int] = None # Boşsa RESULT_PAGE_SIZE
 
 class ExportRequest(BaseModel):
     sql: str
-    format: str = "excel" # "excel" veya "csv"
+    format: str = "excel" # "excel", "csv", "parquet" veya "arrow"
 
 # --- Endpointler ---
 
@@ -62,30 +207,95 @@ async def start_session():
 @app.delete("/session/end")
 async def end_session(session_id: str = Depends(get_session_id)):
     """Oturumu sonlandırır ve kaynakları (RAM/DB bağlantısı) temizler."""
-    session_store.close_session(session_id)
+    session = _get_session(session_id)
+    # Süren istek veya arka plan işi (indeks danışmanı) bağlantıyı kullanırken kapatılmasın
+    async with session.lock:
+        session_store.close_session(session_id)
     return {"status": "success", "message": "Oturum kapatıldı."}
 
+@app.get("/session/stats")
+async def session_stats():
+    """Aktif oturumlar, toplam bellek kullanımı ve otomatik kapatılan oturum sayaçları."""
+    return session_store.stats()
+
 @app.post("/upload/file")
 async def upload_file(
     file: UploadFile = File(...), 
+    mode: str = Form("replace"),
+    table_name: Optional[str] = Form(None),
+    key_columns: Optional[str] = Form(None),
+    engine: Optional[str] = Form(None),
     session_id: str = Depends(get_session_id)
 ):
-    """Oturuma özel Excel/CSV dosyası yükler."""
-    content = await file.read()
+    """
+    Oturuma özel Excel/CSV dosyası yükler.
+
+    mode:
+        replace (varsayılan): Oturum için sıfırdan yeni bir veritabanı oluşturur.
+        append / upsert: Dosyayı oturumun mevcut veritabanındaki tabloya ekler
+        (key_columns: virgülle ayrılmış anahtar kolonlar, tekrarları ayıklamak için).
+    engine: "sqlite" veya "duckdb" (boşsa UPLOAD_ENGINE ayarı kullanılır; sadece replace modunda).
+    """
+    # Bilinmeyen mod sessizce replace sayılıp oturumun verisini silmesin
+    if mode not in ("replace", "append", "upsert"):
+        raise HTTPException(status_code=400, detail=f"Geçersiz yükleme modu: {mode}. Geçerli modlar: replace, append, upsert")
+
+    # Starlette yüklemeyi zaten SpooledTemporaryFile'a yazar (büyük dosyalar diske taşar);
+    # içeriği belleğe okumak yerine dosya nesnesini doğrudan parça parça işliyoruz.
+    upload = file.file
+    upload.seek(0)
+    session = _get_session(session_id)
     
-    try:
-        # 1. Dosyadan Geçici DB oluştur
-        temp_manager, engine = DatabaseManager.from_file(content, file.filename)
-        # Engine referansını sakla (Memory DB olduğu için garbage collector silmesin)
-        temp_manager.engine = engine
-        
-        # 2. Bu manager'ı oturuma kaydet
-        session_store.set_db_for_session(session_id, temp_manager)
-        
-        schema = temp_manager.get_schema_info()
-        return {"status": "success", "message": "Dosya analiz edildi", "schema_preview": schema}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    # Aynı oturumdaki eşzamanlı istekler veritabanını/geçmişi bozmasın
+    async with session.lock:
+        _ensure_open(session)
+        progress = IngestProgress(file.filename, bytes_total=file.size)
+        session.ingest_progress = progress
+        try:
+            if mode != "replace" and session.db_manager:
+                # Mevcut engine'i yeniden kullan, sadece delta'yı yaz
+                keys = [k.strip() for k in key_columns.split(",") if k.strip()] if key_columns else None
+                # Paylaşılan depoda ekleme de yeni bir dosyaya yazılır (diğer worker'lar eskisini okuyor olabilir)
+                previous_source = session.db_manager.source
+                path = session_store.dataset_path(session_id, previous_source.get("engine"))
+                summary = await blocking_pool.run(
+                    session.db_manager.append_file,
+                    upload, file.filename, table_name=table_name, mode=mode, key_columns=keys, progress=progress,
+                    path=path
+                )
+                progress.finish()
+                # Diğer worker'lar veriyi bir sonraki istekte yeniden açsın
+                session_store.mark_data_changed(session_id, previous_source)
+                schema = await blocking_pool.run(session.db_manager.get_schema_info)
+                return {"status": "success", "message": "Veri eklendi", **summary, "schema_preview": schema}
+
+            # 1. Dosyadan Geçici DB oluştur (ilerleme /upload/progress ile izlenebilsin diye thread'de).
+            # Paylaşılan oturum deposunda DB, tüm worker'ların açabileceği bir dosyaya yazılır.
+            temp_manager, _ = await blocking_pool.run(
+                DatabaseManager.from_file, upload, file.filename, progress, engine,
+                session_store.dataset_path(session_id, engine)
+            )
+            progress.finish()
+            
+            # 2. Bu manager'ı oturuma kaydet
+            session_store.set_db_for_session(session_id, temp_manager)
+            
+            schema = await blocking_pool.run(temp_manager.get_schema_info)
+            return {"status": "success", "message": "Dosya analiz edildi", "schema_preview": schema}
+        except ServerBusyError:
+            progress.finish(error="Sunucu meşgul")
+            raise
+        except Exception as e:
+            progress.finish(error=str(e))
+            raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/upload/progress")
+async def upload_progress(session_id: str = Depends(get_session_id)):
+    """Oturumdaki son (veya devam eden) dosya yüklemesinin ilerlemesini döndürür."""
+    session = session_store.get_session(session_id)
+    if not session or not session.ingest_progress:
+        raise HTTPException(status_code=404, detail="Bu oturumda henüz dosya yüklemesi yapılmadı.")
+    return session.ingest_progress.to_dict()
 
 @app.post("/connect/database")
 async def connect_database(
@@ -93,86 +303,360 @@ async def connect_database(
     session_id: str = Depends(get_session_id)
 ):
     """Mevcut bir SQL veritabanına bağlanır."""
-    try:
-        new_manager = DatabaseManager(connection_string=connection_url)
-        # Bağlantı testi için şemayı çek
-        schema = new_manager.get_schema_info()
-        
-        # Oturuma kaydet
-        session_store.set_db_for_session(session_id, new_manager)
-        
-        return {"status": "success", "message": "Veritabanı bağlandı", "schema_preview": schema}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Bağlantı hatası: {str(e)}")
+    session = _get_session(session_id)
+    async with session.lock:
+        _ensure_open(session)
+        new_manager = None
+        try:
+            new_manager = await blocking_pool.run(DatabaseManager, connection_string=connection_url)
+            # Bağlantı testi için şemayı çek
+            schema = await blocking_pool.run(new_manager.get_schema_info)
+            
+            # Oturuma kaydet
+            session_store.set_db_for_session(session_id, new_manager)
+            
+            return {"status": "success", "message": "Veritabanı bağlandı", "schema_preview": schema}
+        except Exception as e:
+            # Başarısız bağlantının paylaşılan havuzdaki referansını bırak
+            if new_manager is not None:
+                new_manager.dispose()
+            if isinstance(e, ServerBusyError):
+                raise
+            raise HTTPException(status_code=400, detail=f"Bağlantı hatası: {str(e)}")
+
+@app.get("/pool/stats")
+async def pool_stats():
+    """Paylaşılan veritabanı bağlantı havuzlarının ve iş havuzunun doluluğunu gösterir."""
+    return {"engines": engine_registry.stats(), "workers": blocking_pool.stats()}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Prometheus metin formatında metrikler: aşama ve istek süresi histogramları, LLM token ve
+    yeniden deneme sayaçları, aktif oturum ve bellek göstergeleri (her worker kendi değerlerini verir).
+    """
+    return PlainTextResponse(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/debug/slow-requests")
+async def slow_requests():
+    """Yavaş isteklerin profilleri (PROFILE_SLOW_REQUESTS açıksa; en yenisi sonda)."""
+    return {"enabled": profiler.enabled, "threshold_seconds": settings.SLOW_REQUEST_SECONDS, "requests": list(profiler.recent)}
+
+@app.get("/cache/stats")
+async def cache_stats(session_id: Optional[str] = Header(None, alias="X-Session-ID")):
+    """
+    Soru -> SQL ve doğrulanmış SQL önbelleklerinin isabet (hit/miss) sayaçları;
+    oturum verilirse sonuç önbelleği de eklenir.
+    """
+    stats = {"sql": sql_cache.stats(), "validated_sql": SQLValidator.cache_stats()}
+    session = session_store.get_session(session_id) if session_id else None
+    if session and session.db_manager:
+        stats["results"] = session.db_manager.result_cache.stats()
+    return stats
+
+@app.get("/index/advice")
+async def index_advice(session_id: str = Depends(get_session_id), db_manager: DatabaseManager = Depends(get_db_manager)):
+    """
+    İndeks danışmanının raporu: oluşturulan ve (hızlanma/bütçe yetersizliğinden) geri
+    alınan indeksler, ölçülen önce/sonra süreleri ve geçmişe göre bekleyen adaylar.
+    """
+    session = _get_session(session_id)
+    async with session.lock:
+        _ensure_open(session, db_manager)
+        return await blocking_pool.run(db_manager.index_advisor.report, list(session.history))
+
+@app.post("/schema/refresh")
+async def refresh_schema(
+    session_id: str = Depends(get_session_id),
+    db_manager: DatabaseManager = Depends(get_db_manager)
+):
+    """Şema önbelleğini temizler ve şemayı veritabanından yeniden okur."""
+    session = _get_session(session_id)
+    # Aynı oturumda çalışan bir sohbet isteği şema önbelleğini okurken temizlenmesin
+    async with session.lock:
+        _ensure_open(session)
+        # Kilit beklenirken yeni bir dosya yüklenmiş olabilir; güncel yönetici yenilenir
+        db_manager = session.db_manager or db_manager
+        try:
+            db_manager.refresh_schema()
+            schema = await blocking_pool.run(db_manager.get_schema_info)
+            return {"status": "success", "message": "Şema yenilendi", "schema_preview": schema}
+        except ServerBusyError:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/chat")
 async def chat_with_data(
     request: QueryRequest,
-    session_id: str = Depends(get_session_id)
+    http_request: Request,
+    session_id: str = Depends(get_session_id),
+    accept: Optional[str] = Header(None)
 ):
-    """Aktif oturumdaki veriyle sohbet eder (Hafızalı)."""
+    """
+    Aktif oturumdaki veriyle sohbet eder (Hafızalı).
+    Sonucun formatı Accept başlığıyla seçilir (bkz. _render_result).
+    İstemci yanıtı beklemeden bağlantıyı kapatırsa çalışan sorgu iptal edilir.
+    """
     
     # Session nesnesini al (History'e erişmek için)
     session = session_store.get_session(session_id)
     if not session or not session.db_manager:
         raise HTTPException(status_code=400, detail="Önce veri kaynağı bağlayın.")
 
-    # Ajanı geçmiş konuşmalarla (history) birlikte başlat
-    agent_service = SQLAgentService(session.db_manager, history=session.history)
-    
+    # Aynı oturumda eşzamanlı iki soru history'yi bozmasın diye sırayla işlenir
+    with span("lock"):
+        await session.lock.acquire()
     try:
-        response = agent_service.process_request(request.question)
+        _ensure_open(session)
+        # Ajanı geçmiş konuşmalarla (history) birlikte başlat
+        agent_service = SQLAgentService(
+            session.db_manager, history=session.history, agent_cache=session.agent_cache, chart_points=request.chart_points,
+            candidates=request.candidates,
+        )
         
-        # Eğer ajan history'yi güncellediyse, session'a kaydet
-        if "history_update" in response:
-            session.history = response["history_update"]
-            # Frontend'e history objesini göndermeye gerek yok, temizle
-            del response["history_update"]
+        try:
+            # LLM çağrısı ve SQL çalıştırma event loop'u kilitlemesin
+            response = await blocking_pool.run_until_disconnect(
+                http_request.is_disconnected, agent_service.process_request, request.question
+            )
             
-        return response
+            # Eğer ajan history'yi güncellediyse, session'a kaydet
+            if "history_update" in response:
+                session_store.append_history(session_id, response["history_update"])
+                # Frontend'e history objesini göndermeye gerek yok, temizle
+                del response["history_update"]
+        except ServerBusyError:
+            raise
+        except Exception as e:
+            return {"error": str(e)}
+    finally:
+        session.lock.release()
+
+    _schedule_index_advisor(session)
+    with span("render"):
+        return _render_result(response, accept)
+
+def _sse(event: str, data) -> bytes:
+    """Tek bir Server-Sent Events mesajı."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n".encode("utf-8")
+
+@app.post("/chat/stream")
+async def chat_with_data_stream(
+    request: QueryRequest,
+    session_id: str = Depends(get_session_id)
+):
+    """
+    /chat'in akış (Server-Sent Events) hali. Her aşama bitince bir olay gönderilir:
+    sql (üretilen sorgu), validation, retry, rows (ilk sayfa), chart ve
+    result (/chat ile aynı toplu yanıt) veya error. Server-Timing başlığı akış başlamadan
+    gittiği için aşama süreleri en sonda timing olayıyla gönderilir.
+    """
+    session = session_store.get_session(session_id)
+    if not session or not session.db_manager:
+        raise HTTPException(status_code=400, detail="Önce veri kaynağı bağlayın.")
+
+    # Havuz doluysa akış başlamadan 503 dön
+    blocking_pool.ensure_capacity()
+
+    # Ajan kilitten önce kurulur: kurulum hatası (örn. geçersiz LLM_CLIENT) kilidi tutmadan 400'e düşsün
+    try:
+        agent_service = SQLAgentService(
+            session.db_manager, history=session.history, agent_cache=session.agent_cache,
+            chart_points=request.chart_points, candidates=request.candidates,
+        )
     except Exception as e:
-        return {"error": str(e)}
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Kilit akış bitene kadar tutulur; aynı oturumdaki diğer istekler sırada bekler
+    with span("lock"):
+        await session.lock.acquire()
+    try:
+        _ensure_open(session)
+    except HTTPException:
+        session.lock.release()
+        raise
+    # Beklerken başka bir istek geçmişi veya veri kaynağını değiştirmiş olabilir
+    agent_service.db_manager = session.db_manager or agent_service.db_manager
+    agent_service.history = session.history
+    trace = current_trace.get()
+    # İstemci akışı yarıda keserse (veya yanıt hiç başlamazsa) çalışan sorgu durdurulur
+    token = CancelToken()
+
+    async def event_stream():
+        current_cancel_token.set(token)
+        try:
+            yield _sse("start", {"question": request.question})
+            # Her aşama havuzda çalışır; olaylar üretildikçe istemciye gider
+            async for event, data in blocking_pool.iterate(agent_service.stream_request(request.question)):
+                if event == "result" and "history_update" in data:
+                    session_store.append_history(session_id, data["history_update"])
+                    data = {key: value for key, value in data.items() if key != "history_update"}
+                yield _sse(event, encode_payload(data))
+            if trace is not None:
+                yield _sse("timing", {"stages_ms": trace.breakdown(), "total_ms": round(trace.elapsed() * 1000, 1)})
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+
+    async def cleanup():
+        token.cancel()
+        _schedule_index_advisor(session)
+
+    return SessionStreamingResponse(
+        event_stream(),
+        session,
+        cleanup,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/result/page")
+async def open_result_page(
+    request: PageRequest,
+    http_request: Request,
+    session_id: str = Depends(get_session_id),
+    db_manager: DatabaseManager = Depends(get_db_manager),
+    accept: Optional[str] = Header(None)
+):
+    """
+    Sorguyu sayfalı çalıştırır: ilk sayfa ve sonraki sayfa için opak bir imleç
+    (next_cursor) döner. Sonuç sabit LIMIT 100 ile kesilmez; sonraki sayfalar
+    GET /result/page?cursor=... ile, sorgu baştan çalıştırılmadan alınır.
+    """
+    try:
+        safe_sql = SQLValidator.validate_and_fix(request.sql, limit=None, dialect=db_manager.sqlglot_dialect)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    session = _get_session(session_id)
+    async with session.lock:
+        _ensure_open(session, db_manager)
+        try:
+            page = await blocking_pool.run_until_disconnect(
+                http_request.is_disconnected, db_manager.pager.open, safe_sql, request.page_size
+            )
+        except ServerBusyError:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return _render_result(page, accept)
+
+@app.get("/result/page")
+async def next_result_page(
+    cursor: str,
+    session_id: str = Depends(get_session_id),
+    db_manager: DatabaseManager = Depends(get_db_manager),
+    accept: Optional[str] = Header(None)
+):
+    """İmlecin gösterdiği sonraki sayfayı döndürür; son sayfada next_cursor boştur."""
+    session = _get_session(session_id)
+    async with session.lock:
+        _ensure_open(session, db_manager)
+        try:
+            page = await blocking_pool.run(db_manager.pager.next_page, cursor)
+        except PageCursorError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ServerBusyError:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return _render_result(page, accept)
+
+@app.delete("/result/page")
+async def close_result_page(cursor: str, db_manager: DatabaseManager = Depends(get_db_manager)):
+    """Sonuna kadar okunmayan bir imleci (ve tuttuğu bağlantıyı) erkenden kapatır."""
+    db_manager.pager.close(cursor)
+    return {"status": "success"}
 
 @app.post("/export/result")
 async def export_query_result(
     request: ExportRequest,
+    session_id: str = Depends(get_session_id),
     db_manager: DatabaseManager = Depends(get_db_manager)
 ):
-    """Belirli bir SQL sonucunu Excel veya CSV dosyası olarak indirir."""
-    
+    """
+    Belirli bir SQL sonucunu Excel, CSV, Parquet veya Arrow dosyası olarak indirir.
+    Sonuç sunucu taraflı imleçle parça parça okunur ve istemciye akıtılır (streaming);
+    satır sayısı EXPORT_MAX_ROWS ile sınırlıdır.
+    """
     try:
-        # SQL'i tekrar çalıştır (Cache olmadığı için)
-        result = db_manager.execute_safe_query(request.sql)
-        if "error" in result:
-            raise HTTPException(status_code=400, detail=result["error"])
-        
-        data = result.get("data", [])
-        if not data:
-            raise HTTPException(status_code=404, detail="Sorgu boş sonuç döndürdü.")
+        media_type, filename = ExportService.describe(request.format)
+        safe_sql = SQLValidator.validate_and_fix(request.sql, limit=None, dialect=db_manager.sqlglot_dialect)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        df = pd.DataFrame(data)
-        stream = io.BytesIO()
-        
-        if request.format == "csv":
-            df.to_csv(stream, index=False)
-            media_type = "text/csv"
-            filename = "sonuc.csv"
-        else:
-            # Excel export
-            df.to_excel(stream, index=False, engine='openpyxl')
-            media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            filename = "sonuc.xlsx"
-            
-        stream.seek(0)
-        
-        return StreamingResponse(
-            stream, 
-            media_type=media_type, 
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-        
+    # /chat az önce çalıştırdıysa sonuç oturumun önbelleğinden gelir
+    stream = db_manager.stream_query(safe_sql, settings.EXPORT_BATCH_SIZE, max_rows=settings.EXPORT_MAX_ROWS)
+
+    def open_stream():
+        # Sorguyu çalıştır ve ilk parçayı oku (hatalar yanıt başlamadan yakalansın)
+        return next(stream), next(stream, None)
+
+    # Kilit dışa aktarma akışı bitene kadar tutulur: kalan parçalar da aynı bağlantıdan okunur,
+    # aynı oturumdaki diğer istekler (yükleme, şema yenileme) akışın altındaki dosyayı değiştirmesin
+    session = _get_session(session_id)
+    with span("lock"):
+        await session.lock.acquire()
+    try:
+        _ensure_open(session, db_manager)
+    except HTTPException:
+        stream.close()
+        session.lock.release()
+        raise
+    try:
+        columns, first_batch = await blocking_pool.run(open_stream)
+    except ServerBusyError:
+        stream.close()
+        session.lock.release()
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        stream.close()
+        session.lock.release()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not first_batch:
+        stream.close()
+        session.lock.release()
+        raise HTTPException(status_code=404, detail="Sorgu boş sonuç döndürdü.")
+
+    def batches():
+        yield first_batch
+        yield from stream
+
+    export = ExportService.stream(request.format, columns, batches())
+
+    async def body():
+        try:
+            # Kalan parçalar ve dosya formatına çevirme de havuzda, adım adım çalışır
+            async for chunk in blocking_pool.iterate(export):
+                yield chunk
+        except Exception as e:
+            # Başlıklar gönderildiği için durum kodu değiştirilemez; bağlantı kesilir ve istemci
+            # indirmeyi tamamlanmamış görür (yarım dosya eksiksizmiş gibi bitirilmez)
+            print(f"Uyarı: Dışa aktarma yarıda kesildi: {e}")
+            raise
+
+    def close_stream():
+        # Akış hiç başlamadıysa export generator'ı imleci kapatmaz; ikisi ayrı ayrı kapatılır.
+        # İptal edilen bir adım hâlâ başka bir thread'de çalışıyorsa (ValueError) generator
+        # o adım bitip serbest kalınca toplanırken kapanır.
+        for generator in (export, stream):
+            try:
+                generator.close()
+            except ValueError:
+                pass
+
+    async def cleanup():
+        # İstemci indirmeyi yarıda keserse de (veya yanıt hiç başlamazsa) imleç kapatılır
+        await blocking_pool.run(close_stream, reject_when_busy=False)
+
+    return SessionStreamingResponse(
+        body(),
+        session,
+        cleanup,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,137 @@
+# app/services/column_stats.py
+import warnings
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class _ColumnState:
+    __slots__ = ("kind", "nulls", "minimum", "maximum", "hashes", "counts")
+
+    def __init__(self):
+        self.kind: Optional[str] = None
+        self.nulls = 0
+        self.minimum: Any = None
+        self.maximum: Any = None
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.counts: Counter = Counter()
+
+
+class ColumnProfiler:
+    """
+    Yükleme sırasında DataFrame parçalarından tek geçişte kolon istatistikleri çıkarır:
+    NULL sayısı, farklı değer tahmini, min/max, en sık değerler ve kolon türü
+    (number, date, category). Her parça vektörel işlenir; dosyanın tamamı bellekte tutulmaz.
+
+    Farklı değer sayısı KMV (k minimum değer) taslağıyla tahmin edilir: değerlerin
+    64 bitlik hash'lerinden en küçük SKETCH_SIZE tanesi tutulur. Bundan az farklı değer
+    varsa sayı kesindir (kategorik kolonlar). En sık değerler için parça başına
+    value_counts birleştirilir; sayaç COUNTER_LIMIT değerle sınırlıdır (yaklaşık top-K).
+    """
+
+    SKETCH_SIZE = 1024
+    COUNTER_LIMIT = 1000
+    TOP_K = 20
+
+    # Metin kolonunda tarih araması için bakılan ilk dolu değer sayısı
+    DATE_SAMPLE = 20
+
+    def __init__(self):
+        self.rows = 0
+        self._columns: Dict[str, _ColumnState] = {}
+
+    @classmethod
+    def _infer_kind(cls, values: pd.Series) -> str:
+        if pd.api.types.is_bool_dtype(values):
+            return "category"
+        if pd.api.types.is_numeric_dtype(values):
+            return "number"
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return "date"
+        sample = values.head(cls.DATE_SAMPLE)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                if sample.map(type).eq(str).all() and pd.to_datetime(sample, errors="coerce").notna().all():
+                    return "date"
+        except Exception:
+            pass
+        return "category"
+
+    @staticmethod
+    def _bounds(values: pd.Series, kind: str):
+        if kind == "date" and not pd.api.types.is_datetime64_any_dtype(values):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                parsed = pd.to_datetime(values, errors="coerce").dropna()
+            if not parsed.empty:
+                return parsed.min(), parsed.max()
+        try:
+            return values.min(), values.max()
+        except TypeError:
+            # Karışık tipli metin kolonu
+            as_text = values.astype(str)
+            return as_text.min(), as_text.max()
+
+    def update(self, frame: pd.DataFrame):
+        self.rows += len(frame)
+        for column in frame.columns:
+            state = self._columns.setdefault(str(column), _ColumnState())
+            series = frame[column]
+            values = series.dropna()
+            state.nulls += len(series) - len(values)
+            if values.empty:
+                continue
+            if state.kind is None:
+                state.kind = self._infer_kind(values)
+
+            low, high = self._bounds(values, state.kind)
+            try:
+                state.minimum = low if state.minimum is None else min(state.minimum, low)
+                state.maximum = high if state.maximum is None else max(state.maximum, high)
+            except TypeError:
+                state.minimum, state.maximum = min(str(state.minimum), str(low)), max(str(state.maximum), str(high))
+
+            hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+            state.hashes = np.unique(np.concatenate([state.hashes, hashes]))[:self.SKETCH_SIZE]
+
+            state.counts.update(values.value_counts().head(self.COUNTER_LIMIT).to_dict())
+            if len(state.counts) > self.COUNTER_LIMIT:
+                state.counts = Counter(dict(state.counts.most_common(self.COUNTER_LIMIT)))
+
+    def _distinct(self, state: _ColumnState) -> int:
+        if len(state.hashes) < self.SKETCH_SIZE:
+            return len(state.hashes)
+        kth = float(state.hashes[self.SKETCH_SIZE - 1]) / 2.0 ** 64
+        return int(round((self.SKETCH_SIZE - 1) / kth))
+
+    @staticmethod
+    def _scalar(value: Any) -> Any:
+        """numpy/pandas skalerlerini saklanabilir Python değerine çevirir (tarihler ISO metin)."""
+        if value is None:
+            return None
+        if isinstance(value, pd.Timestamp):
+            return value.date().isoformat() if value == value.normalize() else value.isoformat()
+        if hasattr(value, "item"):
+            value = value.item()
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return value
+
+    def results(self) -> List[Dict[str, Any]]:
+        """Kolon sırasıyla istatistikler (tamamen boş kolonların türü 'category' kabul edilir)."""
+        return [
+            {
+                "column": column,
+                "kind": state.kind or "category",
+                "row_count": self.rows,
+                "null_count": int(state.nulls),
+                "distinct_count": self._distinct(state),
+                "min": self._scalar(state.minimum),
+                "max": self._scalar(state.maximum),
+                "top_values": [[self._scalar(value), int(count)] for value, count in state.counts.most_common(self.TOP_K)],
+            }
+            for column, state in self._columns.items()
+        ]
@@ -0,0 +1,246 @@
+# app/services/columnar.py
+import datetime
+import decimal
+import json
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+# Yanıt formatları (Accept başlığı ile seçilir)
+ROWS_JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.datachat.columnar+json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+# Tip adı -> NULL yerine dizide kullanılan değer (diziler tek tipli kalsın diye)
+_FILL_VALUES = {"int": 0, "float": 0.0, "bool": False, "string": "", "date": "", "datetime": "", "null": None}
+
+# Tip adı -> JSON'a olduğu gibi yazılabilen Python tipleri
+_JSON_NATIVE = {"int": {int}, "float": {int, float}, "bool": {bool}, "string": {str}}
+
+
+def _type_kind(value_type: type) -> str:
+    if issubclass(value_type, bool):
+        return "bool"
+    if issubclass(value_type, int):
+        return "int"
+    if issubclass(value_type, (float, decimal.Decimal)):
+        return "float"
+    if issubclass(value_type, datetime.datetime):
+        return "datetime"
+    if issubclass(value_type, datetime.date):
+        return "date"
+    return "string"
+
+
+def merge_kinds(kinds: Iterable[str]) -> str:
+    """
+    Bir kolonda görülen tipleri tek tipe indirger (tip genişletme kuralı): NULL diğerine
+    uyar, int ve float karışıksa float, başka karışımlar string kabul edilir.
+    """
+    found = set(kinds) - {"null"}
+    if not found:
+        return "null"
+    if len(found) == 1:
+        return found.pop()
+    if found == {"int", "float"}:
+        return "float"
+    return "string"
+
+
+class ColumnarResult:
+    """
+    Sorgu sonucunun kolon tabanlı gösterimi: kolon adları bir kez, her kolon için
+    tek bir değer listesi. Satır başına dict üretilmez; grafik önerisi (DataFrame),
+    dışa aktarım (satır parçaları) ve yanıt formatları aynı listeleri kullanır.
+    """
+
+    __slots__ = ("columns", "values", "count", "_types", "_frame")
+
+    def __init__(self, columns: List[str], values: List[list], count: int):
+        self.columns = columns
+        self.values = values
+        self.count = count
+        self._types: Optional[List[str]] = None
+        self._frame = None
+
+    @classmethod
+    def from_rows(cls, columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> "ColumnarResult":
+        """DB-API satırlarını (tuple/Row) kolonlara çevirir."""
+        columns = list(columns)
+        if not rows:
+            return cls(columns, [[] for _ in columns], 0)
+        return cls(columns, [list(column) for column in zip(*rows)], len(rows))
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> "ColumnarResult":
+        columns = list(records[0].keys()) if records else []
+        return cls.from_rows(columns, [tuple(record.values()) for record in records])
+
+    # --- Satır erişimi (geriye dönük uyumluluk ve dışa aktarım için) ---
+
+    def rows(self, start: int = 0, stop: Optional[int] = None) -> Iterator[tuple]:
+        return zip(*(column[start:stop] for column in self.values))
+
+    def records(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Eski satır tabanlı JSON formatı: [{kolon: değer}, ...]"""
+        return [dict(zip(self.columns, row)) for row in self.rows(0, limit)]
+
+    def head(self, limit: int) -> "ColumnarResult":
+        if limit >= self.count:
+            return self
+        return ColumnarResult(self.columns, [column[:limit] for column in self.values], limit)
+
+    def batches(self, batch_size: int, max_rows: Optional[int] = None) -> Iterator[List[tuple]]:
+        total = self.count if max_rows is None else min(self.count, max_rows)
+        for start in range(0, total, batch_size):
+            yield list(self.rows(start, min(start + batch_size, total)))
+
+    # --- Tipler ---
+
+    @property
+    def types(self) -> List[str]:
+        """
+        Kolon tipleri (int, float, bool, string, date, datetime, null). Sürücülerin tip
+        kodları motora göre değiştiği için değerlerden çıkarılır; karışık tipler
+        merge_kinds ile tek tipe indirilir.
+        """
+        if self._types is None:
+            # Değer başına değil, kolondaki farklı Python tipleri üzerinden karar verilir
+            self._types = [
+                merge_kinds(_type_kind(value_type) for value_type in set(map(type, column)) if value_type is not type(None))
+                for column in self.values
+            ]
+        return self._types
+
+    @staticmethod
+    def _json_value(value: Any, kind: str) -> Any:
+        if kind in ("date", "datetime"):
+            return value.isoformat()
+        if kind == "float":
+            return float(value)
+        if kind == "string" and not isinstance(value, str):
+            return str(value)
+        return value
+
+    def estimate_size(self) -> int:
+        """Sonucun bellekte kapladığı yaklaşık alan (byte)."""
+        size = sys.getsizeof(self.values)
+        for column in self.values:
+            size += sys.getsizeof(column)
+            # Küçük int'ler ve tekrar eden string'ler paylaşıldığı için örneklemek yeterli
+            sample = column[:100]
+            if sample:
+                size += len(column) * sum(sys.getsizeof(value) for value in sample) // len(sample)
+        return size
+
+    # --- Formatlar ---
+
+    def to_json(self) -> Dict[str, Any]:
+        """
+        Kolon tabanlı JSON: değer dizileri tek tiplidir (NULL'lar tipin boş değeriyle
+        doldurulur), 'nulls' ise NULL içeren kolonlar için 0/1 maskesidir (yoksa null).
+        """
+        values, nulls = [], []
+        for column, kind in zip(self.values, self.types):
+            fill = _FILL_VALUES[kind]
+            mask = None
+            if kind == "null":
+                encoded = [None] * len(column)
+            elif None in column:
+                mask = [1 if value is None else 0 for value in column]
+                encoded = [fill if value is None else self._json_value(value, kind) for value in column]
+            elif set(map(type, column)) <= _JSON_NATIVE.get(kind, set()):
+                encoded = column  # Dönüşüm gerekmiyor, kopyalanmaz
+            else:
+                encoded = [self._json_value(value, kind) for value in column]
+            values.append(encoded)
+            nulls.append(mask)
+        return {"columns": self.columns, "types": self.types, "values": values, "nulls": nulls, "count": self.count}
+
+    def to_frame(self):
+        """Grafik önerisi için DataFrame (satır dict'leri üretilmeden, kolonlardan; önbelleklenir)."""
+        if self._frame is None:
+            import pandas as pd
+
+            frame = pd.DataFrame({idx: column for idx, column in enumerate(self.values)})
+            frame.columns = self.columns
+            self._frame = frame
+        return self._frame
+
+    @staticmethod
+    def arrow_type(pa, kind: str):
+        """Kolon tipinin Arrow karşılığı (tamamı NULL olan kolonlar metin kabul edilir)."""
+        return {
+            "int": pa.int64(), "float": pa.float64(), "bool": pa.bool_(), "string": pa.string(),
+            "date": pa.date32(), "datetime": pa.timestamp("us"), "null": pa.string(),
+        }[kind]
+
+    def to_arrow(self, metadata: Optional[Dict[str, Any]] = None, types: Optional[List[str]] = None):
+        """
+        pyarrow Table (opsiyonel 'metadata' şemaya JSON olarak eklenir). 'types' verilirse
+        (örn. dışa aktarımda dosyanın şeması) değerler bu tiplere çevrilir; tipler
+        değerlerle uyumlu olmalıdır (bkz. merge_kinds).
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ValueError("Arrow formatı için 'pyarrow' paketi kurulu olmalıdır.")
+
+        arrays = []
+        for column, kind in zip(self.values, types or self.types):
+            if kind == "float":
+                column = [None if value is None else float(value) for value in column]
+            elif kind == "string" and not set(map(type, column)) <= {str, type(None)}:
+                column = [None if value is None else str(value) for value in column]
+            arrays.append(pa.array(column, type=self.arrow_type(pa, kind)))
+        schema_metadata = {"datachat": json.dumps(metadata, default=str)} if metadata else None
+        return pa.Table.from_arrays(arrays, names=self.columns, metadata=schema_metadata)
+
+    def to_ipc(self, metadata: Optional[Dict[str, Any]] = None) -> bytes:
+        """Arrow IPC stream formatında tek parça byte dizisi."""
+        import pyarrow as pa
+
+        table = self.to_arrow(metadata)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Accept başlığındaki ilk desteklenen formatı seçer; yoksa satır tabanlı JSON."""
+    for part in (accept or "").split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in (COLUMNAR_JSON, ARROW_STREAM, ROWS_JSON):
+            return media_type
+    return ROWS_JSON
+
+
+def encode_payload(payload: Any, media_type: str = ROWS_JSON) -> Any:
+    """
+    Yanıt içindeki ColumnarResult'ları ('table' anahtarı) istenen JSON formatına çevirir:
+    satır formatında 'data' (eski format), kolon formatında 'columnar' olarak.
+    Arrow'da satırlar IPC gövdesinde gittiği için sadece kolon adları kalır (şema metadata'sı).
+    """
+    if isinstance(payload, dict):
+        encoded = {}
+        for key, value in payload.items():
+            if key == "table" and isinstance(value, ColumnarResult):
+                if media_type == COLUMNAR_JSON:
+                    encoded["columnar"] = value.to_json()
+                elif media_type == ARROW_STREAM:
+                    encoded["columns"] = value.columns
+                else:
+                    encoded["columns"] = value.columns
+                    encoded["data"] = value.records()
+            else:
+                encoded[key] = encode_payload(value, media_type)
+        return encoded
+    return payload
+
+
+def arrow_table(payload: Dict[str, Any]) -> Optional[ColumnarResult]:
+    """Yanıttaki (veya yanıtın 'result' alanındaki) sonucu bulur."""
+    for holder in (payload, payload.get("result")):
+        if isinstance(holder, dict) and isinstance(holder.get("table"), ColumnarResult):
+            return holder["table"]
+    return None
@@ -0,0 +1,231 @@
+# app/services/cost_guard.py
+import json
+import math
+import threading
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.services.security import SQLValidator
+
+
+class _PlanNode:
+    """Motorların EXPLAIN çıktısının ortak gösterimi."""
+
+    __slots__ = ("op", "table", "rows", "full_scan", "product", "nested", "children")
+
+    def __init__(self, op: str, table: Optional[str] = None, rows: Optional[float] = None,
+                 full_scan: bool = False, product: bool = False, nested: bool = True):
+        self.op = op
+        self.table = table
+        self.rows = rows  # Tahmini çıktı satırı (bilinmiyorsa None)
+        self.full_scan = full_scan
+        self.product = product  # Çocukların satırları çarpılır (iç içe döngü / kartezyen)
+        self.nested = nested  # False: üstteki döngüden bağımsız, bir kez çalışır (örn. alt sorgu)
+        self.children: List["_PlanNode"] = []
+
+
+class QueryCostGuard:
+    """
+    Sorguyu çalıştırmadan önce veritabanının planını (EXPLAIN) okur ve tahmini
+    taranan satır sayısını hesaplar:
+        sqlite: EXPLAIN QUERY PLAN (aynı seviyedeki SCAN/SEARCH'ler iç içe döngüdür)
+        duckdb: EXPLAIN (FORMAT JSON), operatörlerin Estimated Cardinality değeri
+        postgresql: EXPLAIN (FORMAT JSON), Plan Rows (Nested Loop'ta çarpılır)
+        mysql: EXPLAIN, tabloların 'rows' değerleri join sırasıyla çarpılır
+    Büyük tabloların tam taramaları ve kartezyen çarpımlar rapora işaretlenir.
+    """
+
+    def __init__(self, db_manager):
+        self.db = db_manager
+        # Tablo -> satır sayısı (sadece yerel sqlite/duckdb; veri değişince unutulur)
+        self._table_rows: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def forget(self, table_name: Optional[str] = None):
+        with self._lock:
+            if table_name is None:
+                self._table_rows.clear()
+            else:
+                self._table_rows.pop(table_name, None)
+
+    def table_rows(self, table_name: str) -> Optional[int]:
+        """Dosyadan yüklenen veritabanlarında tablonun gerçek satır sayısı (önbellekli)."""
+        if self.db.engine.dialect.name not in ("sqlite", "duckdb"):
+            return None
+        with self._lock:
+            if table_name in self._table_rows:
+                return self._table_rows[table_name]
+        quote = self.db.engine.dialect.identifier_preparer.quote
+        try:
+            with self.db.engine.connect() as conn:
+                count = conn.execute(text(f"SELECT COUNT(*) FROM {quote(table_name)}")).scalar()
+        except Exception:
+            return None
+        with self._lock:
+            self._table_rows[table_name] = int(count)
+        return int(count)
+
+    # --- Planlar ---
+
+    def _plan(self, sql: str) -> Optional[_PlanNode]:
+        dialect = self.db.engine.dialect.name
+        parsers = {
+            "sqlite": self._plan_sqlite,
+            "duckdb": self._plan_duckdb,
+            "postgresql": self._plan_postgres,
+            "mysql": self._plan_mysql,
+        }
+        parser = parsers.get(dialect)
+        if parser is None:
+            return None
+        with self.db.engine.connect() as conn:
+            return parser(conn, sql)
+
+    def _plan_sqlite(self, conn, sql: str) -> _PlanNode:
+        aliases = SQLValidator.table_aliases(sql, self.db.sqlglot_dialect)
+        root = _PlanNode("QUERY", product=True)
+        nodes = {0: root}
+        for node_id, parent, _, detail in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall():
+            words = detail.split()
+            if words[0] in ("SCAN", "SEARCH") and len(words) > 1:
+                table = aliases.get(words[1], words[1])
+                total = self.table_rows(table)
+                if words[0] == "SCAN":
+                    node = _PlanNode(detail, table, total, full_scan=True)
+                elif "AUTOMATIC" in detail:
+                    # Geçici indeks tablonun tamamı okunarak kurulur, aramalar ucuzdur
+                    node = _PlanNode(detail, table, 1)
+                    node.children.append(_PlanNode("AUTOMATIC INDEX", table, total, full_scan=True))
+                else:
+                    node = _PlanNode(detail, table, max(1.0, math.log2(total or 1)))
+            else:
+                # Alt sorgu, CTE, geçici B-tree: kendi içindeki döngüler çarpılır, üst döngüyle
+                # çarpılmaz (ilişkili alt sorgular hariç; onlar her satır için tekrar çalışır)
+                node = _PlanNode(detail, product=True, nested="CORRELATED" in detail)
+            nodes[node_id] = node
+            nodes.get(parent, root).children.append(node)
+        return root
+
+    def _plan_duckdb(self, conn, sql: str) -> _PlanNode:
+        row = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").fetchone()
+
+        def build(item: Dict[str, Any]) -> _PlanNode:
+            info = item.get("extra_info") or {}
+            name = item.get("name", "")
+            table = info.get("Table")
+            estimate = info.get("Estimated Cardinality")
+            node = _PlanNode(
+                name,
+                table.split(".")[-1] if table else None,
+                float(estimate) if estimate else None,
+                product=name in ("CROSS_PRODUCT", "NESTED_LOOP_JOIN", "BLOCKWISE_NL_JOIN"),
+            )
+            node.children = [build(child) for child in item.get("children", [])]
+            if name == "SEQ_SCAN" and node.table:
+                # Tahmin filtreden sonraki satırdır; taranan satır ise tablonun tamamıdır
+                total = self.table_rows(node.table)
+                node.children.append(_PlanNode("TABLE", node.table, total or node.rows, full_scan=True))
+            return node
+
+        root = _PlanNode("QUERY")
+        root.children = [build(item) for item in json.loads(row[1])]
+        return root
+
+    def _plan_postgres(self, conn, sql: str) -> _PlanNode:
+        document = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+        if isinstance(document, str):
+            document = json.loads(document)
+
+        def build(plan: Dict[str, Any]) -> _PlanNode:
+            kind = plan.get("Node Type", "")
+            node = _PlanNode(
+                kind,
+                plan.get("Relation Name"),
+                float(plan.get("Plan Rows", 0)),
+                full_scan=kind == "Seq Scan",
+                product=kind == "Nested Loop",
+            )
+            node.children = [build(child) for child in plan.get("Plans", [])]
+            return node
+
+        root = _PlanNode("QUERY")
+        root.children = [build(item["Plan"]) for item in document]
+        return root
+
+    def _plan_mysql(self, conn, sql: str) -> _PlanNode:
+        result = conn.exec_driver_sql(f"EXPLAIN {sql}")
+        keys = list(result.keys())
+        root = _PlanNode("QUERY", product=True)
+        for values in result.fetchall():
+            row = dict(zip(keys, values))
+            rows = float(row.get("rows") or 1) * float(row.get("filtered") or 100) / 100
+            root.children.append(_PlanNode(
+                f"{row.get('select_type')} {row.get('type')}", row.get("table"), max(rows, 1.0),
+                full_scan=row.get("type") == "ALL",
+                # Bağımsız alt sorgular bir kez çalışır, join döngüsüyle çarpılmaz
+                nested=row.get("select_type") not in ("SUBQUERY", "DERIVED", "MATERIALIZED", "UNION", "UNION RESULT"),
+            ))
+        return root
+
+    # --- Tahmin ---
+
+    @classmethod
+    def _walk(cls, node: _PlanNode, report: Dict[str, Any]) -> float:
+        """Düğümün çıktı satırını döndürür, taranan satırları rapora ekler."""
+        outputs = [cls._walk(child, report) for child in node.children]
+        if node.product:
+            loops = [output for child, output in zip(node.children, outputs) if child.nested]
+            output = math.prod(loops) if loops else 0.0
+            if len(loops) > 1:
+                report["rows_examined"] += output
+        elif node.children:
+            output = node.rows if node.rows is not None else max(outputs)
+        else:
+            # Yaprak: tarama/arama; satırı bilinmiyorsa (örn. alt sorgu sonucu) 1 kabul edilir
+            output = node.rows if node.rows is not None else 1.0
+            report["rows_examined"] += output
+        if node.full_scan and node.table and (node.rows or 0) >= settings.COST_GUARD_LARGE_TABLE_ROWS:
+            scan = {"table": node.table, "rows": int(node.rows)}
+            if scan not in report["full_scans"]:
+                report["full_scans"].append(scan)
+        if node.op == "CROSS_PRODUCT" and len(outputs) > 1:
+            report["cartesian"].append(" x ".join(child.table or child.op for child in node.children))
+        return output
+
+    def estimate(self, sql: str) -> Optional[Dict[str, Any]]:
+        """
+        Sorgunun maliyet raporu: rows_examined (tahmini taranan satır), full_scans
+        (büyük tabloların tam taramaları), cartesian (koşulsuz birleştirmeler).
+        Plan alınamazsa (desteklenmeyen motor, planlanamayan sorgu) None döner.
+        """
+        try:
+            plan = self._plan(sql)
+        except Exception:
+            return None
+        if plan is None:
+            return None
+        report = {"rows_examined": 0.0, "full_scans": [], "cartesian": []}
+        self._walk(plan, report)
+        for left, right in SQLValidator.cartesian_joins(sql, self.db.sqlglot_dialect):
+            pair = f"{left} x {right}"
+            if pair not in report["cartesian"]:
+                report["cartesian"].append(pair)
+        report["rows_examined"] = int(report["rows_examined"])
+        return report
+
+    @staticmethod
+    def describe(report: Dict[str, Any]) -> str:
+        """LLM'e geri beslenen kısa plan özeti."""
+        parts = [
+            f"Tahmini taranan satır sayısı {report['rows_examined']:,} "
+            f"(sınır {settings.COST_GUARD_MAX_ROWS:,})."
+        ]
+        if report["cartesian"]:
+            parts.append("Kartezyen çarpım (JOIN koşulu yok): " + ", ".join(report["cartesian"]) + ".")
+        if report["full_scans"]:
+            parts.append("Büyük tabloların tam taraması: " + ", ".join(
+                f"{scan['table']} ({scan['rows']:,} satır)" for scan in report["full_scans"]
+            ) + ".")
+        return " ".join(parts)
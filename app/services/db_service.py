@@ -1,123 +1,1080 @@
 # app/services/db_service.py
-import pandas as pd
 from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import StaticPool
 import io
-from typing import List, Dict, Any, Optional
+import json
+import os
+import hashlib
+import shutil
+import itertools
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Iterator, Union, BinaryIO
+from app.core.concurrency import current_cancel_token
+from app.core.config import settings
+from app.services.columnar import ColumnarResult
+from app.services.cost_guard import QueryCostGuard
+from app.services.engine_registry import engine_registry
+from app.services.index_advisor import IndexAdvisor
+from app.services.pagination import ResultPager
+from app.services.result_cache import QueryResultCache
+from app.services.schema_index import SchemaIndex
+
+if TYPE_CHECKING:
+    # pandas sadece dosya yükleme ve istatistik yollarında gerekir; açılışta yüklenmez
+    import pandas as pd
+    from app.services.column_stats import ColumnProfiler
+
+class QueryTimeoutError(Exception):
+    """Sorgu SQL_EXECUTION_TIMEOUT süresini aştı ve durduruldu."""
+
+
+class QueryCancelledError(Exception):
+    """Sorgu, istemci bağlantıyı kapattığı için iptal edildi."""
+
+
+class IngestProgress:
+    """
+    Bir dosya yüklemesinin ilerleme durumunu tutar (/upload/progress ile okunur).
+    """
+    def __init__(self, filename: str, bytes_total: Optional[int] = None):
+        self.filename = filename
+        self.status = "running"  # running | done | error
+        self.bytes_total = bytes_total
+        self.bytes_read = 0
+        self.rows = 0
+        self.error: Optional[str] = None
+        self.started_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+
+    def finish(self, error: Optional[str] = None):
+        self.status = "error" if error else "done"
+        self.error = error
+        self.finished_at = datetime.now()
+        if not error and self.bytes_total is not None:
+            self.bytes_read = self.bytes_total
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or datetime.now()
+        return {
+            "filename": self.filename,
+            "status": self.status,
+            "bytes_total": self.bytes_total,
+            "bytes_read": self.bytes_read,
+            "rows": self.rows,
+            "elapsed_seconds": round((end - self.started_at).total_seconds(), 3),
+            "error": self.error,
+        }
 
 class DatabaseManager:
-    def __init__(self, connection_string: str = "sqlite:///:memory:"):
+    # Bir string kolonun "kategorik" sayılması için benzersiz değer üst sınırı
+    CATEGORICAL_VALUE_LIMIT = 15
+
+    # SQLAlchemy dialect adı -> sqlglot dialect adı
+    SQLGLOT_DIALECTS = {"sqlite": "sqlite", "postgresql": "postgres", "mysql": "mysql", "duckdb": "duckdb"}
+
+    # SQLAlchemy dialect adı -> LLM'e söylenen SQL lehçesi
+    DIALECT_LABELS = {"sqlite": "SQLite", "postgresql": "PostgreSQL", "mysql": "MySQL", "duckdb": "DuckDB"}
+
+    # Dosya yüklemeleri için desteklenen bellek içi motorlar
+    UPLOAD_ENGINES = {"sqlite": "sqlite:///:memory:", "duckdb": "duckdb:///:memory:"}
+
+    # Uygulamanın kendi iç tabloları bu ön eki taşır (şemada LLM'e gösterilmez)
+    INTERNAL_PREFIX = "_datachat_"
+
+    # SQLite progress handler'ın süre/iptal kontrolü yaptığı VM adımı aralığı
+    SQLITE_PROGRESS_STEPS = 10000
+
+    # Append/upsert sırasında delta satırlarının yazıldığı geçici tablonun ön eki
+    STAGING_PREFIX = INTERNAL_PREFIX + "staging_"
+
+    # Yüklemede çıkarılan kolon istatistiklerinin (bkz. ColumnProfiler) tutulduğu tablo
+    STATS_TABLE = INTERNAL_PREFIX + "column_stats"
+
+    def __init__(self, connection_string: str = "sqlite:///:memory:", engine: Optional[Engine] = None):
         """
         Veritabanı bağlantısını başlatır.
         Varsayılan olarak in-memory SQLite kullanır.
+        Hazır bir engine verilirse (örn. dosyadan oluşturulan DB) yenisi yaratılmaz.
+        Diğer adresler için engine, EngineRegistry'den (referans sayımlı) alınır.
         """
-        self.engine = create_engine(connection_string)
+        # Uzak veritabanlarında engine (ve bağlantı havuzu) oturumlar arasında paylaşılır
+        self._registry_key: Optional[str] = None
+        if engine is not None:
+            self.engine = engine
+        elif engine_registry.is_shareable(connection_string):
+            self._registry_key, self.engine = engine_registry.acquire(connection_string)
+        else:
+            self.engine = create_engine(connection_string)
+
+        # Dosya yüklemesinden mi oluştu? (Sadece bu veritabanlarına veri eklenebilir)
+        self.is_uploaded = False
+
+        # Veri kaynağının tarifi; paylaşılan oturum deposunda saklanır ve başka bir
+        # worker aynı veriyi open_source ile açar. ({"kind": "memory" | "file" | "url", ...})
+        self.source: Dict[str, Any] = {"kind": "memory"} if engine is not None else {"kind": "url", "url": connection_string}
+
+        # Dosyadaki veritabanı salt okunur mu açıldı? (Yazma işlemleri _writable ile yapılır)
+        self.read_only = False
+
+        # Bellek içi veritabanının yaklaşık boyutu (sadece veri değiştiğinde ölçülür)
+        self.memory_bytes = 0
+
+        # dispose edildi mi? (Sırada bekleyen arka plan işleri kapanmış veritabanına dokunmasın)
+        self.closed = False
+
+        # Tek bağlantılı (StaticPool) engine'de aynı anda çalışan işlerin sorgularını sıraya koyar
+        # (query_guard iç içe kullanılabildiği için yeniden girilebilir)
+        self._connection_lock = threading.RLock()
+
+        # Şema önbelleği (get_schema_info her /chat isteğinde çağrılır)
+        self._schema_cache: Optional[Tuple[str, str]] = None  # (fingerprint, şema metni)
+        self._table_summaries: Dict[str, Tuple[Tuple[Tuple[str, str], ...], str]] = {}
+        self._table_signatures: Dict[str, Tuple[Tuple[str, str], ...]] = {}
+        self._schema_version: Optional[int] = None
+        self._fingerprint: Optional[str] = None
+        # Şemanın arama indeksi (prompt'a sadece ilgili tabloları koymak için; şema değişince yenilenir)
+        self._schema_index: Optional[Tuple[str, SchemaIndex]] = None  # (fingerprint, indeks)
+        # Kolon istatistikleri önbelleği {tablo: {kolon: istatistik}} (veri değişince silinir)
+        self._column_stats: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None
+
+        # Sorgu sonucu önbelleği (/chat ile /export/result aynı SQL'i tekrar çalıştırmasın)
+        self.result_cache = QueryResultCache(settings.RESULT_CACHE_MAX_BYTES, dialect=self.sqlglot_dialect)
+
+        # Sayfalı sonuçların açık imleçleri (/result/page)
+        self.pager = ResultPager(self)
+
+        # Çalıştırma öncesi EXPLAIN maliyet kontrolü (tablo satır sayılarını önbellekler)
+        self.cost_guard = QueryCostGuard(self)
+
+        # Sorgu geçmişinden yüklenen tablolara indeks öneren/ekleyen danışman
+        self.index_advisor = IndexAdvisor(self)
+
+    @property
+    def sqlglot_dialect(self) -> Optional[str]:
+        """Bağlı veritabanının sqlglot karşılığını döndürür (bilinmiyorsa None)."""
+        return self.SQLGLOT_DIALECTS.get(self.engine.dialect.name)
+
+    @property
+    def dialect_label(self) -> str:
+        """LLM'e hangi SQL lehçesinde yazması gerektiğini söylemek için kullanılır."""
+        return self.DIALECT_LABELS.get(self.engine.dialect.name, self.engine.dialect.name)
+
+    @contextmanager
+    def serialized(self) -> Iterator[None]:
+        """
+        Bellek içi yüklemelerde (StaticPool) tüm sorgular tek bağlantıyı paylaşır; bağlantının
+        kesme fonksiyonu ve SQLite progress handler'ı da bağlantı başınadır. query_guard ve
+        aynı oturumda paralel çalışan işler (örn. spekülatif SQL adayları) sorgularını bu blok
+        içinde sırayla çalıştırır. Bağlantı havuzlu engine'lerde etkisizdir.
+        """
+        if not isinstance(self.engine.pool, StaticPool):
+            yield
+            return
+        with self._connection_lock:
+            yield
 
     @classmethod
-    def from_file(cls, file_content: bytes, filename: str):
+    def create_memory_engine(cls, kind: Optional[str] = None) -> Engine:
         """
-        Excel veya CSV dosyasını alır, bellekte geçici bir SQLite veritabanına çevirir
-        ve DatabaseManager örneği döndürür.
+        Dosya yüklemeleri için bellek içi engine oluşturur.
+        kind: "sqlite" (satır tabanlı) veya "duckdb" (kolon tabanlı, çok çekirdekli analitik motor).
+        Varsayılan değer UPLOAD_ENGINE ayarından gelir.
+
+        Varsayılan havuz her bağlantıya ayrı (boş) bir bellek DB'si verir; sonuçlar
+        thread havuzunda akıtıldığı (streaming) için tek bağlantı paylaşılır (StaticPool).
         """
-        # Bellek tabanlı geçici bir engine oluştur
-        temp_engine = create_engine("sqlite:///:memory:")
-        
+        kind = kind or settings.UPLOAD_ENGINE
+        if kind not in cls.UPLOAD_ENGINES:
+            raise ValueError(f"Desteklenmeyen motor: {kind}. Geçerli motorlar: {', '.join(cls.UPLOAD_ENGINES)}")
+        if kind == "duckdb":
+            try:
+                return create_engine(cls.UPLOAD_ENGINES[kind], poolclass=StaticPool)
+            except Exception as e:
+                raise ValueError(f"DuckDB motoru için 'duckdb' ve 'duckdb-engine' paketleri kurulu olmalıdır: {e}")
+        return create_engine(
+            cls.UPLOAD_ENGINES[kind],
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+
+    @classmethod
+    def create_file_engine(cls, kind: Optional[str], path: str, read_only: bool = False) -> Engine:
+        """
+        Dosya yüklemeleri için diskteki bir dosyaya bağlı engine oluşturur.
+        Paylaşılan oturum deposunda (birden fazla worker) veri her worker'ın açabileceği
+        bir dosyada tutulur; okuma yapan worker'lar dosyayı salt okunur açar.
+        """
+        kind = kind or settings.UPLOAD_ENGINE
+        if kind not in cls.UPLOAD_ENGINES:
+            raise ValueError(f"Desteklenmeyen motor: {kind}. Geçerli motorlar: {', '.join(cls.UPLOAD_ENGINES)}")
+        if kind == "duckdb":
+            try:
+                return create_engine(f"duckdb:///{path}", connect_args={"read_only": read_only})
+            except Exception as e:
+                raise ValueError(f"DuckDB motoru için 'duckdb' ve 'duckdb-engine' paketleri kurulu olmalıdır: {e}")
+        url = f"sqlite:///file:{path}?mode=ro&uri=true" if read_only else f"sqlite:///{path}"
+        return create_engine(url, connect_args={"check_same_thread": False})
+
+    @classmethod
+    def open_source(cls, source: Dict[str, Any]) -> "DatabaseManager":
+        """
+        Oturum deposundaki veri kaynağı tarifinden DatabaseManager oluşturur.
+        Başka bir worker'da yüklenmiş bir dosya salt okunur açılır.
+        """
+        kind = source.get("kind")
+        if kind == "url":
+            return cls(connection_string=source["url"])
+        if kind == "file":
+            instance = cls(engine=cls.create_file_engine(source["engine"], source["path"], read_only=True))
+            instance.is_uploaded = True
+            instance.read_only = True
+            instance.source = dict(source)
+            return instance
+        raise ValueError("Bellek içi veritabanı başka bir süreçten açılamaz; paylaşılan oturum deposu kullanın.")
+
+    @staticmethod
+    def remove_source_files(source: Optional[Dict[str, Any]]):
+        """Dosya tabanlı veri kaynağının dosyalarını (SQLite WAL/SHM dahil) siler."""
+        if not source or source.get("kind") != "file":
+            return
+        for suffix in ("", "-wal", "-shm", ".wal"):
+            try:
+                os.remove(source["path"] + suffix)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _copy_source_files(source_path: str, path: str):
+        """Dosyadaki veritabanını (SQLite WAL / DuckDB WAL dahil) yeni bir dosya adına kopyalar."""
+        for suffix in ("", "-wal", ".wal"):
+            if os.path.exists(source_path + suffix):
+                shutil.copyfile(source_path + suffix, path + suffix)
+
+    @contextmanager
+    def _writable(self, path: Optional[str] = None) -> Iterator[Engine]:
+        """
+        Yazma işlemleri için engine sağlar.
+        Salt okunur açılmış (paylaşılan depodaki) dosyalarda 'path' verilirse dosya bu yeni ada
+        kopyalanır ve yazma kopyaya yapılır; iş başarıyla bitince yönetici yeni dosyayı salt okunur
+        açar ve source güncellenir (yüklemedeki gibi: eski dosyayı okuyan worker'lar etkilenmez,
+        DuckDB'nin dosya kilidiyle çakışılmaz). Hata olursa kopya silinir, eski dosya kalır.
+        'path' yoksa geçici bir okuma-yazma engine'i ile yerinde yazılır (sadece SQLite'ta
+        kullanılır, örn. indeks danışmanı); DuckDB aynı dosyayı bir süreç içinde iki farklı
+        modda açamadığı için önce mevcut engine kapatılır.
+        """
+        if not self.read_only:
+            yield self.engine
+            return
+        kind, source_path = self.source["engine"], self.source["path"]
+        if path is None:
+            self.engine.dispose()
+            writer = self.create_file_engine(kind, source_path)
+            try:
+                yield writer
+            finally:
+                writer.dispose()
+                self.engine = self.create_file_engine(kind, source_path, read_only=True)
+            return
+
+        self._copy_source_files(source_path, path)
+        writer = self.create_file_engine(kind, path)
         try:
-            if filename.endswith(".csv"):
-                # CSV okuma
-                df = pd.read_csv(io.BytesIO(file_content))
-            elif filename.endswith((".xls", ".xlsx")):
-                # Excel okuma
-                df = pd.read_excel(io.BytesIO(file_content))
+            yield writer
+        except BaseException:
+            writer.dispose()
+            self.remove_source_files({"kind": "file", "path": path})
+            raise
+        writer.dispose()
+        old_engine = self.engine
+        self.engine = self.create_file_engine(kind, path, read_only=True)
+        self.source = {**self.source, "path": path}
+        old_engine.dispose()
+
+    @staticmethod
+    def _iter_frames(file_content: Union[bytes, BinaryIO], filename: str, progress: Optional["IngestProgress"] = None) -> Iterator["pd.DataFrame"]:
+        """
+        Yüklenen CSV/Excel içeriğini DataFrame parçaları halinde okur.
+        CSV dosyaları INGEST_CHUNK_ROWS satırlık parçalarla okunur; böylece dosyanın
+        tamamı hiçbir zaman belleğe alınmaz. Excel formatı parçalı okumayı desteklemediği
+        için tek parça olarak döner.
+        """
+        import pandas as pd
+
+        file_obj = io.BytesIO(file_content) if isinstance(file_content, (bytes, bytearray)) else file_content
+        if filename.endswith(".csv"):
+            # CSV okuma (parça parça)
+            frames = pd.read_csv(file_obj, chunksize=settings.INGEST_CHUNK_ROWS)
+        elif filename.endswith((".xls", ".xlsx")):
+            # Excel okuma
+            frames = iter([pd.read_excel(file_obj)])
+        else:
+            raise ValueError("Desteklenmeyen dosya formatı. Sadece .csv ve .xlsx kabul edilir.")
+
+        for frame in frames:
+            if progress is not None:
+                progress.bytes_read = file_obj.tell()
+            yield frame
+
+    @staticmethod
+    def _reconcile_dtypes(chunk: "pd.DataFrame", dtypes: Dict[str, Any]) -> "pd.DataFrame":
+        """
+        Parçalı okumada her parçanın tipleri ayrı çıkarılır. İlk parçada tam sayı olan bir
+        kolon sonraki parçada boş değer yüzünden float'a, sayısal bir kolon ise tek bir
+        hatalı hücre yüzünden metne dönebilir. Tabloyu tutarlı tutmak için parçayı ilk
+        parçanın tiplerine yaklaştırır.
+        """
+        import pandas as pd
+
+        for col, dtype in dtypes.items():
+            if col not in chunk or chunk[col].dtype == dtype:
+                continue
+            current = chunk[col].dtype
+            try:
+                if pd.api.types.is_integer_dtype(dtype) and pd.api.types.is_float_dtype(current):
+                    chunk[col] = chunk[col].astype("Int64")
+                elif pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_numeric_dtype(current):
+                    chunk[col] = pd.to_numeric(chunk[col])
+            except (TypeError, ValueError):
+                # Dönüştürülemeyen değerler olduğu gibi yazılır (SQLite tip esnekliği)
+                pass
+        return chunk
+
+    @classmethod
+    def _write_frames(
+        cls,
+        conn,
+        table_name: str,
+        frames: Iterator["pd.DataFrame"],
+        if_exists: str = "fail",
+        progress: Optional["IngestProgress"] = None,
+        profiler: Optional["ColumnProfiler"] = None,
+    ) -> int:
+        """
+        DataFrame parçalarını çağıranın açtığı tek transaction içinde tabloya yazar.
+        Satırlar INGEST_INSERT_BATCH'lik executemany grupları halinde eklenir.
+        'profiler' verilirse her parça yazılırken kolon istatistikleri de çıkarılır.
+        Yazılan toplam satır sayısını döndürür.
+        """
+        rows = 0
+        dtypes: Optional[Dict[str, Any]] = None
+        for frame in frames:
+            if dtypes is None:
+                dtypes = frame.dtypes.to_dict()
             else:
-                raise ValueError("Desteklenmeyen dosya formatı. Sadece .csv ve .xlsx kabul edilir.")
-            
-            # Tablo adını dosya adından türet (boşlukları _ yap, küçük harfe çevir)
-            table_name = filename.split('.')[0].replace(" ", "_").lower()
+                frame = cls._reconcile_dtypes(frame, dtypes)
+                if_exists = "append"
+            if profiler is not None:
+                profiler.update(frame)
+            if conn.dialect.name == "duckdb":
+                cls._write_frame_duckdb(conn, table_name, frame, if_exists)
+            else:
+                frame.to_sql(table_name, conn, index=False, if_exists=if_exists, chunksize=settings.INGEST_INSERT_BATCH)
+            rows += len(frame)
+            if progress is not None:
+                progress.rows = rows
+        return rows
+
+    @staticmethod
+    def _write_frame_duckdb(conn, table_name: str, frame: "pd.DataFrame", if_exists: str):
+        """
+        DuckDB'de satır satır INSERT (executemany) çok yavaştır; DataFrame sanal tablo
+        olarak kaydedilip tek bir vektörel INSERT ... SELECT ile yazılır.
+        """
+        quote = conn.dialect.identifier_preparer.quote
+        target = quote(table_name)
+        view_name = f"{DatabaseManager.INTERNAL_PREFIX}frame"
+        raw = conn.connection.driver_connection
+        raw.register(view_name, frame)
+        try:
+            if if_exists == "append":
+                column_list = ", ".join(quote(str(col)) for col in frame.columns)
+                conn.execute(text(f"INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {view_name}"))
+            else:
+                create = "CREATE OR REPLACE TABLE" if if_exists == "replace" else "CREATE TABLE"
+                conn.execute(text(f"{create} {target} AS SELECT * FROM {view_name}"))
+        finally:
+            raw.unregister(view_name)
+
+    @staticmethod
+    def table_name_from_filename(filename: str) -> str:
+        """Tablo adını dosya adından türetir (boşlukları _ yap, küçük harfe çevir)."""
+        return filename.split('.')[0].replace(" ", "_").lower()
+
+    @classmethod
+    def from_file(
+        cls,
+        file_content: Union[bytes, BinaryIO],
+        filename: str,
+        progress: Optional["IngestProgress"] = None,
+        engine: Optional[str] = None,
+        path: Optional[str] = None,
+    ):
+        """
+        Excel veya CSV dosyasını alır, bellekte geçici bir veritabanına (SQLite veya DuckDB)
+        çevirir ve DatabaseManager örneği döndürür.
+        'file_content' byte dizisi veya (diske taşan) bir dosya nesnesi olabilir.
+        'path' verilirse veritabanı bellek yerine bu dosyaya yazılır ve salt okunur açılır
+        (paylaşılan oturum deposunda diğer worker'lar da aynı dosyayı açabilsin diye).
+        """
+        # Bellek tabanlı (veya paylaşılan depoda dosya tabanlı) geçici bir engine oluştur
+        temp_engine = cls.create_file_engine(engine, path) if path else cls.create_memory_engine(engine)
+        
+        try:
+            table_name = cls.table_name_from_filename(filename)
             
-            # Veriyi SQL tablosuna yaz
-            df.to_sql(table_name, temp_engine, index=False)
+            # Veriyi SQL tablosuna parça parça, tek transaction içinde yaz
+            # (kolon istatistikleri aynı geçişte çıkarılıp yan tabloya yazılır)
+            with temp_engine.begin() as conn:
+                if path and conn.dialect.name == "sqlite":
+                    # Okuyucular (diğer worker'lar) sonradan yapılan eklemeleri beklemesin
+                    conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+                from app.services.column_stats import ColumnProfiler
+                profiler = ColumnProfiler()
+                cls._write_frames(
+                    conn, table_name, cls._iter_frames(file_content, filename, progress),
+                    progress=progress, profiler=profiler
+                )
+                cls._save_column_stats(conn, table_name, profiler)
+
+            if path:
+                temp_engine.dispose()
+                instance = cls.open_source({"kind": "file", "path": path, "engine": engine or settings.UPLOAD_ENGINE})
+                return instance, instance.engine
             
-            # Yeni bir instance oluştur ve engine'i set et
-            instance = cls(connection_string="sqlite:///:memory:")
-            instance.engine = temp_engine # Oluşturduğumuz dolu engine'i kullan
+            # Oluşturduğumuz dolu engine ile yeni bir instance oluştur
+            instance = cls(engine=temp_engine)
+            instance.is_uploaded = True
+            instance.refresh_memory_usage()
             return instance, temp_engine
             
+        except Exception as e:
+            temp_engine.dispose()
+            if path:
+                cls.remove_source_files({"kind": "file", "path": path})
+            raise ValueError(f"Dosya işlenirken hata oluştu: {str(e)}")
+
+    def append_file(
+        self,
+        file_content: Union[bytes, BinaryIO],
+        filename: str,
+        table_name: Optional[str] = None,
+        mode: str = "append",
+        key_columns: Optional[List[str]] = None,
+        progress: Optional["IngestProgress"] = None,
+        path: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Yüklenen dosyayı (delta) mevcut veritabanındaki bir tabloya ekler.
+        Tüm tabloyu yeniden okumak yerine sadece yeni satırlar yazılır.
+        Paylaşılan depodaki (salt okunur) dosyalarda ekleme 'path' adlı yeni bir dosyaya yapılır
+        ve source bu dosyayı gösterir (bkz. _writable); eski dosya diğer worker'larda açık kalabilir.
+
+        Modlar:
+            append: Satırları ekler. Anahtar kolon verilirse, tabloda zaten olan anahtarlar atlanır.
+            upsert: Anahtarı eşleşen eski satırları silip yenilerini yazar (anahtar zorunlu).
+        """
+        if not self.is_uploaded:
+            raise ValueError("Veri ekleme sadece dosyadan oluşturulan oturumlarda desteklenir.")
+        if mode not in ("append", "upsert"):
+            raise ValueError(f"Geçersiz yükleme modu: {mode}")
+        key_columns = key_columns or []
+        if mode == "upsert" and not key_columns:
+            raise ValueError("Upsert modu için en az bir anahtar kolon (key_columns) gereklidir.")
+        if self.read_only and not path:
+            raise ValueError("Paylaşılan veri dosyasına ekleme için yeni bir dosya yolu gereklidir.")
+
+        try:
+            frames = self._iter_frames(file_content, filename, progress)
+            first = next(frames)
         except Exception as e:
             raise ValueError(f"Dosya işlenirken hata oluştu: {str(e)}")
+        frames = itertools.chain([first], frames)
+
+        table_name = table_name or self.table_name_from_filename(filename)
+        signatures = self._read_table_signatures()
+
+        # Veri değişeceği için açık sayfa imleçleri geçersiz; ayrıca SQLite'ta açık bir
+        # SELECT aynı bağlantıdaki DROP TABLE'ı (staging) kilitler
+        self.pager.close_all()
+
+        # Tablo yoksa (ilk yükleme veya yeni dosya) doğrudan oluştur
+        if table_name not in signatures:
+            with self._writable(path) as engine, engine.begin() as conn:
+                from app.services.column_stats import ColumnProfiler
+                profiler = ColumnProfiler()
+                inserted = self._write_frames(conn, table_name, frames, progress=progress, profiler=profiler)
+                self._save_column_stats(conn, table_name, profiler)
+            self.refresh_schema(table_name)
+            self.result_cache.clear()
+            self.refresh_memory_usage()
+            return {"table": table_name, "inserted": inserted, "replaced": 0, "skipped": 0}
+
+        existing_columns = {col_name for col_name, _ in signatures[table_name]}
+        unknown = [col for col in first.columns if col not in existing_columns]
+        if unknown:
+            raise ValueError(f"Dosyadaki şu kolonlar '{table_name}' tablosunda yok: {', '.join(map(str, unknown))}")
+        missing_keys = [col for col in key_columns if col not in first.columns]
+        if missing_keys:
+            raise ValueError(f"Anahtar kolon(lar) dosyada bulunamadı: {', '.join(missing_keys)}")
+
+        quote = self.engine.dialect.identifier_preparer.quote
+        target = quote(table_name)
+        staging_name = f"{self.STAGING_PREFIX}{table_name}"
+        staging = quote(staging_name)
+        column_list = ", ".join(quote(col) for col in first.columns)
+        key_match = " AND ".join(f"s.{quote(col)} = t.{quote(col)}" for col in key_columns)
+        target_match = " AND ".join(f"s.{quote(col)} = {target}.{quote(col)}" for col in key_columns)
+
+        # Delta içindeki tekrar eden anahtarlardan sadece sonuncusu kalsın
+        source = staging
+        if key_columns:
+            key_list = ", ".join(quote(col) for col in key_columns)
+            source = f"(SELECT * FROM {staging} WHERE rowid IN (SELECT MAX(rowid) FROM {staging} GROUP BY {key_list}))"
+
+        replaced = 0
+        with self._writable(path) as engine, engine.begin() as conn:
+            # Delta'yı önce geçici tabloya yaz, birleştirmeyi SQL tarafında yap
+            staged = self._write_frames(conn, staging_name, frames, if_exists="replace", progress=progress)
+            try:
+                if mode == "upsert":
+                    replaced = self._affected_rows(conn.execute(text(
+                        f"DELETE FROM {target} WHERE EXISTS "
+                        f"(SELECT 1 FROM {staging} AS s WHERE {target_match})"
+                    )))
+                    insert_sql = f"INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {source} AS s"
+                elif key_columns:
+                    insert_sql = (
+                        f"INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {source} AS s "
+                        f"WHERE NOT EXISTS (SELECT 1 FROM {target} AS t WHERE {key_match})"
+                    )
+                else:
+                    insert_sql = f"INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {staging}"
+                inserted = self._affected_rows(conn.execute(text(insert_sql)))
+            finally:
+                conn.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+            # Silinen/eklenen satırlar yüzünden istatistikler parçalardan birleştirilemez;
+            # tablo aynı transaction içinde tek geçişte yeniden profillenir
+            self._rebuild_column_stats(conn, table_name)
+
+        # Sadece etkilenen tablonun şema özetini geçersiz kıl, eski sonuçları at
+        self.refresh_schema(table_name)
+        self.result_cache.clear()
+        self.refresh_memory_usage()
+        return {
+            "table": table_name,
+            "inserted": inserted,
+            "replaced": replaced,
+            "skipped": staged - inserted if mode == "append" else 0,
+        }
+
+    def refresh_memory_usage(self) -> int:
+        """
+        Bellek içi (yüklenmiş dosya) veritabanının kapladığı alanı ölçer ve saklar.
+        Oturum yöneticisi bellek bütçesini bu değerle denetler; uzak ve dosya tabanlı
+        veritabanları 0 sayılır.
+        """
+        if not self.is_uploaded or self.source.get("kind") == "file":
+            self.memory_bytes = 0
+            return 0
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name == "duckdb":
+                    size = conn.execute(text("SELECT SUM(memory_usage_bytes) FROM duckdb_memory()")).scalar()
+                else:
+                    page_count = conn.execute(text("PRAGMA page_count")).scalar()
+                    page_size = conn.execute(text("PRAGMA page_size")).scalar()
+                    size = page_count * page_size
+            self.memory_bytes = int(size or 0)
+        except Exception:
+            pass  # Ölçülemezse son bilinen değer kalsın
+        return self.memory_bytes
+
+    @staticmethod
+    def _affected_rows(result) -> int:
+        """INSERT/DELETE'ten etkilenen satır sayısı (DuckDB bunu tek satırlık sonuç olarak döner)."""
+        if result.rowcount is not None and result.rowcount >= 0:
+            return result.rowcount
+        try:
+            return int(result.scalar() or 0)
+        except Exception:
+            return 0
+
+    def get_schema_fingerprint(self) -> str:
+        """
+        Şemanın (tablo listesi + kolon tipleri) kısa bir özetini (hash) döndürür.
+        SQLite'ta önce ucuz 'PRAGMA schema_version' kontrol edilir; sürüm değişmediyse
+        tablolar yeniden incelenmez.
+        """
+        version = self._read_schema_version()
+        if version is not None and self._schema_version == version and self._fingerprint:
+            return self._fingerprint
+
+        signatures = self._read_table_signatures()
+        digest = hashlib.sha1(repr(sorted(signatures.items())).encode("utf-8")).hexdigest()
+        self._table_signatures = signatures
+        self._schema_version = version
+        self._fingerprint = digest
+        return digest
+
+    def _read_schema_version(self) -> Optional[int]:
+        """Sadece SQLite için: her DDL işleminde artan şema sürüm numarasını okur."""
+        if self.engine.dialect.name != "sqlite":
+            return None
+        try:
+            with self.engine.connect() as conn:
+                return conn.execute(text("PRAGMA schema_version")).scalar()
+        except SQLAlchemyError:
+            return None
+
+    def _read_table_signatures(self) -> Dict[str, Tuple[Tuple[str, str], ...]]:
+        """Her tablo için (kolon adı, kolon tipi) listesini çıkarır (iç tablolar hariç)."""
+        if self.engine.dialect.name == "duckdb":
+            # duckdb-engine'in reflection desteği sınırlı; information_schema tek sorguda yeterli
+            signatures: Dict[str, List[Tuple[str, str]]] = {}
+            with self.engine.connect() as conn:
+                rows = conn.execute(text(
+                    "SELECT table_name, column_name, data_type FROM information_schema.columns "
+                    "WHERE table_schema = 'main' ORDER BY table_name, ordinal_position"
+                )).fetchall()
+            for table_name, col_name, col_type in rows:
+                signatures.setdefault(table_name, []).append((col_name, col_type))
+            return {
+                table_name: tuple(columns) for table_name, columns in signatures.items()
+                if not table_name.startswith(self.INTERNAL_PREFIX)
+            }
+
+        inspector = inspect(self.engine)
+        return {
+            table_name: tuple((col['name'], str(col['type'])) for col in inspector.get_columns(table_name))
+            for table_name in inspector.get_table_names()
+            if not table_name.startswith(self.INTERNAL_PREFIX)
+        }
 
     def get_schema_info(self) -> str:
         """
         LLM'in veriyi anlaması için veritabanı şemasını özetler.
         Akıllı özellik: Az sayıda benzersiz değeri olan (kategorik) string sütunların
         içeriğini de listeler (Örn: Status sütunu için ['Active', 'Passive'] gibi).
+
+        Sonuç, şema parmak izine (fingerprint) göre önbelleğe alınır; şema değişmediği
+        sürece tekrar eden çağrılar veritabanına hiç gitmez.
         """
-        inspector = inspect(self.engine)
+        fingerprint = self.get_schema_fingerprint()
+        if self._schema_cache is not None and self._schema_cache[0] == fingerprint:
+            return self._schema_cache[1]
+
         schema_text = []
-        
-        for table_name in inspector.get_table_names():
-            columns_info = []
-            columns = inspector.get_columns(table_name)
-            
-            for col in columns:
-                col_name = col['name']
-                col_type = str(col['type'])
-                extra_info = ""
-                
-                # Zenginleştirme: Eğer string/text ise ve benzersiz değer sayısı azsa, örnekleri ekle
-                if "VARCHAR" in col_type or "TEXT" in col_type or "String" in col_type:
-                    try:
-                        with self.engine.connect() as conn:
-                            # Benzersiz değer sayısını kontrol et
-                            count_query = text(f"SELECT COUNT(DISTINCT \"{col_name}\") FROM \"{table_name}\"")
-                            unique_count = conn.execute(count_query).scalar()
-                            
-                            # Eğer 15'ten az çeşit varsa bunları listeye ekle (LLM için ipucu)
-                            if unique_count and unique_count < 15:
-                                values_query = text(f"SELECT DISTINCT \"{col_name}\" FROM \"{table_name}\" LIMIT 15")
-                                values = [str(row[0]) for row in conn.execute(values_query).fetchall() if row[0] is not None]
-                                extra_info = f" (Olası Değerler: {', '.join(values)})"
-                    except:
-                        pass # Şema çıkarırken hata olursa akışı bozma, sadece ekstra bilgiyi geç
-                
-                columns_info.append(f"- {col_name} ({col_type}){extra_info}")
-            
-            # Tablo bloğunu oluştur
-            schema_text.append(f"TABLO: {table_name}")
-            schema_text.append("SÜTUNLAR:")
-            schema_text.append("\n".join(columns_info))
-            schema_text.append("-" * 30)
-            
-        return "\n".join(schema_text)
+        for table_name, signature in self._table_signatures.items():
+            # Tablo yapısı değişmediyse önceki özeti yeniden kullan
+            cached = self._table_summaries.get(table_name)
+            if cached is None or cached[0] != signature:
+                cached = (signature, self._summarize_table(table_name, signature))
+                self._table_summaries[table_name] = cached
+            schema_text.append(cached[1])
+
+        # Silinmiş tabloların özetlerini at
+        for table_name in list(self._table_summaries):
+            if table_name not in self._table_signatures:
+                del self._table_summaries[table_name]
 
-    def execute_safe_query(self, sql: str) -> Dict[str, Any]:
+        result = "\n".join(schema_text)
+        self._schema_cache = (fingerprint, result)
+        return result
+
+    def get_schema_index(self) -> SchemaIndex:
         """
-        SQL sorgusunu çalıştırır ve sonuçları JSON formatında döndürür.
-        Not: Güvenlik kontrolleri (Validation) çağıran katmanda yapılmalıdır.
+        Tablo şema bloklarından (get_schema_info ile aynı metinler) BM25 arama indeksi ve
+        JOIN komşuluk grafiği kurar; şema parmak izi değişmedikçe yeniden kurulmaz.
         """
+        self.get_schema_info()
+        fingerprint = self._schema_cache[0]
+        if self._schema_index is not None and self._schema_index[0] == fingerprint:
+            return self._schema_index[1]
+        index = SchemaIndex(
+            {table_name: self._table_summaries[table_name][1] for table_name in self._table_signatures},
+            {table_name: [col_name for col_name, _ in signature] for table_name, signature in self._table_signatures.items()},
+            self._read_foreign_keys(),
+        )
+        self._schema_index = (fingerprint, index)
+        return index
+
+    def _read_foreign_keys(self) -> Dict[str, set]:
+        """Tanımlı yabancı anahtarlar: tablo -> başvurduğu tablolar (yüklenen dosyalarda yoktur)."""
+        if self.is_uploaded:
+            return {}
+        try:
+            multi = inspect(self.engine).get_multi_foreign_keys()
+        except Exception:
+            return {}
+        return {
+            table_name: {fk["referred_table"] for fk in fks if fk.get("referred_table")}
+            for (_, table_name), fks in multi.items()
+        }
+
+    def _summarize_table(self, table_name: str, signature: Tuple[Tuple[str, str], ...]) -> str:
+        """
+        Tek bir tablonun şema bloğunu (kategorik değer ve tarih aralığı ipuçlarıyla) üretir.
+        Yüklemede çıkarılan kolon istatistikleri varsa veritabanına sorgu gönderilmez.
+        """
+        text_columns = [
+            col_name for col_name, col_type in signature
+            if "VARCHAR" in col_type or "TEXT" in col_type or "String" in col_type
+        ]
+        stats = self.get_column_stats().get(table_name)
+        if stats:
+            categorical_values = {
+                col_name: [str(value) for value, _ in stats[col_name]["top_values"]]
+                for col_name in text_columns
+                if col_name in stats and stats[col_name]["kind"] == "category"
+                and 0 < stats[col_name]["distinct_count"] < self.CATEGORICAL_VALUE_LIMIT
+            }
+        else:
+            categorical_values = self._probe_categorical_values(table_name, text_columns)
+
+        columns_info = []
+        for col_name, col_type in signature:
+            extra_info = ""
+            values = categorical_values.get(col_name)
+            item = (stats or {}).get(col_name)
+            if values:
+                extra_info = f" (Olası Değerler: {', '.join(values)})"
+            elif item and item["kind"] == "date" and item["min"] is not None:
+                extra_info = f" (Aralık: {item['min']} – {item['max']})"
+            columns_info.append(f"- {col_name} ({col_type}){extra_info}")
+
+        # Tablo bloğunu oluştur
+        return "\n".join([
+            f"TABLO: {table_name}",
+            "SÜTUNLAR:",
+            "\n".join(columns_info),
+            "-" * 30,
+        ])
+
+    @classmethod
+    def _save_column_stats(cls, conn, table_name: str, profiler: "ColumnProfiler"):
+        """Profil sonucunu (tablonun eski kayıtlarının yerine) istatistik tablosuna yazar."""
+        quote = conn.dialect.identifier_preparer.quote
+        stats_table = quote(cls.STATS_TABLE)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {stats_table} (table_name TEXT, column_name TEXT, position INTEGER, "
+            "kind TEXT, row_count BIGINT, null_count BIGINT, distinct_count BIGINT, "
+            "min_value TEXT, max_value TEXT, top_values TEXT)"
+        ))
+        conn.execute(text(f"DELETE FROM {stats_table} WHERE table_name = :table_name"), {"table_name": table_name})
+        rows = [
+            {
+                "table_name": table_name, "column_name": item["column"], "position": position,
+                "kind": item["kind"], "row_count": item["row_count"], "null_count": item["null_count"],
+                "distinct_count": item["distinct_count"],
+                "min_value": None if item["min"] is None else str(item["min"]),
+                "max_value": None if item["max"] is None else str(item["max"]),
+                "top_values": json.dumps(item["top_values"], default=str, ensure_ascii=False),
+            }
+            for position, item in enumerate(profiler.results())
+        ]
+        if rows:
+            conn.execute(text(
+                f"INSERT INTO {stats_table} VALUES (:table_name, :column_name, :position, :kind, :row_count, "
+                ":null_count, :distinct_count, :min_value, :max_value, :top_values)"
+            ), rows)
+
+    @classmethod
+    def _rebuild_column_stats(cls, conn, table_name: str):
+        """Mevcut tabloyu parça parça okuyup istatistiklerini yeniden çıkarır."""
+        import pandas as pd
+        from app.services.column_stats import ColumnProfiler
+
+        quote = conn.dialect.identifier_preparer.quote
+        profiler = ColumnProfiler()
+        for frame in pd.read_sql(text(f"SELECT * FROM {quote(table_name)}"), conn, chunksize=settings.INGEST_CHUNK_ROWS):
+            profiler.update(frame)
+        cls._save_column_stats(conn, table_name, profiler)
+
+    def get_column_stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Yüklemede çıkarılan kolon istatistikleri: {tablo: {kolon: {kind, row_count, null_count,
+        distinct_count, min, max, top_values}}}. Dosyadan oluşmayan veritabanlarında boştur.
+        """
+        if self._column_stats is not None:
+            return self._column_stats
+        stats: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        if self.is_uploaded:
+            try:
+                with self.engine.connect() as conn:
+                    rows = conn.execute(text(
+                        f"SELECT table_name, column_name, kind, row_count, null_count, distinct_count, "
+                        f"min_value, max_value, top_values FROM {self.engine.dialect.identifier_preparer.quote(self.STATS_TABLE)} "
+                        "ORDER BY table_name, position"
+                    )).fetchall()
+            except SQLAlchemyError:
+                rows = []  # Eski sürümde yüklenmiş veri: istatistik tablosu yok
+            for table_name, column, kind, row_count, nulls, distinct, low, high, top in rows:
+                stats.setdefault(table_name, {})[column] = {
+                    "kind": kind, "row_count": row_count, "null_count": nulls, "distinct_count": distinct,
+                    "min": low, "max": high, "top_values": json.loads(top) if top else [],
+                }
+        self._column_stats = stats
+        return stats
+
+    def column_hints(self, columns: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Sorgu sonucundaki kolon adlarını tablolardaki kolonlarla eşleyip istatistiklerini
+        döndürür (grafik önerisi için). Aynı ad farklı türde birden fazla tabloda varsa atlanır.
+        """
+        hints: Dict[str, Dict[str, Any]] = {}
+        ambiguous = set()
+        for table_stats in self.get_column_stats().values():
+            for column in columns:
+                item = table_stats.get(column)
+                if item is None:
+                    continue
+                if column in hints and hints[column]["kind"] != item["kind"]:
+                    ambiguous.add(column)
+                elif column not in hints or item["distinct_count"] > hints[column]["distinct_count"]:
+                    hints[column] = item
+        return {column: item for column, item in hints.items() if column not in ambiguous}
+
+    def _probe_categorical_values(self, table_name: str, columns: List[str]) -> Dict[str, List[str]]:
+        """
+        Zenginleştirme: String kolonlardan benzersiz değer sayısı az olanların değerlerini döner.
+        Kolon başına ayrı bağlantı açmak yerine tablo başına tek bir sayım sorgusu ve
+        tek bir (UNION ALL) değer sorgusu çalıştırılır.
+        """
+        if not columns:
+            return {}
+
+        limit = self.CATEGORICAL_VALUE_LIMIT
         try:
             with self.engine.connect() as conn:
+                # Benzersiz değer sayılarını tek seferde kontrol et
+                quote = self.engine.dialect.identifier_preparer.quote
+                table = quote(table_name)
+                count_sql = ", ".join(f"COUNT(DISTINCT {quote(col)})" for col in columns)
+                counts = conn.execute(text(f"SELECT {count_sql} FROM {table}")).fetchone()
+
+                # Eğer 15'ten az çeşit varsa bunları listeye ekle (LLM için ipucu)
+                categorical = [col for col, count in zip(columns, counts) if count and count < limit]
+                if not categorical:
+                    return {}
+
+                values_sql = " UNION ALL ".join(
+                    f"SELECT * FROM (SELECT {idx} AS col_idx, {quote(col)} AS val FROM {table} "
+                    f"WHERE {quote(col)} IS NOT NULL GROUP BY {quote(col)} LIMIT {limit}) AS q{idx}"
+                    for idx, col in enumerate(categorical)
+                )
+                values: Dict[str, List[str]] = {col: [] for col in categorical}
+                for col_idx, val in conn.execute(text(values_sql)).fetchall():
+                    values[categorical[col_idx]].append(str(val))
+                return values
+        except Exception:
+            return {} # Şema çıkarırken hata olursa akışı bozma, sadece ekstra bilgiyi geç
+
+    def refresh_schema(self, table_name: Optional[str] = None):
+        """
+        Şema önbelleğini temizler. Tablo adı verilirse sadece o tablonun özeti yenilenir.
+        """
+        if table_name is None:
+            self._table_summaries.clear()
+        else:
+            self._table_summaries.pop(table_name, None)
+        self.cost_guard.forget(table_name)
+        self._column_stats = None
+        self._schema_cache = None
+        self._schema_version = None
+        self._fingerprint = None
+
+    @contextmanager
+    def query_guard(self, conn, timeout: Optional[float] = None) -> Iterator[None]:
+        """
+        Blok içindeki sorguya süre sınırı koyar ve isteğin CancelToken'ı iptal edilirse
+        sorguyu durdurur. Motor bazında:
+            sqlite: progress handler her N VM adımında süreyi/iptali kontrol eder
+            duckdb: süre dolunca (veya iptalde) connection.interrupt()
+            postgresql: SET LOCAL statement_timeout, iptalde connection.cancel()
+            mysql: max_execution_time (sadece SELECT), iptalde başka bağlantıdan KILL QUERY
+        Süre aşılırsa QueryTimeoutError, iptalde QueryCancelledError fırlatır.
+        Tek bağlantılı engine'lerde bağlantı başına kurulan kesme ayarları başka bir thread'in
+        sorgusuna karışmasın diye bloklar sırayla çalışır (bkz. serialized).
+        """
+        with self.serialized():
+            with self._guarded(conn, timeout):
+                yield
+
+    @contextmanager
+    def _guarded(self, conn, timeout: Optional[float]) -> Iterator[None]:
+        timeout = settings.SQL_EXECUTION_TIMEOUT if timeout is None else timeout
+        token = current_cancel_token.get()
+        if token is not None and token.cancelled:
+            raise QueryCancelledError("İstemci bağlantıyı kapattığı için sorgu iptal edildi.")
+
+        deadline = time.monotonic() + timeout if timeout else None
+        raw = conn.connection.dbapi_connection
+        dialect = self.engine.dialect.name
+        interrupt = None
+        timer = None
+        restore = None
+
+        if dialect == "sqlite":
+            def progress() -> int:
+                expired = deadline is not None and time.monotonic() > deadline
+                return 1 if expired or (token is not None and token.cancelled) else 0
+            raw.set_progress_handler(progress, self.SQLITE_PROGRESS_STEPS)
+            restore = lambda: raw.set_progress_handler(None, 0)
+        elif dialect == "duckdb":
+            interrupt = raw.interrupt
+            if timeout:
+                timer = threading.Timer(timeout, interrupt)
+        elif dialect == "postgresql":
+            if timeout:
+                # Bağlantı bloğun sonunda rollback edilir; ayar havuzdaki bağlantıya kalmaz
+                conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout * 1000)}")
+            interrupt = raw.cancel
+        elif dialect == "mysql":
+            if timeout:
+                conn.exec_driver_sql(f"SET SESSION max_execution_time = {int(timeout * 1000)}")
+                restore = lambda: conn.exec_driver_sql("SET SESSION max_execution_time = 0")
+            thread_id = raw.thread_id()
+            interrupt = lambda: self._kill_mysql_query(thread_id)
+
+        if timer is not None:
+            timer.daemon = True
+            timer.start()
+        try:
+            with token.on_cancel(interrupt) if token is not None and interrupt else nullcontext():
+                yield
+        except Exception as e:
+            if token is not None and token.cancelled:
+                raise QueryCancelledError("İstemci bağlantıyı kapattığı için sorgu iptal edildi.") from e
+            if deadline is not None and time.monotonic() >= deadline - 0.1:
+                raise QueryTimeoutError(
+                    f"Sorgu {timeout:g} saniyelik süre sınırını aştı ve durduruldu."
+                ) from e
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if restore is not None:
+                try:
+                    restore()
+                except Exception:
+                    pass
+
+    def _kill_mysql_query(self, thread_id: int):
+        # Çalışan sorgu kendi bağlantısını kilitlediği için ayrı bir bağlantıdan durdurulur
+        with self.engine.connect() as conn:
+            conn.exec_driver_sql(f"KILL QUERY {int(thread_id)}")
+
+    def execute_query(self, sql: str, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        SQL sorgusunu çalıştırır ve sonucu kolon tabanlı döndürür: {"table": ColumnarResult, "count": n}.
+        Aynı (normalize edilmiş) SQL daha önce çalıştıysa sonuç önbellekten gelir.
+        Sorgu SQL_EXECUTION_TIMEOUT'u aşarsa veya istek iptal edilirse durdurulur;
+        hata yanıtında "timeout" / "cancelled" işaretlenir.
+        Not: Güvenlik kontrolleri (Validation) çağıran katmanda yapılmalıdır.
+        """
+        if use_cache:
+            cached = self.result_cache.get(sql)
+            if cached is not None:
+                return cached
+
+        try:
+            with self.engine.connect() as conn, self.query_guard(conn):
                 result = conn.execute(text(sql))
                 
-                # Veri varsa çek
+                # Veri varsa çek (satır başına dict üretmeden kolonlara çevrilir)
                 if result.returns_rows:
-                    keys = result.keys()
-                    data = [dict(zip(keys, row)) for row in result.fetchall()]
-                    return {"data": data, "count": len(data)}
+                    table = ColumnarResult.from_rows(result.keys(), result.fetchall())
+                    response = {"table": table, "count": table.count}
+                    if use_cache:
+                        self.result_cache.put(sql, response)
+                    return response
                 else:
                     # Insert/Update gibi işlemse (gerçi izin vermiyoruz ama)
                     return {"message": "İşlem başarılı", "rows_affected": result.rowcount}
                     
+        except QueryTimeoutError as e:
+            return {"error": str(e), "timeout": True}
+        except QueryCancelledError as e:
+            return {"error": str(e), "cancelled": True}
         except SQLAlchemyError as e:
             # Veritabanı hatasını temiz bir şekilde döndür
             return {"error": str(e)}
         except Exception as e:
             return {"error": f"Beklenmeyen hata: {str(e)}"}
 
+    def execute_safe_query(self, sql: str, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        SQL sorgusunu çalıştırır ve sonuçları satır tabanlı JSON formatında döndürür
+        ({"data": [{kolon: değer}], "count": n}).
+        Not: Güvenlik kontrolleri (Validation) çağıran katmanda yapılmalıdır.
+        """
+        response = self.execute_query(sql, use_cache=use_cache)
+        if "table" not in response:
+            return response
+        return {"data": response["table"].records(), "count": response["count"]}
+
+    def stream_query(self, sql: str, batch_size: int, max_rows: Optional[int] = None) -> Iterator[Any]:
+        """
+        Sorguyu sunucu taraflı imleç (server-side cursor) ile çalıştırır ve sonucu
+        parça parça üretir. İlk üretilen değer kolon adları listesidir, ardından en fazla
+        'batch_size' satırlık tuple listeleri gelir. 'max_rows' aşılınca akış kesilir.
+
+        Sonuç daha önce önbelleğe alındıysa veritabanına hiç gidilmez.
+        Sorgu ve her parça okuması query_guard altında çalışır (süre sınırı ve iptal). Parçalar
+        farklı havuz thread'lerinde okunduğu için tek bağlantılı (StaticPool) engine'lerde bağlantı
+        akış boyunca kilitli tutulamaz; her fetchmany ayrı ayrı serialized() içinde çalışır (bellek
+        içi DB oturuma özeldir ve çağıran oturum kilidini akış boyunca tuttuğu için araya başka
+        sorgu girmez). Sonucun tamamı hiçbir motorda belleğe alınmaz.
+        Not: Güvenlik kontrolleri (Validation) çağıran katmanda yapılmalıdır.
+        """
+        cached = self.result_cache.get(sql)
+        if cached is not None and "table" in cached:
+            yield cached["table"].columns
+            yield from cached["table"].batches(batch_size, max_rows)
+            return
+
+        conn = self.engine.connect()
+        result = None
+        try:
+            with self.query_guard(conn):
+                result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(text(sql))
+            if not result.returns_rows:
+                raise ValueError("Sorgu satır döndürmüyor.")
+            yield list(result.keys())
+
+            remaining = max_rows
+            while remaining is None or remaining > 0:
+                size = batch_size if remaining is None else min(batch_size, remaining)
+                with self.query_guard(conn):
+                    rows = result.fetchmany(size)
+                if not rows:
+                    break
+                yield [tuple(row) for row in rows]
+                if remaining is not None:
+                    remaining -= len(rows)
+        finally:
+            # Kapanış (ve bağlantının havuza dönüşündeki rollback) de paylaşılan bağlantıyı kullanır
+            with self.serialized():
+                if result is not None:
+                    result.close()
+                conn.close()
+
     def dispose(self):
         """
         Session Manager tarafından çağrılır. 
-        Bağlantı havuzunu ve kaynakları temizler.
+        Paylaşılan engine'lerde sadece referans bırakılır (havuzu başka oturumlar
+        kullanıyor olabilir); oturuma özel engine'lerde havuz tamamen kapatılır.
         """
-        if self.engine:
+        self.closed = True
+        self.result_cache.clear()
+        self.pager.close_all()
+        if self._registry_key is not None:
+            engine_registry.release(self._registry_key)
+            self._registry_key = None
+        elif self.engine:
             self.engine.dispose()
\ No newline at end of file
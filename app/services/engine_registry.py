@@ -0,0 +1,99 @@
+# app/services/engine_registry.py
+import threading
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+
+from app.core.config import settings
+
+
+class EngineRegistry:
+    """
+    Süreç genelinde paylaşılan SQLAlchemy engine kayıt defteri.
+
+    Aynı veritabanına bağlanan her oturum için ayrı bir engine (ve bağlantı havuzu)
+    açmak yerine, normalize edilmiş bağlantı adresine göre tek bir engine paylaşılır.
+    Her 'acquire' referans sayısını artırır, 'release' azaltır; havuz ancak son
+    kullanıcı bıraktığında kapatılır.
+    """
+
+    def __init__(self):
+        # {normalize edilmiş URL: [engine, referans sayısı]}
+        self._engines: Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_url(connection_string: str) -> str:
+        """Aynı hedefi gösteren adresleri (parametre sırası, büyük/küçük harf) tek anahtara indirger."""
+        url = make_url(connection_string)
+        url = url.set(
+            drivername=url.drivername.lower(),
+            host=url.host.lower() if url.host else url.host,
+            query=dict(sorted(url.query.items())),
+        )
+        return url.render_as_string(hide_password=False)
+
+    @staticmethod
+    def is_shareable(connection_string: str) -> bool:
+        """Bellek içi veritabanları her bağlantıda ayrı olduğu için paylaşılamaz."""
+        database = make_url(connection_string).database or ""
+        return database not in ("", ":memory:")
+
+    @staticmethod
+    def _create_engine(connection_string: str) -> Engine:
+        url = make_url(connection_string)
+        if url.get_backend_name() in ("sqlite", "duckdb"):
+            # Dosya tabanlı gömülü veritabanlarında havuz boyutu ayarları anlamsız
+            return create_engine(connection_string)
+        return create_engine(
+            connection_string,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+
+    def acquire(self, connection_string: str) -> Tuple[str, Engine]:
+        """Adres için paylaşılan engine'i döndürür (yoksa oluşturur) ve referans sayısını artırır."""
+        key = self.normalize_url(connection_string)
+        with self._lock:
+            entry = self._engines.get(key)
+            if entry is None:
+                entry = [self._create_engine(connection_string), 0]
+                self._engines[key] = entry
+            entry[1] += 1
+            return key, entry[0]
+
+    def release(self, key: str):
+        """Referansı bırakır; engine'i kullanan kimse kalmadıysa havuzu kapatır."""
+        with self._lock:
+            entry = self._engines.get(key)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self._engines[key]
+        entry[0].dispose()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Her paylaşılan engine için referans sayısı ve havuz doluluğu."""
+        with self._lock:
+            entries = list(self._engines.items())
+        result = []
+        for key, (engine, refs) in entries:
+            pool = engine.pool
+            result.append({
+                "url": make_url(key).render_as_string(hide_password=True),
+                "references": refs,
+                "pool": pool.status(),
+                "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+                "size": pool.size() if hasattr(pool, "size") else None,
+                "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+            })
+        return result
+
+
+# Singleton Instance (Uygulama boyunca tek bir kayıt defteri olacak)
+engine_registry = EngineRegistry()
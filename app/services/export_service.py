@@ -0,0 +1,185 @@
+# app/services/export_service.py
+import csv
+import io
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from app.services.columnar import ColumnarResult, merge_kinds
+
+
+class ExportSchemaError(ValueError):
+    """Sonraki bir parçanın değerleri dışa aktarılan dosyanın şemasına sığmıyor."""
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Yazılan byte'ları biriktiren ve 'drain' ile boşaltılan yazma hedefi.
+    Parquet/Arrow yazıcıları dosyayı buraya yazar; biz de her row group sonrasında
+    biriken parçayı istemciye gönderip belleği serbest bırakırız.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer.extend(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        return chunk
+
+
+class ExportService:
+    """
+    Sorgu sonuçlarını parça parça (streaming) dosya formatlarına çevirir.
+    Girdi olarak kolon adları ve satır parçaları (batch) alır; hiçbir formatta
+    sonucun tamamı belleğe alınmaz.
+    """
+
+    # format -> (media type, dosya uzantısı)
+    FORMATS: Dict[str, tuple] = {
+        "csv": ("text/csv", "csv"),
+        "excel": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+        "parquet": ("application/vnd.apache.parquet", "parquet"),
+        "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    }
+
+    @classmethod
+    def describe(cls, fmt: str) -> tuple:
+        """Format için (media type, dosya adı) döndürür."""
+        if fmt not in cls.FORMATS:
+            raise ValueError(f"Desteklenmeyen format: {fmt}. Geçerli formatlar: {', '.join(cls.FORMATS)}")
+        if fmt in ("parquet", "arrow"):
+            cls._import_pyarrow()  # Eksik bağımlılık akış başlamadan fark edilsin
+        media_type, extension = cls.FORMATS[fmt]
+        return media_type, f"sonuc.{extension}"
+
+    @classmethod
+    def stream(cls, fmt: str, columns: List[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+        """İstenen formatta byte parçaları üreten generator döndürür."""
+        writers = {
+            "csv": cls.stream_csv,
+            "excel": cls.stream_excel,
+            "parquet": cls.stream_parquet,
+            "arrow": cls.stream_arrow,
+        }
+        cls.describe(fmt)  # Geçersiz formatı erken reddet
+        return writers[fmt](columns, batches)
+
+    @staticmethod
+    def stream_csv(columns: List[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+        """Her parçayı ayrı bir CSV bloğu olarak gönderir."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for rows in batches:
+            writer.writerows(rows)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    @staticmethod
+    def stream_excel(columns: List[str], batches: Iterable[List[tuple]], chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """
+        Excel (xlsx) bir zip arşivi olduğu için sonuna kadar yazılmadan gönderilemez.
+        openpyxl'in write-only modu ile satırlar belleğe alınmadan diske yazılır,
+        dosya tamamlanınca parça parça gönderilir.
+        """
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(columns)
+        for rows in batches:
+            for row in rows:
+                sheet.append(list(row))
+
+        with tempfile.TemporaryFile() as spool:
+            workbook.save(spool)
+            spool.seek(0)
+            while True:
+                chunk = spool.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    @staticmethod
+    def _arrow_table(columns: List[str], rows: List[tuple], kinds: Optional[List[str]]):
+        """
+        Satır parçasını Arrow tablosuna çevirir; döner: (tablo, dosya şemasının kolon tipleri).
+        Şema ilk parçadan çıkarılır (tamamı NULL olan kolonlar metin). Sonraki parçaların
+        tipleri merge_kinds kuralıyla şemaya uydurulur (örn. float kolonda int, metin kolonda
+        sayı). Şemanın genişlemesi gerekiyorsa (örn. int kolonda 2.7) Parquet/Arrow dosyasının
+        başta yazılmış şeması değiştirilemez; değer sessizce kesilmez, ExportSchemaError fırlatılır.
+        """
+        table = ColumnarResult.from_rows(columns, rows)
+        if kinds is None:
+            kinds = ["string" if kind == "null" else kind for kind in table.types]
+        for name, kind, batch_kind in zip(columns, kinds, table.types):
+            if merge_kinds((kind, batch_kind)) != kind:
+                raise ExportSchemaError(
+                    f"'{name}' kolonunun tipi dışa aktarma sırasında değişti ({kind} -> {batch_kind}); "
+                    "dosyanın şeması sonradan genişletilemez. Sorguda kolonu CAST ile tek tipe çevirin "
+                    "veya CSV formatını kullanın."
+                )
+        return table.to_arrow(types=kinds), kinds
+
+    @staticmethod
+    def _import_pyarrow():
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ValueError("Parquet/Arrow dışa aktarımı için 'pyarrow' paketi kurulu olmalıdır.")
+        return pa
+
+    @classmethod
+    def stream_parquet(cls, columns: List[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+        """Her parça ayrı bir Parquet row group olarak yazılır ve hemen gönderilir."""
+        pa = cls._import_pyarrow()
+        import pyarrow.parquet as pq
+
+        sink = _ChunkSink()
+        writer = None
+        kinds = None
+        for rows in batches:
+            table, kinds = cls._arrow_table(columns, rows, kinds)
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema)
+            writer.write_table(table)
+            yield sink.drain()
+        if writer is None:
+            writer = pq.ParquetWriter(sink, pa.schema([(col, pa.string()) for col in columns]))
+        writer.close()
+        yield sink.drain()
+
+    @classmethod
+    def stream_arrow(cls, columns: List[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+        """Arrow IPC stream formatında her parça ayrı bir RecordBatch mesajıdır."""
+        pa = cls._import_pyarrow()
+
+        sink = _ChunkSink()
+        writer = None
+        kinds = None
+        for rows in batches:
+            table, kinds = cls._arrow_table(columns, rows, kinds)
+            if writer is None:
+                writer = pa.ipc.new_stream(sink, table.schema)
+            writer.write_table(table)
+            yield sink.drain()
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, pa.schema([(col, pa.string()) for col in columns]))
+        writer.close()
+        yield sink.drain()
@@ -0,0 +1,323 @@
+# app/services/index_advisor.py
+import hashlib
+import statistics
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlglot import exp
+
+from app.core.config import settings
+from app.services.security import SQLValidator
+
+# Tek bir sorgunun bir tabloda kullandığı kolonlar (rol -> kolonlar)
+_ROLES = ("eq", "range", "join", "group")
+
+
+class IndexAdvisor:
+    """
+    Yüklenen (SQLite) tablolar için oturumun sorgu geçmişinden indeks önerir ve uygular.
+
+    Geçmişteki SQL'ler sqlglot ile okunur; WHERE'de eşitlik/aralıkla filtrelenen,
+    JOIN'de eşlenen ve GROUP BY'da gruplanan kolonlar sayılır. En az
+    INDEX_ADVISOR_MIN_USES sorguda geçen adaylar için indeks oluşturulur, ilgili
+    sorgular indeksten önce ve sonra çalıştırılarak hızlanma ölçülür. Hızlanma
+    INDEX_ADVISOR_MIN_SPEEDUP'ın altındaysa veya toplam indeks boyutu
+    INDEX_ADVISOR_MAX_BYTES'ı aşıyorsa indeks geri alınır.
+
+    Danışman oturum kilidi altında çalışır (indeks DDL'i ve salt okunur dosyada engine
+    değişimi kilit gerektirir); bu yüzden her sorgu tek kez ölçülür ve bir çalışmanın
+    ölçüm + indeks oluşturma süresi INDEX_ADVISOR_TIME_BUDGET ile sınırlıdır.
+
+    DuckDB'nin indeksleri sadece nokta aramalarında kullanıldığı (taramalar zaten
+    kolon tabanlı ve paralel) ve uzak veritabanlarının indeksleri sahiplerine ait olduğu
+    için danışman sadece dosyadan yüklenen SQLite veritabanlarında çalışır.
+    """
+
+    # Hızlanma ölçümünde aday başına çalıştırılan en fazla geçmiş sorgu ve tekrar sayısı
+    # (oturum kilidi tutulurken çalıştığı için tekrar yapılmaz)
+    SAMPLE_QUERIES = 3
+    TIMING_RUNS = 1
+
+    # Bileşik indeksin en fazla kolon sayısı
+    MAX_INDEX_COLUMNS = 3
+
+    def __init__(self, db_manager):
+        self.db = db_manager
+        self.created: List[Dict[str, Any]] = []
+        self.rejected: List[Dict[str, Any]] = []
+        self.last_error: Optional[str] = None
+        self.last_run: Optional[float] = None
+        # Denenmiş adaylar (tablo, kolonlar) tekrar denenmez
+        self._tried: Set[Tuple[str, Tuple[str, ...]]] = set()
+        # Son çalışmada incelenen geçmişin özeti (geçmiş değişmediyse tekrar analiz edilmez)
+        self._seen: Optional[int] = None
+        self._lock = threading.Lock()
+        # Süren çalışmanın süre bütçesinin bittiği an (time.monotonic)
+        self._deadline = 0.0
+
+    @property
+    def supported(self) -> bool:
+        return settings.INDEX_ADVISOR_ENABLED and self.db.is_uploaded and self.db.engine.dialect.name == "sqlite"
+
+    def _index_bytes(self) -> int:
+        return sum(index["bytes"] for index in self.created)
+
+    # --- Geçmişin analizi ---
+
+    def _query_usage(self, sql: str, tables: Dict[str, Set[str]]) -> Dict[str, Dict[str, List[str]]]:
+        """Tek bir sorgunun tablo -> {rol: [kolon]} kullanımı (alt sorgular dahil)."""
+        try:
+            tree = SQLValidator.parse(sql, self.db.sqlglot_dialect)
+        except Exception:
+            return {}
+        usage: Dict[str, Dict[str, List[str]]] = {}
+
+        for select in tree.find_all(exp.Select):
+            source = select.args.get("from_") or select.args.get("from")
+            sources = ([source.this] if source is not None else []) + [join.this for join in select.args.get("joins") or []]
+            aliases = {
+                item.alias_or_name: item.name for item in sources
+                if isinstance(item, exp.Table) and item.name in tables
+            }
+            if not aliases:
+                continue
+
+            def resolve(column: exp.Expression) -> Optional[Tuple[str, str]]:
+                if not isinstance(column, exp.Column):
+                    return None
+                if column.table:
+                    owners = {aliases[column.table]} if column.table in aliases else set()
+                else:
+                    owners = {name for name in aliases.values() if column.name in tables[name]}
+                if len(owners) != 1:
+                    return None
+                owner = owners.pop()
+                return (owner, column.name) if column.name in tables[owner] else None
+
+            def add(role: str, resolved: Optional[Tuple[str, str]]):
+                if resolved is not None:
+                    columns = usage.setdefault(resolved[0], {key: [] for key in _ROLES})[role]
+                    if resolved[1] not in columns:
+                        columns.append(resolved[1])
+
+            def own(node: exp.Expression) -> bool:
+                # Alt sorgunun koşulları kendi SELECT'inde sayılır
+                return node.find_ancestor(exp.Select) is select
+
+            conditions = [select.args.get("where")] + [join.args.get("on") for join in select.args.get("joins") or []]
+            for condition in filter(None, conditions):
+                for node in condition.find_all(exp.EQ, exp.In, exp.GT, exp.GTE, exp.LT, exp.LTE, exp.Between):
+                    if not own(node):
+                        continue
+                    left, right = node.this, node.args.get("expression")
+                    if isinstance(node, exp.EQ) and isinstance(left, exp.Column) and isinstance(right, exp.Column):
+                        add("join", resolve(left))
+                        add("join", resolve(right))
+                    elif isinstance(node, (exp.EQ, exp.In)):
+                        add("eq", resolve(left) or (resolve(right) if isinstance(node, exp.EQ) else None))
+                    else:
+                        add("range", resolve(left) or resolve(right))
+
+            group = select.args.get("group")
+            if group is not None:
+                for expression in group.expressions:
+                    add("group", resolve(expression))
+        return usage
+
+    def _query_candidates(self, usage: Dict[str, Dict[str, List[str]]]) -> Set[Tuple[str, Tuple[str, ...]]]:
+        """
+        Sorgunun faydalanacağı indeksler: eşitlik filtreleri önde, ardından tek bir aralık
+        veya gruplama kolonu (bileşik); JOIN kolonları için tek kolonlu indeksler.
+        """
+        candidates = set()
+        for table, roles in usage.items():
+            columns = roles["eq"][:self.MAX_INDEX_COLUMNS]
+            trailing = [column for column in roles["range"] + roles["group"] if column not in columns]
+            if trailing and len(columns) < self.MAX_INDEX_COLUMNS:
+                columns = columns + trailing[:1]
+            if columns:
+                candidates.add((table, tuple(columns)))
+            for column in roles["join"]:
+                candidates.add((table, (column,)))
+        return candidates
+
+    def _covered(self, table: str, columns: Tuple[str, ...]) -> bool:
+        """Aday, mevcut bir indeksin sol öneki mi? (O zaman yeni indeks gereksiz)"""
+        return any(
+            index["table"] == table and tuple(index["columns"][:len(columns)]) == columns
+            for index in self.created
+        )
+
+    def analyze(self, history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Geçmişteki sorgulardan indeks adaylarını kullanım sayısına göre sıralar:
+        [{table, columns, uses, queries}]. Zaten oluşturulmuş veya denenmiş adaylar atlanır.
+        """
+        tables = {name: {column for column, _ in signature} for name, signature in self.db._read_table_signatures().items()}
+        uses: Counter = Counter()
+        queries: Dict[Tuple[str, Tuple[str, ...]], List[str]] = {}
+        for sql in dict.fromkeys(item.get("sql") for item in history if item.get("sql")):
+            for candidate in self._query_candidates(self._query_usage(sql, tables)):
+                uses[candidate] += 1
+                queries.setdefault(candidate, []).append(sql)
+        ranked = []
+        for (table, columns), count in sorted(uses.items(), key=lambda item: (-item[1], len(item[0][1]))):
+            if count < settings.INDEX_ADVISOR_MIN_USES or (table, columns) in self._tried or self._covered(table, columns):
+                continue
+            ranked.append({"table": table, "columns": list(columns), "uses": count, "queries": queries[(table, columns)]})
+        return ranked
+
+    def due(self, history: List[Dict[str, Any]]) -> bool:
+        """
+        Danışmanın çalışması gerekiyor mu? Veritabanına gitmez: sadece bütçede yer olup
+        olmadığına ve son çalışmadan beri geçmişe yeni sorgu eklenip eklenmediğine bakar.
+        """
+        if not self.supported or len(self.created) >= settings.INDEX_ADVISOR_MAX_INDEXES:
+            return False
+        return self._history_key(history) != self._seen
+
+    @staticmethod
+    def _history_key(history: List[Dict[str, Any]]) -> int:
+        return hash(tuple(item.get("sql") for item in history))
+
+    # --- Uygulama ---
+
+    def _page_bytes(self, conn) -> int:
+        return conn.exec_driver_sql("PRAGMA page_count").scalar() * conn.exec_driver_sql("PRAGMA page_size").scalar()
+
+    def _remaining(self) -> float:
+        """Bütçeden kalan süre; bittiyse QueryTimeoutError (aday bu çalışmada değerlendirilmez)."""
+        from app.services.db_service import QueryTimeoutError
+
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            raise QueryTimeoutError("İndeks danışmanının süre bütçesi doldu.")
+        return remaining
+
+    def _time(self, queries: List[str]) -> float:
+        """Sorguların toplam süresi (her biri TIMING_RUNS kez çalıştırılır, medyan alınır)."""
+        total = 0.0
+        for sql in queries:
+            samples = []
+            for _ in range(self.TIMING_RUNS):
+                # Sorgu bütçenin kalanını aşarsa kesilir (QueryTimeoutError)
+                with self.db.engine.connect() as conn, self.db.query_guard(conn, timeout=self._remaining()):
+                    start = time.perf_counter()
+                    for _ in conn.exec_driver_sql(sql):
+                        pass  # Satırlar biriktirilmeden okunur
+                    samples.append(time.perf_counter() - start)
+            total += statistics.median(samples)
+        return total
+
+    def _index_name(self, table: str, columns: Tuple[str, ...]) -> str:
+        digest = hashlib.sha1(repr((table, columns)).encode("utf-8")).hexdigest()[:8]
+        return f"{self.db.INTERNAL_PREFIX}idx_{table}_{digest}"
+
+    def _apply(self, candidate: Dict[str, Any]) -> Dict[str, Any]:
+        """İndeksi oluşturur, hızlanmayı ölçer; yetersizse veya bütçeyi aşıyorsa geri alır."""
+        table, columns = candidate["table"], tuple(candidate["columns"])
+        quote = self.db.engine.dialect.identifier_preparer.quote
+        name = self._index_name(table, columns)
+        sample = candidate["queries"][:self.SAMPLE_QUERIES]
+
+        before = self._time(sample)
+        with self.db._writable() as engine, engine.begin() as conn, self.db.query_guard(conn, timeout=self._remaining()):
+            size_before = self._page_bytes(conn)
+            conn.exec_driver_sql(
+                f"CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} ({', '.join(quote(col) for col in columns)})"
+            )
+            size = max(0, self._page_bytes(conn) - size_before)
+        try:
+            after = self._time(sample)
+        except Exception:
+            # Ölçülemeyen indeks bırakılmaz
+            with self.db._writable() as engine, engine.begin() as conn:
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {quote(name)}")
+            raise
+
+        report = {
+            "name": name,
+            "table": table,
+            "columns": list(columns),
+            "uses": candidate["uses"],
+            "bytes": size,
+            "before_ms": round(before * 1000, 2),
+            "after_ms": round(after * 1000, 2),
+            "speedup": round(before / after, 2) if after > 0 else None,
+        }
+        reason = None
+        if self._index_bytes() + size > settings.INDEX_ADVISOR_MAX_BYTES:
+            reason = "Boyut bütçesi aşıldı"
+        elif after > 0 and before / after < settings.INDEX_ADVISOR_MIN_SPEEDUP:
+            reason = "Yeterli hızlanma yok"
+        if reason:
+            with self.db._writable() as engine, engine.begin() as conn:
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {quote(name)}")
+            report["reason"] = reason
+        return report
+
+    def run(self, history: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Adayları sırayla dener (INDEX_ADVISOR_MAX_INDEXES dolana veya INDEX_ADVISOR_TIME_BUDGET
+        bitene kadar). Veritabanına yazdığı için oturum kilidi altında (diğer isteklerle sırayla)
+        çağrılmalıdır. Bütçe biterse kalan adaylar geçmişe yeni sorgu eklenmese de bir sonraki
+        çalışmada denenir; tek başına bütçeye sığmayan aday bir daha denenmez.
+        """
+        from app.services.db_service import QueryTimeoutError
+
+        if not self.supported:
+            return self.report(history)
+        with self._lock:
+            self.last_run = time.time()
+            self.last_error = None
+            self._seen = self._history_key(history)
+            self._deadline = time.monotonic() + settings.INDEX_ADVISOR_TIME_BUDGET
+            attempted = False  # Bu çalışmada bütçeden pay alan bir aday oldu mu?
+            for candidate in self.analyze(history):
+                if len(self.created) >= settings.INDEX_ADVISOR_MAX_INDEXES:
+                    break
+                if self._covered(candidate["table"], tuple(candidate["columns"])):
+                    continue  # Bu turda oluşturulan bileşik indeks kapsıyor
+                try:
+                    result = self._apply(candidate)
+                except QueryTimeoutError as e:
+                    self.last_error = str(e)
+                    if attempted:
+                        self._seen = None  # Bütçe önceki adaylara harcandı; bu aday sonraki çalışmada
+                    else:
+                        self._tried.add((candidate["table"], tuple(candidate["columns"])))
+                    break
+                except Exception as e:
+                    # Örn. açık bir sayfa imleci tabloyu kilitliyor; aday bir sonraki turda denenir
+                    self.last_error = str(e)
+                    break
+                attempted = True
+                self._tried.add((candidate["table"], tuple(candidate["columns"])))
+                (self.rejected if "reason" in result else self.created).append(result)
+            self.db.refresh_memory_usage()
+        return self.report(history)
+
+    def report(self, history: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Oluşturulan/geri alınan indeksler, ölçülen hızlanmalar ve bekleyen adaylar."""
+        pending = []
+        if history is not None and self.supported:
+            try:
+                pending = [
+                    {key: value for key, value in candidate.items() if key != "queries"}
+                    for candidate in self.analyze(history)
+                ]
+            except Exception:
+                pass
+        return {
+            "supported": self.supported,
+            "created": self.created,
+            "rejected": self.rejected,
+            "pending": pending,
+            "bytes": self._index_bytes(),
+            "max_bytes": settings.INDEX_ADVISOR_MAX_BYTES,
+            "max_indexes": settings.INDEX_ADVISOR_MAX_INDEXES,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+        }
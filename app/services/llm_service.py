@@ -1,127 +1,764 @@
-from autogen import ConversableAgent, UserProxyAgent
+import sqlglot
+from app.core.concurrency import CancelToken, candidate_pool, current_cancel_token
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.tracing import run_traced, span
+from app.services.columnar import ColumnarResult
 from app.services.db_service import DatabaseManager
-from app.services.security import SQLValidator
+from app.services.schema_index import unknown_identifiers
+from app.services.security import QueryCostError, SQLValidator
+from app.services.sql_cache import sql_cache
 from app.services.viz_service import VisualizationService # Yeni eklenen servis
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
+import contextvars
+import functools
+import importlib
 import json
+import hashlib
+import logging
+import re
+import time
+
+if TYPE_CHECKING:
+    # autogen (ve openai bağımlılık ağacı) yüklemesi saniyeler sürer; ilk ajan oluşturulurken yüklenir
+    from autogen import ConversableAgent, UserProxyAgent
+
+logger = logging.getLogger(__name__)
+
+CHAT_REQUESTS = metrics.counter(
+    "datachat_chat_requests_total", "Sohbet isteklerinin sonucu (success, hit, near_hit, error, cancelled)", labels=("outcome",)
+)
+CHAT_RETRIES = metrics.counter(
+    "datachat_chat_retries_total", "Yeniden denemeler, hatanın aşamasına göre", labels=("stage",)
+)
+LLM_TOKENS = metrics.counter(
+    "datachat_llm_tokens_total", "LLM istemcisinin raporladığı token sayısı", labels=("kind",)
+)
+CANDIDATE_OUTCOMES = metrics.counter(
+    "datachat_speculative_candidates_total",
+    "Spekülatif SQL adaylarının sonucu (won, lost, cancelled veya başarısız olduğu aşama)", labels=("outcome",)
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _model_client_class(path: str):
+    """LLM_CLIENT ayarındaki "modül:Sınıf" yolundan autogen ModelClient sınıfını yükler."""
+    module_name, _, class_name = path.partition(":")
+    if not class_name:
+        raise ValueError(f"LLM_CLIENT 'modül:Sınıf' biçiminde olmalı: {path}")
+    return getattr(importlib.import_module(module_name), class_name)
+
 
 class SQLAgentService:
-    def __init__(self, db_manager: DatabaseManager, history: list = None):
+    # Token sayımı için kaba tahmin: Türkçe metin + SQL'de ortalama karakter/token oranı
+    CHARS_PER_TOKEN = 3
+
+    # Düzeltme isteğinde LLM'e gönderilen hata mesajının en fazla uzunluğu
+    MAX_ERROR_CHARS = 500
+
+    # Akış modunda (/chat/stream) grafik önerisinden önce gönderilen ilk satır sayfası
+    FIRST_PAGE_ROWS = 50
+
+    # Maliyet sınırını aşan sorgu için LLM'e verilen düzeltme talimatı
+    COST_INSTRUCTION = (
+        "Sorgunun planı çok pahalı. Tablolar arasındaki JOIN koşullarını ekle (kartezyen çarpımdan "
+        "kaçın), büyük tabloları önce filtrele veya aggregate et."
+    )
+
+    # Süre sınırını aşan sorgu için LLM'e verilen düzeltme talimatı
+    TIMEOUT_INSTRUCTION = (
+        "Sorgu çok yavaş çalıştı. Gereksiz JOIN ve kartezyen çarpımdan kaçınan, filtre ve "
+        "aggregate ile daha az satır tarayan daha ucuz bir sorgu yaz."
+    )
+
+    # Oturum başına tutulan ajan çifti sayısı (budanmış şema soruya göre değiştiği için birden fazla)
+    AGENT_CACHE_SIZE = 4
+
+    # Bilinmeyen tablo/kolon hatasında şema seçiminin en fazla kaç kez genişletileceği
+    MAX_SCHEMA_WIDENING = 2
+
+    # Spekülatif adaylar: ilk aday normal prompt'la (sıcaklık 0) üretilir, diğerleri aynı
+    # cevabı tekrar almamak için farklı bir yaklaşım ipucu ve bu sıcaklıkla
+    CANDIDATE_TEMPERATURE = 0.4
+    CANDIDATE_HINTS = (
+        "Mümkün olan en basit sorguyu yaz; gereksiz JOIN ve alt sorgudan kaçın.",
+        "Ara adımları WITH (CTE) ile ayrı ayrı yaz ve kolonları tablo adıyla nitelendir.",
+        "Filtre değerlerini şemadaki olası değerlerle birebir eşleştir; emin değilsen LIKE kullan.",
+    )
+
+    # Hiçbir aday başarılı olmazsa düzeltmeye en ileri aşamaya kadar gelmiş olanla devam edilir
+    STAGE_PROGRESS = {"validation": 1, "cost": 2, "timeout": 3, "execution": 3}
+
+    def __init__(self, db_manager: DatabaseManager, history: list = None, agent_cache: Optional[dict] = None,
+                 chart_points: Optional[int] = None, candidates: Optional[int] = None):
         self.db_manager = db_manager
         self.history = history or [] # Sohbet geçmişi
+        # Grafik serisinin en fazla nokta sayısı (istemcinin grafik genişliği; boşsa CHART_MAX_POINTS)
+        self.chart_points = chart_points
+        # İlk denemede paralel istenen aday SQL sayısı (1: spekülasyon kapalı)
+        self.candidates = max(1, min(candidates or settings.SPECULATIVE_CANDIDATES, settings.SPECULATIVE_MAX_CANDIDATES))
+        # Oturuma ait ajan önbelleği {(şema özeti, lehçe): (sql_expert, user_proxy)};
+        # verilmezse ajanlar sadece bu istek boyunca yaşar
+        self.agent_cache = agent_cache if agent_cache is not None else {}
         
-        self.llm_config = {
+        self.llm_config, self.model_client = self._llm_settings()
+
+    @staticmethod
+    def _llm_settings() -> Tuple[dict, Optional[type]]:
+        """Ajanların llm_config'i ve (LLM_CLIENT verildiyse) özel model istemcisi sınıfı."""
+        # Özel (örn. yerel/sahte) LLM istemcisi: her çağrı istemciye ulaşsın diye autogen'in
+        # disk önbelleği kapatılır
+        model_client = _model_client_class(settings.LLM_CLIENT) if settings.LLM_CLIENT else None
+        if model_client is not None:
+            return {
+                "config_list": [{"model": settings.LLM_MODEL, "model_client_cls": model_client.__name__}],
+                "temperature": 0,
+                "cache_seed": None,
+            }, model_client
+        return {
             "config_list": [{
                 "model": settings.LLM_MODEL,
                 "api_key": settings.GROQ_API_KEY,
                 "api_type": "groq"
             }],
             "temperature": 0, # Sıfır yaratıcılık, Maksimum tutarlılık
-        }
+        }, None
 
-    def _create_agent(self, schema_context: str):
-        """Ajanı her seferinde taze context ile oluşturur."""
-        return ConversableAgent(
+    @staticmethod
+    def _build_agent(llm_config: dict, model_client: Optional[type], system_message: str) -> "ConversableAgent":
+        from autogen import ConversableAgent
+
+        agent = ConversableAgent(
             name="sql_expert",
-            llm_config=self.llm_config,
-            system_message=f"""
+            llm_config=llm_config,
+            system_message=system_message,
+            human_input_mode="NEVER"
+        )
+        if model_client is not None:
+            agent.register_model_client(model_client_cls=model_client)
+        return agent
+
+    @classmethod
+    def warm_up(cls):
+        """
+        autogen'i yükler ve LLM istemcisini bir kez kurar; açılıştaki ısınmada çağrılır ki
+        ilk /chat isteği bu tek seferlik maliyeti ödemesin.
+        """
+        llm_config, model_client = cls._llm_settings()
+        cls._build_agent(llm_config, model_client, "")
+
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        """Metnin yaklaşık token sayısı (tokenizer yüklemeden, karakter sayısından)."""
+        return len(text) // cls.CHARS_PER_TOKEN + 1
+
+    def _system_message(self, schema_context: str) -> str:
+        dialect = self.db_manager.dialect_label
+        return f"""
             Sen uzman bir Veri Analisti ve SQL geliştiricisisin.
             
             VERİTABANI ŞEMASI:
             {schema_context}
             
             GÖREVİN:
-            Kullanıcının sorusunu yanıtlayan, SQLite uyumlu, verimli bir SQL sorgusu yaz.
+            Kullanıcının sorusunu yanıtlayan, {dialect} uyumlu, verimli bir SQL sorgusu yaz.
             
             KURALLAR:
             1. SADECE SQL kodu döndür. Markdown (```sql) kullanma. Açıklama yazma.
             2. Eğer önceki deneme hatalıysa, hata mesajını analiz et ve sorguyu düzelt.
             3. Tablo ve kolon isimleri şemadakiyle BİREBİR aynı olmalı.
             4. Asla veri silme veya değiştirme komutu yazma.
-            """,
-            human_input_mode="NEVER"
+            """
+
+    def _create_agent(self, schema_context: str, slot: int = 0):
+        """Şemayı sistem mesajına gömülü SQL uzmanı ajanı oluşturur (slot > 0: spekülatif aday)."""
+        llm_config = self.llm_config if slot == 0 else {**self.llm_config, "temperature": self.CANDIDATE_TEMPERATURE}
+        return self._build_agent(llm_config, self.model_client, self._system_message(schema_context))
+
+    def _agent_key(self, schema_context: str, slot: int = 0) -> tuple:
+        key = (hashlib.sha1(schema_context.encode("utf-8")).hexdigest(), self.db_manager.sqlglot_dialect)
+        return key if slot == 0 else key + (slot,)
+
+    def _get_agents(self, schema_context: str, slot: int = 0) -> Tuple["ConversableAgent", "UserProxyAgent"]:
+        """
+        Oturumun ajanlarını aynı şema metni için yeniden kullanır (sistem mesajı şemayı içerir).
+        Budanmış şema soruya göre değiştiğinden son AGENT_CACHE_SIZE şema metninin ajanları
+        tutulur, en eskisi atılır. Ajanlar thread güvenli olmadığından her spekülatif aday
+        (slot) kendi ajan çiftini kullanır.
+        """
+        key = self._agent_key(schema_context, slot)
+        agents = self.agent_cache.pop(key, None)
+        if agents is None:
+            from autogen import UserProxyAgent
+
+            while len(self.agent_cache) >= self.AGENT_CACHE_SIZE * self.candidates:
+                self.agent_cache.pop(next(iter(self.agent_cache)))
+            # Kullanıcı (Sanal Yönetici)
+            user_proxy = UserProxyAgent(
+                name="user_proxy",
+                human_input_mode="NEVER",
+                max_consecutive_auto_reply=0,
+                code_execution_config=False
+            )
+            agents = (self._create_agent(schema_context, slot), user_proxy)
+        # Son kullanılan sona taşınır
+        self.agent_cache[key] = agents
+        return agents
+
+    def _prompt_schema(self, schema: str, user_question: str, widen: int = 0, identifiers=()) -> Tuple[str, int]:
+        """
+        Prompt'a girecek şema metni: tablo sayısı SCHEMA_PRUNE_TOP_K'yı aşmıyorsa şemanın
+        tamamı, aşıyorsa soruyla en ilgili tablolar + JOIN komşuları (SCHEMA_TOKEN_BUDGET
+        içinde). Son sohbet turlarının SQL'lerinde geçen tablolar ve hata mesajındaki
+        bilinmeyen adlara sahip tablolar her zaman dahil edilir. Her genişletmede (widen)
+        tablo sayısı, komşuluk derinliği ve bütçe büyütülür.
+        Döner: (şema metni, gösterilmeyen tablo sayısı)
+        """
+        index = self.db_manager.get_schema_index()
+        if len(index.tables) <= settings.SCHEMA_PRUNE_TOP_K:
+            return schema, 0
+
+        pinned = []
+        for turn in self.history[-3:]:
+            try:
+                pinned.extend(SQLValidator.table_aliases(turn["sql"], self.db_manager.sqlglot_dialect).values())
+            except Exception:
+                continue
+        pinned.extend(index.tables_matching(identifiers))
+
+        budget_chars = min(
+            settings.SCHEMA_TOKEN_BUDGET * 2 ** widen,
+            settings.PROMPT_TOKEN_BUDGET,
+        ) * self.CHARS_PER_TOKEN
+        tables = index.select(
+            user_question,
+            pinned=pinned,
+            top_k=settings.SCHEMA_PRUNE_TOP_K * 2 ** widen,
+            budget_chars=budget_chars,
+            hops=1 + widen,
+        )
+        return index.render(tables, budget_chars), len(index.tables) - len(tables)
+
+    @staticmethod
+    def _context_message(history: list) -> str:
+        if not history:
+            return ""
+        return "\nGEÇMİŞ KONUŞMALAR:\n" + "\n".join([f"Soru: {h['q']} -> SQL: {h['sql']}" for h in history])
+
+    def _fit_prompt(self, schema: str, user_question: str) -> Tuple[str, str, int]:
+        """
+        Sistem mesajı (şema) + ilk mesajı PROMPT_TOKEN_BUDGET içine sığdırır.
+        Sırasıyla: eski sohbet turları çıkarılır, kategorik değer ve tarih aralığı ipuçları atılır,
+        en son şema metni satır sınırından kısaltılır.
+        Döner: (şema metni, ilk mesaj, tahmini token sayısı)
+        """
+        budget = settings.PROMPT_TOKEN_BUDGET
+
+        def build(schema_text: str, turns: int) -> Tuple[str, int]:
+            context = self._context_message(self.history[-turns:] if turns else [])
+            message = f"SORU: {user_question}{context}\nSadece SQL sorgusunu yaz."
+            return message, self.estimate_tokens(self._system_message(schema_text)) + self.estimate_tokens(message)
+
+        # Son 3 mesajı alarak bağlam oluştur; sığmazsa en eskiden başlayarak çıkar
+        for turns in range(min(3, len(self.history)), -1, -1):
+            message, tokens = build(schema, turns)
+            if tokens <= budget:
+                return schema, message, tokens
+
+        compact = re.sub(r" \((?:Olası Değerler|Aralık): [^\n]*\)", "", schema)
+        message, tokens = build(compact, 0)
+        if tokens <= budget:
+            return compact, message, tokens
+
+        overflow_chars = (tokens - budget) * self.CHARS_PER_TOKEN
+        truncated = compact[:max(0, len(compact) - overflow_chars)]
+        truncated = truncated[:truncated.rfind("\n") + 1] + "... (şema bütçe nedeniyle kısaltıldı)"
+        message, tokens = build(truncated, 0)
+        return truncated, message, tokens
+
+    @classmethod
+    def _correction_message(
+        cls, user_question: str, failed_sql: str, error: str, kind: str,
+        instruction: str = "Şemayı kontrol et ve sorguyu düzelt."
+    ) -> str:
+        """
+        Yeniden denemelerde tüm konuşmayı tekrar göndermek yerine sadece hatalı SQL'i
+        ve hatayı içeren kısa bir düzeltme isteği gönderilir.
+        """
+        return (
+            f"SORU: {user_question}\n"
+            f"HATALI SQL: {failed_sql}\n"
+            f"{kind} HATASI: {error[:cls.MAX_ERROR_CHARS]}\n"
+            f"{instruction} Sadece SQL sorgusunu yaz."
         )
 
+    @staticmethod
+    def _usage_tokens(agent: "ConversableAgent") -> Tuple[int, int]:
+        """Ajanın şimdiye kadar harcadığı (prompt, completion) token sayısı (LLM istemcisinin raporu)."""
+        usage = agent.get_total_usage() or {}
+        prompt = completion = 0
+        for value in usage.values():
+            if isinstance(value, dict):
+                prompt += value.get("prompt_tokens", 0)
+                completion += value.get("completion_tokens", 0)
+        return prompt, completion
+
+    @classmethod
+    def _stage_correction(cls, user_question: str, failed_sql: str, error: str, stage: str) -> str:
+        """Başarısız olan aşamaya göre LLM'e gönderilecek düzeltme isteği."""
+        if stage == "validation":
+            return cls._correction_message(user_question, failed_sql, error, "GÜVENLİK/SÖZDİZİMİ")
+        if stage == "cost":
+            return cls._correction_message(user_question, failed_sql, error, "MALİYET", cls.COST_INSTRUCTION)
+        if stage == "timeout":
+            # Süre aşımında daha ucuz bir sorgu istenir
+            return cls._correction_message(user_question, failed_sql, error, "ZAMAN AŞIMI", cls.TIMEOUT_INSTRUCTION)
+        return cls._correction_message(user_question, failed_sql, error, "VERİTABANI")
+
+    def _attempt(self, agent: "ConversableAgent", user_proxy: "UserProxyAgent", message_content: str,
+                 attempt: int, candidate: Optional[int] = None):
+        """
+        Tek deneme: ajandan SQL alır, doğrular, maliyetini kontrol eder ve çalıştırır.
+        Aşama olaylarını (sql, validation) üretir ve sonucu döndürür:
+        {"sql", "safe_sql", "stage", "error", "result", "cost"}; stage None ise başarılıdır,
+        değilse validation | cost | timeout | execution | cancelled.
+        """
+        # 1. Ajan SQL Üretsin (her deneme bağımsız; transkript birikip tekrar gönderilmez)
+        with span("llm", attempt + 1, candidate):
+            chat_result = user_proxy.initiate_chat(agent, message=message_content, clear_history=True)
+
+        # AutoGen bazen sözlük bazen string dönebilir, güvenli erişim:
+        if isinstance(chat_result.chat_history[-1]['content'], str):
+            raw_sql = chat_result.chat_history[-1]['content']
+        else:
+            raw_sql = str(chat_result.chat_history[-1]['content'])
+
+        # Temizlik
+        cleaned_sql = raw_sql.replace("```sql", "").replace("```", "").strip()
+        outcome = {"sql": cleaned_sql, "safe_sql": None, "stage": None, "error": None, "result": None, "cost": None}
+        yield "sql", {"sql": cleaned_sql, "attempt": attempt + 1, "source": "llm"}
+
+        # 2. Güvenlik Kontrolü ve Düzenleme (Validator)
+        try:
+            with span("validate", attempt + 1, candidate):
+                safe_sql = SQLValidator.validate_and_fix(cleaned_sql, dialect=self.db_manager.sqlglot_dialect)
+        except ValueError as ve:
+            outcome.update(stage="validation", error=str(ve))
+            yield "validation", {"ok": False, "error": outcome["error"]}
+            return outcome
+        outcome["safe_sql"] = safe_sql
+
+        # Paralel adaylar tek bağlantılı (bellek içi) veritabanında EXPLAIN'i de sırayla çalıştırır
+        # (sorgunun kendisi query_guard içinde zaten sıraya girer)
+        serialized = self.db_manager.serialized if candidate is not None else nullcontext
+
+        # 2b. Maliyet Kontrolü (EXPLAIN): çok pahalı sorgu çalıştırılmadan plan özetiyle geri gönderilir
+        try:
+            with span("cost", attempt + 1, candidate), serialized():
+                outcome["cost"] = SQLValidator.check_cost(safe_sql, self.db_manager)
+        except QueryCostError as ce:
+            outcome.update(stage="cost", error=str(ce))
+            yield "validation", {"ok": False, "stage": "cost", "error": outcome["error"]}
+            return outcome
+        yield "validation", {"ok": True, "sql": safe_sql, "cost": outcome["cost"]}
+
+        # 3. Veritabanında Çalıştırma (Execution)
+        with span("execute", attempt + 1, candidate):
+            result = self.db_manager.execute_query(safe_sql)
+        outcome["result"] = result
+        if "error" in result:
+            if result.get("cancelled"):
+                stage = "cancelled"
+            else:
+                stage = "timeout" if result.get("timeout") else "execution"
+            outcome.update(stage=stage, error=result["error"])
+        return outcome
+
+    def _candidate_message(self, message_content: str, slot: int) -> str:
+        """Aynı cevabı tekrar almamak için aday prompt'una farklı bir yaklaşım ipucu eklenir."""
+        if slot == 0:
+            return message_content
+        hint = self.CANDIDATE_HINTS[(slot - 1) % len(self.CANDIDATE_HINTS)]
+        return f"{message_content}\nYAKLAŞIM: {hint}"
+
+    def _run_candidate(self, slot: int, agent: "ConversableAgent", user_proxy: "UserProxyAgent",
+                       message_content: str, token: CancelToken) -> Tuple[List[Tuple[str, dict]], dict]:
+        """
+        Spekülatif adayı aday havuzunda, kendi iptal belirteciyle çalıştırır (kaybeden adayın
+        sorgusu diğerlerini etkilemeden durdurulabilsin). Döner: (aşama olayları, sonuç)
+        """
+        current_cancel_token.set(token)
+        started = time.perf_counter()
+        events: List[Tuple[str, dict]] = []
+        steps = self._attempt(agent, user_proxy, message_content, 0, candidate=slot)
+        try:
+            while True:
+                events.append(next(steps))
+                # Başka bir aday kazandıysa sonraki aşamalara (sorgu çalıştırma) geçilmez
+                if token.cancelled:
+                    steps.close()
+                    outcome = {"sql": events[0][1]["sql"], "stage": "cancelled", "error": "Aday iptal edildi."}
+                    break
+        except StopIteration as stop:
+            outcome = stop.value
+        except Exception as e:
+            # Örn. LLM API hatası: diğer adaylar devam eder; hepsi böyle biterse hata yükseltilir
+            outcome = {"sql": None, "stage": "exception", "error": str(e), "exception": e}
+        outcome["candidate"] = slot
+        outcome["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return events, outcome
+
+    def _speculative_attempt(self, schema: str, message_content: str, spent: List[int]):
+        """
+        İlk deneme için self.candidates kadar aday SQL'i paralel üretir, doğrular ve çalıştırır.
+        İlk başarılı aday kazanır (aynı anda bitenlerden satır döndüren, sonra önceliği yüksek
+        olan); çalışmaya devam eden adaylar iptal edilir. Hepsi başarısızsa düzeltmeye en ileri
+        aşamaya gelmiş aday ile devam edilir. Kazananın (veya seçilen başarısızın) olaylarını
+        "candidates" özetinden sonra tekrar üretir ve _attempt gibi sonucunu döndürür.
+        İlk aday (slot 0) dışındaki ajanların token kullanımı 'spent'e eklenir.
+        """
+        slots = [self._get_agents(schema, slot) for slot in range(self.candidates)]
+        before = [self._usage_tokens(agent) for agent, _ in slots]
+        tokens = [CancelToken() for _ in slots]
+        futures = {}
+        for slot, (agent, user_proxy) in enumerate(slots):
+            # İstek izi adaylara taşınsın; her aday kendi bağlam kopyasında kendi belirtecini kurar
+            context = contextvars.copy_context()
+            future = candidate_pool.submit(
+                context.run, run_traced, self._run_candidate,
+                slot, agent, user_proxy, self._candidate_message(message_content, slot), tokens[slot],
+            )
+            futures[future] = slot
+
+        def cancel_all():
+            for token in tokens:
+                token.cancel()
+
+        parent = current_cancel_token.get()
+        finished = {}
+        winner = None
+        pending = set(futures)
+        with parent.on_cancel(cancel_all) if parent is not None else nullcontext():
+            while pending and winner is None:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    events, outcome = future.result()
+                    finished[outcome["candidate"]] = (events, outcome)
+                successes = [finished[slot] for slot in sorted(finished) if finished[slot][1]["stage"] is None]
+                if successes:
+                    winner = next((item for item in successes if item[1]["result"].get("count")), successes[0])
+
+        # Kaybedenler durdurulur; hâlâ LLM çağrısında olan ajanlar bir sonraki istekte aynı anda
+        # kullanılmasın diye önbellekten çıkarılır
+        for future in pending:
+            slot = futures[future]
+            tokens[slot].cancel()
+            self.agent_cache.pop(self._agent_key(schema, slot), None)
+            CANDIDATE_OUTCOMES.inc(outcome="cancelled")
+        for slot in range(1, len(slots)):
+            if slot in finished:
+                prompt_tokens, completion_tokens = self._usage_tokens(slots[slot][0])
+                spent[0] += prompt_tokens - before[slot][0]
+                spent[1] += completion_tokens - before[slot][1]
+
+        if parent is not None and parent.cancelled:
+            return {"sql": None, "stage": "cancelled", "error": "İstek iptal edildi."}
+
+        if winner is None:
+            failures = [item for item in finished.values() if item[1]["stage"] != "exception"]
+            if not failures:
+                # Hiçbir aday LLM'den cevap alamadı: sıralı moddaki gibi hata yükseltilir
+                raise finished[min(finished)][1]["exception"]
+            chosen = max(failures, key=lambda item: (self.STAGE_PROGRESS.get(item[1]["stage"], 0), -item[1]["candidate"]))
+        else:
+            chosen = winner
+        for slot, (_, outcome) in finished.items():
+            if winner is not None and slot == winner[1]["candidate"]:
+                label = "won"
+            else:
+                label = "lost" if outcome["stage"] is None else outcome["stage"]
+            CANDIDATE_OUTCOMES.inc(outcome=label)
+
+        events, outcome = chosen
+        yield "candidates", {
+            "count": len(slots),
+            "chosen": outcome["candidate"],
+            "success": winner is not None,
+            "candidates": [
+                {"candidate": slot, "stage": finished[slot][1]["stage"] or "ok", "ms": finished[slot][1]["ms"]}
+                if slot in finished else {"candidate": slot, "stage": "cancelled"}
+                for slot in range(len(slots))
+            ],
+        }
+        for event, data in events:
+            if event == "sql":
+                data = {**data, "candidate": outcome["candidate"]}
+            yield event, data
+        return outcome
+
+    def _next_cursor(self, raw_sql: str, table: Optional[ColumnarResult]) -> Optional[str]:
+        """
+        Sonuç otomatik LIMIT'e takıldıysa kalan satırlar için sayfa imleci açar
+        (/result/page?cursor=...); sorgu yeniden sorulmadan devam edilebilir.
+        """
+        if table is None or table.count < settings.DEFAULT_SQL_LIMIT:
+            return None
+        try:
+            base_sql = SQLValidator.validate_and_fix(raw_sql, limit=None, dialect=self.db_manager.sqlglot_dialect)
+            return self.db_manager.pager.continue_after(base_sql, table)
+        except Exception:
+            return None
+
+    def _chart_source(self, raw_sql: str, table: Optional[ColumnarResult], chart: dict) -> Optional[ColumnarResult]:
+        """
+        Sonuç otomatik LIMIT'e takıldıysa grafik sadece ilk satırları göstermesin diye sorguyu
+        LIMIT'siz tekrar çalıştırır (CHART_SOURCE_MAX_ROWS > 0 ise, en fazla o kadar satır).
+        İkinci sorgu da EXPLAIN maliyet kontrolünden geçer; pahalıysa grafik alınan satırlardan
+        çizilir. Seri sunucuda seyreltildiği için istemciye giden nokta sayısı değişmez.
+        Gerek yoksa None döner.
+        """
+        if (
+            table is None or chart.get("type") == "table" or not settings.CHART_SOURCE_MAX_ROWS
+            or table.count < settings.DEFAULT_SQL_LIMIT
+        ):
+            return None
+        try:
+            dialect = self.db_manager.sqlglot_dialect
+            base = SQLValidator.parse(SQLValidator.validate_and_fix(raw_sql, limit=None, dialect=dialect), dialect)
+            # Sorgunun kendi LIMIT'i varsa sonuç zaten tamdır
+            if base.args.get("limit"):
+                return None
+            chart_sql = (
+                sqlglot.select("*").from_(base.subquery("chart_source"))
+                .limit(settings.CHART_SOURCE_MAX_ROWS).sql(dialect=dialect)
+            )
+            # Pahalı ikinci çalıştırma (örn. tam tablo taraması) yapılmaz (QueryCostError da ValueError'dır)
+            SQLValidator.check_cost(chart_sql, self.db_manager)
+            # Büyük ara sonuç oturumun sonuç önbelleğini doldurmasın
+            result = self.db_manager.execute_query(chart_sql, use_cache=False)
+        except Exception:
+            return None
+        source = result.get("table")
+        if source is None or source.count <= table.count:
+            return None
+        return source
+
+    def _success(self, user_question: str, safe_sql: str, result: dict, cache: str = "miss", raw_sql: Optional[str] = None):
+        """Başarılı sorguyu geçmişe kaydeder ve grafik önerisiyle birlikte yanıtı hazırlar."""
+        # Sonucu ve sorguyu geçmişe kaydet (oturum deposuna sadece yeni kayıt eklenir)
+        entry = {"q": user_question, "sql": safe_sql}
+        self.history.append(entry)
+        
+        # Görselleştirme Önerisi Al (YENİ EKLENEN KISIM)
+        table = result.get("table")
+        with span("chart"):
+            hints = self.db_manager.column_hints(table.columns) if table is not None else None
+            chart_suggestion = VisualizationService.suggest_chart(table, max_points=self.chart_points, hints=hints)
+            source = self._chart_source(raw_sql or safe_sql, table, chart_suggestion)
+            if source is not None:
+                VisualizationService.attach_series(chart_suggestion, source, max_points=self.chart_points)
+        with span("cursor"):
+            next_cursor = self._next_cursor(raw_sql or safe_sql, table)
+
+        return {
+            "sql": safe_sql,
+            "result": result,
+            "visualization": chart_suggestion, # Frontend burayı okuyacak
+            "cache": cache,  # hit | near_hit | miss
+            "next_cursor": next_cursor,
+            "history_update": [entry]
+        }
+
+    def _result_events(self, user_question: str, safe_sql: str, result: dict, raw_sql: str, cache: str = "miss", usage: Optional[dict] = None):
+        """
+        Başarılı sorgunun olaylarını sırayla üretir: önce ilk satır sayfası (grafik
+        önerisi beklenmeden gösterilebilsin), sonra grafik önerisi, en son toplu yanıt.
+        """
+        table = result.get("table")
+        yield "rows", {
+            "table": table.head(self.FIRST_PAGE_ROWS) if table is not None else None,
+            "count": result.get("count", 0),
+        }
+        response = self._success(user_question, safe_sql, result, cache=cache, raw_sql=raw_sql)
+        if usage is not None:
+            response["usage"] = usage
+        yield "chart", response["visualization"]
+        yield "result", response
+
+    def _cached_events(self, user_question: str, cache_scope: tuple):
+        """
+        Soru daha önce aynı şema ve bağlamda cevaplandıysa LLM'e gitmeden o SQL'i
+        doğrulayıp çalıştırır. SQL artık çalışmıyorsa önbellekten atılır ve False döner.
+        """
+        with span("cache"):
+            cached = sql_cache.get(user_question, *cache_scope)
+        if cached is None:
+            return False
+        cached_sql, is_near = cached
+        try:
+            with span("validate"):
+                safe_sql = SQLValidator.validate_and_fix(cached_sql, dialect=self.db_manager.sqlglot_dialect)
+            # Veri büyüdüyse önbellekteki SQL artık çok pahalı olabilir (QueryCostError da ValueError'dır)
+            with span("cost"):
+                SQLValidator.check_cost(safe_sql, self.db_manager)
+        except ValueError:
+            sql_cache.invalidate(*cache_scope, cached_sql)
+            return False
+        with span("execute"):
+            result = self.db_manager.execute_query(safe_sql)
+        if result.get("cancelled"):
+            CHAT_REQUESTS.inc(outcome="cancelled")
+            yield "error", {"error": result["error"], "cancelled": True}
+            return True
+        if "error" in result:
+            sql_cache.invalidate(*cache_scope, cached_sql)
+            return False
+        cache = "near_hit" if is_near else "hit"
+        CHAT_REQUESTS.inc(outcome=cache)
+        yield "sql", {"sql": safe_sql, "attempt": 0, "source": cache}
+        yield "validation", {"ok": True, "sql": safe_sql}
+        yield from self._result_events(user_question, safe_sql, result, cached_sql, cache=cache)
+        return True
+
     def process_request(self, user_question: str):
         """
         Kullanıcı sorusunu alır, SQL üretir, çalıştırır, güvenliği kontrol eder,
         hata varsa düzeltir ve en sonunda grafik önerisiyle birlikte döner.
+        Aynı soru aynı şemada daha önce cevaplandıysa SQL önbellekten gelir (LLM çağrılmaz).
         """
-        schema = self.db_manager.get_schema_info()
-        agent = self._create_agent(schema)
-        
-        # Kullanıcı (Sanal Yönetici)
-        user_proxy = UserProxyAgent(
-            name="user_proxy",
-            human_input_mode="NEVER",
-            max_consecutive_auto_reply=0,
-            code_execution_config=False
+        response = None
+        for event, data in self.stream_request(user_question):
+            if event in ("result", "error"):
+                response = data
+        return response
+
+    def stream_request(self, user_question: str) -> Iterator[Tuple[str, dict]]:
+        """
+        process_request'in adım adım çalışan hali: her aşama bitince (olay adı, veri)
+        üretir. /chat/stream bu olayları Server-Sent Events olarak iletir.
+
+        Olaylar: sql, validation, retry, rows (ilk sayfa), chart, result (toplu yanıt)
+        veya başarısızlıkta error. Spekülatif modda (candidates > 1) ilk denemenin sql
+        olayından önce adayların özeti (candidates) gelir.
+        """
+        with span("schema"):
+            schema = self.db_manager.get_schema_info()
+        # Şema metni kategorik değer ipuçlarını da içerdiği için parmak izi olarak onun özeti kullanılır
+        cache_scope = (
+            hashlib.sha1(schema.encode("utf-8")).hexdigest(),
+            self.db_manager.sqlglot_dialect,
+            sql_cache.context_key(self.history),
         )
+        if (yield from self._cached_events(user_question, cache_scope)):
+            return
+
+        with span("prompt"):
+            # Büyük şemalarda sadece soruyla ilgili tablolar gönderilir
+            full_schema = schema
+            widen = 0
+            schema, hidden_tables = self._prompt_schema(full_schema, user_question)
+
+            # Geçmiş konuşmaları prompt'a ekle (Context Awareness), token bütçesini aşmadan
+            schema, message_content, estimated_tokens = self._fit_prompt(schema, user_question)
+            system_tokens = self.estimate_tokens(self._system_message(schema))
+        with span("agent"):
+            agent, user_proxy = self._get_agents(schema)
+        usage_before = self._usage_tokens(agent)
+        # Şema genişletilip ajan değiştiğinde önceki ajanların harcadığı (prompt, completion)
+        spent = [0, 0]
 
         # --- Self-Correction Loop (Kendi Kendini Düzeltme Döngüsü) ---
         max_retries = 3
         current_error = None
-        
-        # Geçmiş konuşmaları prompt'a ekle (Context Awareness)
-        context_msg = ""
-        if self.history:
-            # Son 3 mesajı alarak bağlam oluştur
-            context_msg = "\nGEÇMİŞ KONUŞMALAR:\n" + "\n".join([f"Soru: {h['q']} -> SQL: {h['sql']}" for h in self.history[-3:]])
+        cleaned_sql = None
 
-        # İlk mesajı hazırla
-        message_content = f"SORU: {user_question}{context_msg}\nSadece SQL sorgusunu yaz."
+        def usage(attempts: int) -> dict:
+            prompt_tokens, completion_tokens = self._usage_tokens(agent)
+            report = {
+                "attempts": attempts,
+                "prompt_tokens_estimated": estimated_tokens,
+                "prompt_token_budget": settings.PROMPT_TOKEN_BUDGET,
+                "prompt_tokens": prompt_tokens - usage_before[0] + spent[0],
+                "completion_tokens": completion_tokens - usage_before[1] + spent[1],
+            }
+            if hidden_tables:
+                report["schema_tables_hidden"] = hidden_tables
+            LLM_TOKENS.inc(report["prompt_tokens"], kind="prompt")
+            LLM_TOKENS.inc(report["completion_tokens"], kind="completion")
+            logger.info("LLM kullanımı: %s", report)
+            return report
 
         for attempt in range(max_retries):
-            # print(f"DEBUG: Deneme {attempt + 1}/{max_retries}")
-            
-            # 1. Ajan SQL Üretsin
-            chat_result = user_proxy.initiate_chat(agent, message=message_content, clear_history=False)
-            
-            # AutoGen bazen sözlük bazen string dönebilir, güvenli erişim:
-            if isinstance(chat_result.chat_history[-1]['content'], str):
-                raw_sql = chat_result.chat_history[-1]['content']
-            else:
-                raw_sql = str(chat_result.chat_history[-1]['content'])
-            
-            # Temizlik
-            cleaned_sql = raw_sql.replace("```sql", "").replace("```", "").strip()
-            
-            # 2. Güvenlik Kontrolü ve Düzenleme (Validator)
-            try:
-                safe_sql = SQLValidator.validate_and_fix(cleaned_sql)
-            except ValueError as ve:
-                current_error = str(ve)
-                # Hatayı LLM'e geri besle
-                message_content = f"Yazdığın SQL şu güvenlik/sözdizimi hatasını verdi: {current_error}. Lütfen kurallara uyarak düzelt."
-                continue
+            logger.debug("Deneme %d/%d", attempt + 1, max_retries)
 
-            # 3. Veritabanında Çalıştırma (Execution)
-            result = self.db_manager.execute_safe_query(safe_sql)
-            
-            if "error" in result:
-                current_error = result['error']
-                # Hatayı LLM'e geri besle
-                message_content = f"Sorgu çalışırken veritabanı şu hatayı döndürdü: {current_error}. Şemayı tekrar kontrol et ve sorguyu düzelt."
-                continue
+            # İstemci bağlantıyı kapattıysa yeni bir LLM çağrısı yapılmaz
+            token = current_cancel_token.get()
+            if token is not None and token.cancelled:
+                CHAT_REQUESTS.inc(outcome="cancelled")
+                yield "error", {"error": "İstek iptal edildi.", "cancelled": True, "usage": usage(attempt)}
+                return
+
+            if attempt:
+                estimated_tokens += system_tokens + self.estimate_tokens(message_content)
+            if attempt == 0 and self.candidates > 1:
+                # Spekülatif mod: ilk deneme birden fazla aday ile paralel yapılır
+                estimated_tokens += (self.candidates - 1) * (system_tokens + self.estimate_tokens(message_content))
+                outcome = yield from self._speculative_attempt(schema, message_content, spent)
             else:
+                outcome = yield from self._attempt(agent, user_proxy, message_content, attempt)
+            cleaned_sql = outcome["sql"] or cleaned_sql
+            stage = outcome["stage"]
+
+            if stage is None:
                 # --- BAŞARI (SUCCESS) ---
-                
-                # Sonucu ve sorguyu geçmişe kaydet
-                self.history.append({"q": user_question, "sql": safe_sql})
-                
-                # Görselleştirme Önerisi Al (YENİ EKLENEN KISIM)
-                data = result.get("data", [])
-                chart_suggestion = VisualizationService.suggest_chart(data)
-
-                return {
-                    "sql": safe_sql,
-                    "result": result,
-                    "visualization": chart_suggestion, # Frontend burayı okuyacak
-                    "history_update": self.history
-                }
+                # Aynı soru tekrar gelirse LLM'e gitmeden bu SQL kullanılsın. Otomatik LIMIT eklenmemiş
+                # hali saklanır; önbellekten gelen cevapta da sayfa imleci ve grafik kaynağı aynı çalışsın
+                safe_sql = outcome["safe_sql"]
+                sql_cache.put(user_question, *cache_scope, cleaned_sql)
+                CHAT_REQUESTS.inc(outcome="success")
+                yield from self._result_events(
+                    user_question, safe_sql, outcome["result"], cleaned_sql, usage=usage(attempt + 1)
+                )
+                return
+
+            current_error = outcome["error"]
+            if stage == "cancelled":
+                CHAT_REQUESTS.inc(outcome="cancelled")
+                yield "error", {"error": current_error, "cancelled": True, "usage": usage(attempt + 1)}
+                return
+            retry = {"attempt": attempt + 2, "stage": stage, "error": current_error}
+
+            # Budanmış şemada bulunmayan tablo/kolon: seçim genişletilip ajan yeni şemayla değiştirilir
+            identifiers = unknown_identifiers(current_error) if stage == "execution" else None
+            if (
+                identifiers is not None and hidden_tables
+                and widen < self.MAX_SCHEMA_WIDENING and attempt + 1 < max_retries
+            ):
+                widen += 1
+                schema, hidden_tables = self._prompt_schema(full_schema, user_question, widen, identifiers)
+                schema = self._fit_prompt(schema, user_question)[0]
+                system_tokens = self.estimate_tokens(self._system_message(schema))
+                prompt_tokens, completion_tokens = self._usage_tokens(agent)
+                spent[0] += prompt_tokens - usage_before[0]
+                spent[1] += completion_tokens - usage_before[1]
+                agent, user_proxy = self._get_agents(schema)
+                usage_before = self._usage_tokens(agent)
+                retry["schema_tables_hidden"] = hidden_tables
+
+            if attempt + 1 < max_retries:
+                CHAT_RETRIES.inc(stage=stage)
+                yield "retry", retry
+            # Hatayı LLM'e geri besle (doğrulanan sorgularda düzeltilmiş hali gönderilir)
+            message_content = self._stage_correction(
+                user_question, outcome["safe_sql"] or outcome["sql"], current_error, stage
+            )
 
         # Döngü bitti ama başarı yok
-        return {
+        CHAT_REQUESTS.inc(outcome="error")
+        yield "error", {
             "error": f"Sorgu {max_retries} denemede oluşturulamadı. Son hata: {current_error}",
-            "last_sql_attempt": cleaned_sql if 'cleaned_sql' in locals() else None
-        }
\ No newline at end of file
+            "last_sql_attempt": cleaned_sql,
+            "usage": usage(max_retries)
+        }
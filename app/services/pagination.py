@@ -0,0 +1,434 @@
+# app/services/pagination.py
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
+
+from app.core.config import settings
+from app.services.columnar import ColumnarResult
+
+
+class PageCursorError(Exception):
+    """Bilinmeyen veya süresi dolmuş sayfa imleci (HTTP 404)."""
+
+
+class _OpenResult:
+    """
+    Sayfalanan tek bir sonucun durumu.
+
+    Modlar:
+        keyset: ORDER BY kolonları sonuçta varsa, son satırın anahtar değerlerinden
+            sonrası istenir (WHERE (a, b) > (x, y)); her sayfa bağımsız, indeksli bir sorgudur.
+            Eşitlerin sırası sabit olsun diye diğer kolonlar da sıralamaya eklenir.
+        held: Sunucu taraflı imleç açık tutulur, her sayfa fetchmany ile okunur.
+        offset: İmleç tutulamayan motorlarda (DuckDB, tek bağlantılı bellek içi DB'ler)
+            LIMIT/OFFSET ile yeniden çalıştırılır.
+    """
+
+    def __init__(self, mode: str, sql: str, columns: List[str], page_size: int):
+        self.mode = mode
+        self.sql = sql
+        self.columns = columns
+        self.page_size = page_size
+        self.position = 0  # Şimdiye kadar gönderilen satır sayısı
+        self.expires_at = time.time() + settings.RESULT_CURSOR_TTL_SECONDS
+        self.lock = threading.Lock()
+
+        # keyset: [(kolon, desc, nulls_first)], son satırın anahtarı ve o anahtarla gönderilen satır sayısı
+        self.order: List[Tuple[str, bool, bool]] = []
+        self.last_key: Optional[Tuple[Any, ...]] = None
+        self.ties = 0
+        # continue_after: son anahtarla zaten gönderilmiş satırlar (tam sıralama anahtarlarıyla)
+        self.sent_ties: Optional[List[Tuple[Any, ...]]] = None
+
+        # held: açık bağlantı, sonuç ve bir sonraki sayfanın ilk satırı (sonraki sayfa var mı diye okunur)
+        self.connection = None
+        self.result = None
+        self.peeked: Optional[tuple] = None
+
+    def close(self):
+        if self.result is not None:
+            try:
+                self.result.close()
+            except Exception:
+                pass
+            self.result = None
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+
+class ResultPager:
+    """
+    Oturumun açık (sayfalanan) sonuçlarını tutar. Her sonuç, istemciye verilen opak bir
+    imleç (cursor) ile sonraki sayfası istenene kadar yaşar.
+
+    Bellek sınırlıdır: en fazla RESULT_MAX_OPEN_CURSORS sonuç açık tutulur (fazlası en
+    eskiden kapatılır), held modda veritabanı sürücüsü en fazla bir sayfa tamponlar,
+    RESULT_CURSOR_TTL_SECONDS boyunca kullanılmayan imleçler kapatılır.
+    """
+
+    # Sayfalama için sorgunun sarıldığı alt sorgunun adı
+    ALIAS = "_datachat_page"
+
+    # continue_after'da son anahtarla gönderilmiş en fazla bu kadar satır sorguda dışlanır
+    MAX_SENT_TIES = 1000
+
+    def __init__(self, db_manager):
+        self.db = db_manager
+        self._results: "OrderedDict[str, _OpenResult]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- İmleç kayıt defteri ---
+
+    def _register(self, state: _OpenResult) -> str:
+        token = secrets.token_urlsafe(16)
+        evicted = []
+        with self._lock:
+            self._results[token] = state
+            while len(self._results) > settings.RESULT_MAX_OPEN_CURSORS:
+                evicted.append(self._results.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+        return token
+
+    def _take(self, token: str) -> _OpenResult:
+        self.expire()
+        with self._lock:
+            state = self._results.get(token)
+            if state is None:
+                raise PageCursorError("Geçersiz veya süresi dolmuş sayfa imleci.")
+            self._results.move_to_end(token)
+            return state
+
+    def expire(self):
+        """Süresi dolan imleçleri kapatır."""
+        now = time.time()
+        with self._lock:
+            expired = [token for token, state in self._results.items() if state.expires_at < now]
+            states = [self._results.pop(token) for token in expired]
+        for state in states:
+            state.close()
+
+    def close(self, token: str):
+        with self._lock:
+            state = self._results.pop(token, None)
+        if state is not None:
+            state.close()
+
+    def close_all(self):
+        """Veri değiştiğinde veya oturum kapanırken tüm açık sonuçları bırakır."""
+        with self._lock:
+            states = list(self._results.values())
+            self._results.clear()
+        for state in states:
+            state.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            modes = [state.mode for state in self._results.values()]
+        return {"open": len(modes), "held": modes.count("held"), "max_open": settings.RESULT_MAX_OPEN_CURSORS}
+
+    # --- Strateji seçimi ---
+
+    def _order_terms(self, sql: str, columns: List[str]) -> Optional[List[Tuple[str, bool, bool]]]:
+        """
+        Keyset sayfalama için ORDER BY terimlerini (kolon, desc, nulls_first) çıkarır.
+        Her terim sonuçtaki bir kolona birebir karşılık gelmiyorsa None döner.
+        """
+        try:
+            parsed = sqlglot.parse_one(sql, read=self.db.sqlglot_dialect)
+        except Exception:
+            return None
+        order = parsed.args.get("order")
+        if order is None or not order.expressions:
+            return None
+        terms = []
+        for ordered in order.expressions:
+            column = ordered.this
+            if not isinstance(column, exp.Column) or columns.count(column.name) != 1:
+                return None
+            # sqlglot, açıkça yazılmadıysa NULL sırasını lehçenin varsayılanından doldurur
+            terms.append((column.name, bool(ordered.args.get("desc")), bool(ordered.args.get("nulls_first"))))
+        return terms
+
+    def _total_order(self, terms: List[Tuple[str, bool, bool]], columns: List[str]) -> List[Tuple[str, bool, bool]]:
+        """
+        Eşit anahtarlı satırların sırası motorlarda garanti değildir (DuckDB paralel
+        çalıştığında her sorguda farklı sıralar). Kalan kolonlar da sıralamaya eklenir;
+        böylece eşitlik sadece birebir aynı satırlarda kalır ve OFFSET ile atlanabilir.
+        """
+        default = sqlglot.parse_one("SELECT 1 ORDER BY x", read=self.db.sqlglot_dialect).args["order"]
+        nulls_first = bool(default.expressions[0].args.get("nulls_first"))
+        used = {name for name, _, _ in terms}
+        if len(set(columns)) != len(columns):
+            return terms
+        return terms + [(name, False, nulls_first) for name in columns if name not in used]
+
+    def _can_hold(self) -> bool:
+        # DuckDB sonucu zaten tamamen hesaplar ve aynı bağlantıdaki yeni bir sorgu açık
+        # sonucu geçersiz kılar; OFFSET kullanılır. Tek bağlantılı (StaticPool) engine'lerde de
+        # imleç tutulmaz: açık imleç paylaşılan bağlantıda serialized() dışında kalırdı.
+        return self.db.engine.dialect.name != "duckdb" and not isinstance(self.db.engine.pool, StaticPool)
+
+    # --- Sorgu üretimi ---
+
+    def _compare(self, order, key, prefix: str, params: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+        """
+        Her anahtar kolonu için 'sonra gelir' ve 'eşittir' koşullarını, kolonun yönü ve
+        NULL sırasına göre üretir.
+        """
+        quote = self.db.engine.dialect.identifier_preparer.quote
+        after_terms, equal_terms = [], []
+        for idx, ((name, desc, nulls_first), value) in enumerate(zip(order, key)):
+            col = f"{self.ALIAS}.{quote(name)}"
+            if value is None:
+                # NULL'lar başta sıralanıyorsa NULL'dan sonra gelenler dolu değerlerdir
+                after = f"{col} IS NOT NULL" if nulls_first else "1 = 0"
+                equal = f"{col} IS NULL"
+            else:
+                params[f"{prefix}{idx}"] = value
+                after = f"{col} {'<' if desc else '>'} :{prefix}{idx}"
+                if not nulls_first:
+                    after = f"({after} OR {col} IS NULL)"
+                equal = f"{col} = :{prefix}{idx}"
+            after_terms.append(after)
+            equal_terms.append(equal)
+        return after_terms, equal_terms
+
+    def _keyset_sql(self, state: _OpenResult, with_key: bool) -> Tuple[str, Dict[str, Any]]:
+        """
+        Son anahtardan sonraki (ve son anahtara eşit olup henüz gönderilmemiş) satırları
+        getiren sorgu. Karşılaştırma her kolonun yönü ve NULL sırasına göre açılır:
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y) ... OFFSET ties
+        """
+        params: Dict[str, Any] = {}
+        where = ""
+        offset = ""
+        if with_key and state.sent_ties is not None:
+            # continue_after: ilk satırlar başka bir sıralamayla gönderildi. Sadece kullanıcının
+            # ORDER BY kolonlarına göre sonrası + aynı anahtarlı olup gönderilmemiş satırlar.
+            user_order = state.order[:len(state.last_key)]
+            after_terms, equal_terms = self._compare(user_order, state.last_key, "k", params)
+            clauses = [" AND ".join(equal_terms[:idx] + [after]) for idx, after in enumerate(after_terms)]
+            tie = " AND ".join(equal_terms)
+            sent = []
+            for row_idx, sent_key in enumerate(state.sent_ties):
+                _, equal = self._compare(state.order, sent_key, f"s{row_idx}_", params)
+                sent.append(f"({' AND '.join(equal)})")
+            if sent:
+                tie = f"{tie} AND NOT ({' OR '.join(sent)})"
+            clauses.append(tie)
+            where = " WHERE " + " OR ".join(f"({clause})" for clause in clauses)
+        elif with_key:
+            after_terms, equal_terms = self._compare(state.order, state.last_key, "k", params)
+            clauses = [" AND ".join(equal_terms[:idx] + [after]) for idx, after in enumerate(after_terms)]
+            clauses.append(" AND ".join(equal_terms))
+            where = " WHERE " + " OR ".join(f"({clause})" for clause in clauses)
+            offset = f" OFFSET {state.ties}" if state.ties else ""
+
+        sql = (
+            f"SELECT * FROM ({state.sql}) AS {self.ALIAS}{where}"
+            f"{self._order_by(state)} LIMIT {state.page_size + 1}{offset}"
+        )
+        return sql, params
+
+    def _order_by(self, state: _OpenResult) -> str:
+        if not state.order:
+            return ""
+        return " ORDER BY " + ", ".join(
+            exp.Ordered(this=exp.column(name, table=self.ALIAS, quoted=True), desc=desc, nulls_first=nulls_first)
+            .sql(dialect=self.db.sqlglot_dialect)
+            for name, desc, nulls_first in state.order
+        )
+
+    def _offset_sql(self, state: _OpenResult) -> str:
+        # Sıralı sorgularda tam sıralama eklenir; aksi halde eşitler her sayfada farklı dizilebilir
+        return (
+            f"SELECT * FROM ({state.sql}) AS {self.ALIAS}{self._order_by(state)} "
+            f"LIMIT {state.page_size + 1} OFFSET {state.position}"
+        )
+
+    # --- Sayfa okuma ---
+
+    def _advance_keyset(self, state: _OpenResult, rows: List[tuple]):
+        """Gönderilen sayfanın son satırından yeni anahtarı ve eşit anahtar sayısını hesaplar."""
+        indexes = [state.columns.index(name) for name, _, _ in state.order]
+        key = tuple(rows[-1][i] for i in indexes)
+        ties = 0
+        for row in reversed(rows):
+            if tuple(row[i] for i in indexes) != key:
+                break
+            ties += 1
+        # Anahtar değişmediyse (tüm sayfa aynı anahtarlı) önceki eşitler de atlanmalı
+        state.ties = ties + state.ties if key == state.last_key and state.sent_ties is None else ties
+        state.last_key = key
+        state.sent_ties = None
+
+    def _page(self, state: _OpenResult, rows: List[tuple], has_more: bool, token: Optional[str]) -> Dict[str, Any]:
+        state.position += len(rows)
+        state.expires_at = time.time() + settings.RESULT_CURSOR_TTL_SECONDS
+        if not has_more:
+            if token is not None:
+                self.close(token)
+            else:
+                state.close()
+            token = None
+        elif token is None:
+            token = self._register(state)
+        return {
+            "table": ColumnarResult.from_rows(state.columns, rows),
+            "count": len(rows),
+            "offset": state.position - len(rows),
+            "next_cursor": token,
+            "mode": state.mode,
+        }
+
+    def _fetch(self, state: _OpenResult, first: bool) -> Tuple[List[tuple], bool]:
+        """Durumun moduna göre bir sonraki sayfayı (ve devamı olup olmadığını) okur."""
+        if state.mode == "held":
+            if state.result is None:
+                self._hold(state)
+            rows = [state.peeked] if state.peeked is not None else []
+            with self.db.query_guard(state.connection):
+                rows += [tuple(row) for row in state.result.fetchmany(state.page_size + 1 - len(rows))]
+            state.peeked = rows[state.page_size] if len(rows) > state.page_size else None
+            return rows[:state.page_size], state.peeked is not None
+
+        if state.mode == "keyset":
+            sql, params = self._keyset_sql(state, with_key=not first)
+        else:
+            sql, params = self._offset_sql(state), {}
+        with self.db.engine.connect() as conn, self.db.query_guard(conn):
+            rows = [tuple(row) for row in conn.execute(text(sql), params).fetchall()]
+        has_more = len(rows) > state.page_size
+        rows = rows[:state.page_size]
+        if state.mode == "keyset" and rows:
+            self._advance_keyset(state, rows)
+        return rows, has_more
+
+    def _hold(self, state: _OpenResult):
+        """Sorguyu sunucu taraflı imleçle açar ve daha önce gönderilmiş satırları atlar."""
+        state.connection = self.db.engine.connect()
+        with self.db.query_guard(state.connection):
+            state.result = state.connection.execution_options(
+                stream_results=True, max_row_buffer=state.page_size + 1
+            ).execute(text(state.sql))
+            skipped = 0
+            while skipped < state.position:
+                batch = state.result.fetchmany(min(state.page_size, state.position - skipped))
+                if not batch:
+                    break
+                skipped += len(batch)
+
+    def open(self, sql: str, page_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Sorguyu sayfalı çalıştırır ve ilk sayfayı döndürür.
+        Not: Güvenlik kontrolleri (Validation) çağıran katmanda yapılmalıdır (LIMIT eklenmeden).
+        """
+        page_size = self.clamp_page_size(page_size)
+        self.expire()
+
+        # Kolon adları için sorgu bir kez sunucu taraflı imleçle açılır
+        can_hold = self._can_hold()
+        conn = self.db.engine.connect()
+        try:
+            # Süre sınırı sorgunun ilk satıra kadar olan kısmını (sıralama, join) kapsar
+            with self.db.query_guard(conn):
+                result = conn.execution_options(stream_results=True, max_row_buffer=page_size + 1).execute(text(sql))
+                if not result.returns_rows:
+                    raise ValueError("Sorgu satır döndürmüyor.")
+                columns = list(result.keys())
+                if not can_hold:
+                    # İmleç tutulmayacaksa paylaşılan bağlantı blok içinde bırakılır
+                    result.close()
+        except Exception:
+            conn.close()
+            raise
+
+        order = self._order_terms(sql, columns)
+        if order is not None:
+            order = self._total_order(order, columns)
+            mode = "keyset"
+        elif can_hold:
+            mode = "held"
+        else:
+            mode = "offset"
+        state = _OpenResult(mode, sql, columns, page_size)
+        state.order = order or []
+
+        if mode == "held":
+            state.connection, state.result = conn, result
+        else:
+            if can_hold:
+                result.close()
+            conn.close()
+
+        try:
+            rows, has_more = self._fetch(state, first=True)
+        except Exception:
+            state.close()
+            raise
+        return self._page(state, rows, has_more, None)
+
+    def _sent_ties(self, order, columns: List[str], rows: List[tuple]) -> Optional[List[tuple]]:
+        """
+        Gönderilen satırlardan son anahtarı paylaşanları döndürür. Bunlar bir sonraki
+        sorguda tek tek dışlanır; çok fazlaysa (sorgu şişer) None döner ve keyset kullanılmaz.
+        """
+        indexes = [columns.index(name) for name, _, _ in order]
+        key = tuple(rows[-1][i] for i in indexes)
+        ties = [row for row in rows if tuple(row[i] for i in indexes) == key]
+        return ties if len(ties) <= self.MAX_SENT_TIES else None
+
+    def continue_after(self, sql: str, sent: ColumnarResult, page_size: Optional[int] = None) -> Optional[str]:
+        """
+        Zaten gönderilmiş ilk satırların (örn. /chat'in LIMIT'li sonucu) devamı için imleç
+        açar; sorgu en baştan tekrar gönderilmez. Devamı olmayabilir, ilk istek bunu gösterir.
+        """
+        if not sent.count:
+            return None
+        columns = sent.columns
+        rows = list(sent.rows())
+        order = self._order_terms(sql, columns)
+        ties = self._sent_ties(order, columns, rows) if order is not None else None
+        if ties is not None:
+            state = _OpenResult("keyset", sql, columns, self.clamp_page_size(page_size))
+            state.order = self._total_order(order, columns)
+            indexes = [columns.index(name) for name, _, _ in state.order]
+            state.last_key = tuple(rows[-1][columns.index(name)] for name, _, _ in order)
+            state.sent_ties = [tuple(row[i] for i in indexes) for row in ties]
+        else:
+            # İmleç ilk sonraki sayfa isteğinde açılır, gönderilmiş satırlar atlanır
+            mode = "held" if self._can_hold() else "offset"
+            state = _OpenResult(mode, sql, columns, self.clamp_page_size(page_size))
+            if mode == "offset" and order is not None:
+                state.order = self._total_order(order, columns)
+        state.position = sent.count
+        return self._register(state)
+
+    def next_page(self, token: str) -> Dict[str, Any]:
+        """İmlecin gösterdiği sonraki sayfayı döndürür; son sayfada imleç kapatılır."""
+        state = self._take(token)
+        with state.lock:
+            try:
+                rows, has_more = self._fetch(state, first=False)
+            except Exception:
+                self.close(token)
+                raise
+            return self._page(state, rows, has_more, token)
+
+    @staticmethod
+    def clamp_page_size(page_size: Optional[int]) -> int:
+        if not page_size:
+            return settings.RESULT_PAGE_SIZE
+        return max(1, min(int(page_size), settings.RESULT_PAGE_SIZE_MAX))
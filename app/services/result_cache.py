@@ -0,0 +1,91 @@
+# app/services/result_cache.py
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import sqlglot
+
+
+class QueryResultCache:
+    """
+    Oturuma ait sorgu sonuçlarını bellekte tutan LRU önbellek.
+
+    Anahtar olarak sqlglot ile normalize edilmiş SQL kullanılır; böylece boşluk veya
+    büyük/küçük harf farkı olan aynı sorgu tekrar çalıştırılmaz. Toplam boyut
+    'max_bytes' bütçesini aşarsa en uzun süredir kullanılmayan sonuçlar atılır.
+    """
+
+    def __init__(self, max_bytes: int, dialect: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.dialect = dialect
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # {anahtar: (sonuç, boyut)}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def normalize(self, sql: str) -> str:
+        """SQL'i önbellek anahtarına çevirir (parse edilemezse boşlukları sadeleştirir)."""
+        try:
+            return sqlglot.parse_one(sql, read=self.dialect).sql(
+                dialect=self.dialect, normalize=True, normalize_functions="upper"
+            )
+        except Exception:
+            return " ".join(sql.split())
+
+    @staticmethod
+    def estimate_size(result: Dict[str, Any]) -> int:
+        """Sonucun bellekte kapladığı yaklaşık alanı (byte) hesaplar."""
+        size = sys.getsizeof(result)
+        if "table" in result:
+            return size + result["table"].estimate_size()
+        for row in result.get("data", []):
+            size += sys.getsizeof(row)
+            for value in row.values():
+                size += sys.getsizeof(value)
+        return size
+
+    def get(self, sql: str) -> Optional[Dict[str, Any]]:
+        key = self.normalize(sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, sql: str, result: Dict[str, Any]):
+        size = self.estimate_size(result)
+        # Tek başına bütçeyi aşan sonuçlar önbelleğe alınmaz
+        if size > self.max_bytes:
+            return
+        key = self.normalize(sql)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (result, size)
+            self._size += size
+            # Bütçe aşıldıysa en eski (LRU) kayıtları at
+            while self._size > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def clear(self):
+        """Veri kaynağı değiştiğinde tüm sonuçları geçersiz kılar."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
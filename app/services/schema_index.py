@@ -0,0 +1,191 @@
+# app/services/schema_index.py
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+# Türkçe karakterler ASCII karşılıklarına indirgenir ("müşteri" sorusu "musteri" kolonunu bulsun)
+_FOLD = str.maketrans("çğıöşüâîûÇĞİIÖŞÜÂÎÛ", "cgiosuaiucgiiosuaiu")
+_WORD = re.compile(r"[a-z0-9]+")
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+# Veritabanı hata mesajlarındaki bilinmeyen tablo/kolon kalıpları (sqlite, postgres, mysql, duckdb)
+_UNKNOWN_PATTERNS = re.compile(
+    r"no such (?:table|column)|does not exist|doesn't exist|unknown column|referenced column|"
+    r"table with name|not found in from clause|could not find column|unknown table",
+    re.IGNORECASE,
+)
+_IDENTIFIERS = re.compile(
+    r"no such (?:table|column): ([\w.]+)|table with name ([\w.]+)|[\"'`]([\w.]+)[\"'`]",
+    re.IGNORECASE,
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Metni arama terimlerine böler: camelCase ve snake_case ayrılır, Türkçe karakterler
+    katlanır, her kelimenin ilk 5 harfi alınır (Türkçe eklerden bağımsız eşleşme için:
+    "satışların" ve "satis" aynı terime düşer).
+    """
+    text = _CAMEL.sub(" ", text).translate(_FOLD).lower()
+    return [word[:5] for word in _WORD.findall(text) if len(word) > 1]
+
+
+def unknown_identifiers(error: str) -> Optional[List[str]]:
+    """
+    Hata bilinmeyen bir tablo/kolondan kaynaklanıyorsa mesajda geçen adları döndürür
+    (adı çıkarılamazsa boş liste); başka bir hataysa None.
+    """
+    if not error or not _UNKNOWN_PATTERNS.search(error):
+        return None
+    names = []
+    for match in _IDENTIFIERS.finditer(error):
+        name = next(group for group in match.groups() if group)
+        names.extend(part for part in name.split(".") if part)
+    return names
+
+
+class SchemaIndex:
+    """
+    Şemanın yerel arama indeksi: her tablo bir belge (tablo adı, kolon adları ve kategorik
+    değer ipuçlarını içeren şema bloğu), soru ile BM25 skoruyla eşleştirilir. Tablolar
+    arasındaki JOIN komşulukları tanımlı yabancı anahtarlardan ve isimlendirmeden
+    (örn. orders.customer_id -> customers) çıkarılır.
+    """
+
+    K1 = 1.5
+    B = 0.75
+
+    # Tablo adı terimleri belgede bu kadar kez sayılır (ad eşleşmesi kolondan daha değerli)
+    TABLE_NAME_WEIGHT = 3
+
+    def __init__(self, blocks: Dict[str, str], columns: Dict[str, List[str]], foreign_keys: Optional[Dict[str, Set[str]]] = None):
+        self.blocks = blocks
+        self.tables = list(blocks)
+        self.columns = columns
+        self._terms: Dict[str, Counter] = {}
+        for table, block in blocks.items():
+            terms = Counter(tokenize(block))
+            for term in tokenize(table):
+                terms[term] += self.TABLE_NAME_WEIGHT
+            self._terms[table] = terms
+        self._lengths = {table: sum(terms.values()) for table, terms in self._terms.items()}
+        self._average = (sum(self._lengths.values()) / len(self._lengths)) if self._lengths else 0.0
+        document_frequency: Counter = Counter()
+        for terms in self._terms.values():
+            document_frequency.update(terms.keys())
+        total = len(self.tables)
+        self._idf = {
+            term: math.log(1 + (total - count + 0.5) / (count + 0.5))
+            for term, count in document_frequency.items()
+        }
+        self.neighbours = self._build_graph(foreign_keys or {})
+
+    def _build_graph(self, foreign_keys: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+        """Tanımlı yabancı anahtarlar + '<tablo>_id' / ortak '*_id' kolonlarından komşuluklar."""
+        graph: Dict[str, Set[str]] = {table: set() for table in self.tables}
+
+        def link(left: str, right: str):
+            if left != right and left in graph and right in graph:
+                graph[left].add(right)
+                graph[right].add(left)
+
+        for table, targets in foreign_keys.items():
+            for target in targets:
+                link(table, target)
+
+        # Tablo adının tekil/çoğul hallerine göre ("customers" -> "customer", "musteriler" -> "musteri")
+        stems: Dict[str, List[str]] = {}
+        for table in self.tables:
+            folded = table.translate(_FOLD).lower()
+            for stem in {folded, re.sub(r"(ler|lar|es|s)$", "", folded)}:
+                stems.setdefault(stem, []).append(table)
+
+        owners: Dict[str, List[str]] = {}
+        for table, columns in self.columns.items():
+            for column in columns:
+                folded = column.translate(_FOLD).lower()
+                match = re.match(r"(.+?)_?id$", folded)
+                if not match or folded == "id":
+                    continue
+                for target in stems.get(match.group(1), []):
+                    link(table, target)
+                owners.setdefault(folded, []).append(table)
+        for tables in owners.values():
+            for other in tables[1:]:
+                link(tables[0], other)
+        return graph
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """Sorunun her tablo için BM25 skoru (eşleşmeyen tablolar dahil edilmez)."""
+        query = Counter(tokenize(text))
+        results: Dict[str, float] = {}
+        for table, terms in self._terms.items():
+            score = 0.0
+            norm = self.K1 * (1 - self.B + self.B * self._lengths[table] / (self._average or 1))
+            for term in query:
+                frequency = terms.get(term)
+                if frequency:
+                    score += self._idf[term] * frequency * (self.K1 + 1) / (frequency + norm)
+            if score > 0:
+                results[table] = score
+        return results
+
+    def tables_matching(self, identifiers: Iterable[str]) -> List[str]:
+        """Adı veya kolonlarından biri verilen adlardan biri olan tablolar."""
+        wanted = {name.translate(_FOLD).lower() for name in identifiers}
+        return [
+            table for table in self.tables
+            if table.translate(_FOLD).lower() in wanted
+            or any(column.translate(_FOLD).lower() in wanted for column in self.columns.get(table, []))
+        ]
+
+    def select(self, question: str, pinned: Iterable[str] = (), top_k: int = 8, budget_chars: int = 9000, hops: int = 1) -> List[str]:
+        """
+        Prompt'a girecek tablolar: sabitlenenler (örn. önceki turda kullanılanlar), en ilgili
+        top_k tablo, ardından bunların 'hops' adımlık JOIN komşuları (skora göre), şema
+        blokları 'budget_chars' karakteri aşmayacak şekilde. Soru hiçbir tabloyla
+        eşleşmezse şema sırasıyla bütçe dolana kadar tablo alınır.
+        """
+        scores = self.scores(question)
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        seeds = [table for table in dict.fromkeys(pinned) if table in self.blocks] + ranked[:top_k]
+        if not seeds:
+            seeds = self.tables
+
+        selected: List[str] = []
+        used = 0
+
+        def add(table: str) -> bool:
+            nonlocal used
+            if table in selected:
+                return True
+            size = len(self.blocks[table]) + 1
+            if selected and used + size > budget_chars:
+                return False
+            selected.append(table)
+            used += size
+            return True
+
+        for table in dict.fromkeys(seeds):
+            add(table)
+
+        frontier = list(selected)
+        for _ in range(hops):
+            candidates = {neighbour for table in frontier for neighbour in self.neighbours.get(table, ()) if neighbour not in selected}
+            frontier = [table for table in sorted(candidates, key=lambda name: -scores.get(name, 0.0)) if add(table)]
+        return selected
+
+    def render(self, tables: List[str], budget_chars: Optional[int] = None) -> str:
+        """Seçilen tabloların şema blokları + (bütçe yeterse) diğer tabloların sadece adları."""
+        text = "\n".join(self.blocks[table] for table in tables)
+        others = [table for table in self.tables if table not in tables]
+        if others:
+            names = ", ".join(others)
+            room = (budget_chars - len(text)) if budget_chars is not None else len(names)
+            if len(names) > room:
+                cut = names.rfind(", ", 0, max(room, 0))
+                names = names[:cut] + ", ..." if cut > 0 else ""
+            if names:
+                text += f"\nDİĞER TABLOLAR (kolonları gösterilmedi): {names}"
+        return text
@@ -1,17 +1,42 @@
 # app/services/security.py
+import functools
 import sqlglot
 from sqlglot import exp
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+
+
+class QueryCostError(ValueError):
+    """Sorgunun tahmini maliyeti COST_GUARD_MAX_ROWS sınırını aşıyor (plan özeti mesajdadır)."""
+
 
 class SQLValidator:
     @staticmethod
-    def validate_and_fix(sql: str) -> str:
+    @functools.lru_cache(maxsize=settings.SQL_AST_CACHE_SIZE)
+    def parse(sql: str, dialect: Optional[str] = None) -> exp.Expression:
+        """
+        SQL'i parse eder; aynı metin tekrar geldiğinde önbellekteki AST döner.
+        Dönen ağaç paylaşıldığı için değiştirilmemelidir (builder metotları zaten kopyalar).
+        """
+        return sqlglot.parse_one(sql, read=dialect)
+
+    @staticmethod
+    def validate_and_fix(sql: str, limit: Optional[int] = settings.DEFAULT_SQL_LIMIT, dialect: Optional[str] = None) -> str:
         """
-        SQL sorgusunu analiz eder, zararlı komutları reddeder 
+        SQL sorgusunu analiz eder, zararlı komutları reddeder
         ve otomatik olarak LIMIT ekler.
+        'limit' None verilirse LIMIT eklenmez (örn. satır sınırını kendisi uygulayan export).
+        'dialect' verilirse SQL o lehçede okunup yine o lehçede yazılır (örn. "duckdb").
+        Aynı (sql, limit, dialect) için sonuç önbellekten gelir; SQL tekrar parse edilmez.
         """
+        return SQLValidator._validate(sql, limit, dialect)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=settings.SQL_AST_CACHE_SIZE)
+    def _validate(sql: str, limit: Optional[int], dialect: Optional[str]) -> str:
         try:
             # 1. SQL'i Parse Et
-            parsed = sqlglot.parse_one(sql)
+            parsed = SQLValidator.parse(sql, dialect)
         except Exception as e:
             raise ValueError(f"Geçersiz SQL sözdizimi: {str(e)}")
 
@@ -27,7 +52,76 @@ class SQLValidator:
                 raise ValueError(f"Güvenlik İhlali: Yasaklı komut tespit edildi ({node.key}).")
 
         # 4. Otomatik LIMIT Ekleme
-        if not parsed.args.get("limit"):
-            parsed = parsed.limit(100) # Varsayılan limit
+        if limit is not None and not parsed.args.get("limit"):
+            parsed = parsed.limit(limit) # Varsayılan limit
+
+        return parsed.sql(dialect=dialect)
+
+    @staticmethod
+    def table_aliases(sql: str, dialect: Optional[str] = None) -> Dict[str, str]:
+        """Sorgudaki tablo takma adları -> tablo adı (planlar takma adları gösterir)."""
+        aliases = {}
+        for table in SQLValidator.parse(sql, dialect).find_all(exp.Table):
+            aliases[table.alias_or_name] = table.name
+        return aliases
 
-        return parsed.sql()
\ No newline at end of file
+    @staticmethod
+    def cartesian_joins(sql: str, dialect: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        Birleştirme koşulu olmayan JOIN'leri (CROSS JOIN, ON'suz JOIN veya WHERE'de
+        eşitlikle bağlanmayan 'FROM a, b') (sol, sağ) tablo çiftleri olarak döndürür.
+        Niteliksiz kolonlarda hangi tabloya ait olduğu bilinmediği için bağlı kabul edilir.
+        """
+        pairs = []
+        for select in SQLValidator.parse(sql, dialect).find_all(exp.Select):
+            # sqlglot sürümüne göre anahtar "from_" veya "from" olabilir
+            source = select.args.get("from_") or select.args.get("from")
+            if source is None or not isinstance(source.this, exp.Table):
+                continue
+            seen = [source.this.alias_or_name]
+            where = select.args.get("where")
+            for join in select.args.get("joins") or []:
+                if not isinstance(join.this, exp.Table):
+                    seen.append(None)
+                    continue
+                name = join.this.alias_or_name
+                if not join.args.get("on") and not join.args.get("using"):
+                    if not SQLValidator._linked(where, name, seen):
+                        pairs.append((seen[-1] or "?", name))
+                seen.append(name)
+        return pairs
+
+    @staticmethod
+    def _linked(where: Optional[exp.Expression], name: str, others: List[Optional[str]]) -> bool:
+        if where is None:
+            return False
+        for eq in where.find_all(exp.EQ):
+            left, right = eq.left, eq.right
+            if not isinstance(left, exp.Column) or not isinstance(right, exp.Column):
+                continue
+            tables = {left.table or None, right.table or None}
+            if None in tables or (name in tables and tables & set(others)):
+                return True
+        return False
+
+    @staticmethod
+    def check_cost(sql: str, db_manager) -> Optional[Dict]:
+        """
+        Çalıştırmadan önce veritabanının EXPLAIN planından maliyet tahmini yapar
+        (bkz. QueryCostGuard). Tahmini taranan satır COST_GUARD_MAX_ROWS'u aşarsa plan
+        özetiyle birlikte QueryCostError fırlatır; aksi halde raporu döndürür.
+        COST_GUARD_ENABLED kapalıysa veya plan alınamazsa None döner.
+        """
+        if not settings.COST_GUARD_ENABLED:
+            return None
+        report = db_manager.cost_guard.estimate(sql)
+        if report is None:
+            return None
+        if report["rows_examined"] > settings.COST_GUARD_MAX_ROWS:
+            raise QueryCostError(db_manager.cost_guard.describe(report))
+        return report
+
+    @staticmethod
+    def cache_stats() -> Dict[str, int]:
+        info = SQLValidator._validate.cache_info()
+        return {"entries": info.currsize, "max_entries": info.maxsize, "hits": info.hits, "misses": info.misses}
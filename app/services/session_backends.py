@@ -0,0 +1,266 @@
+# app/services/session_backends.py
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+
+class SessionBackend(ABC):
+    """
+    Oturum meta verisinin (geçmiş, veri kaynağı, zaman damgaları) saklandığı depo.
+
+    Kayıt formatı:
+        {"id", "created_at", "last_accessed", "history", "data_source", "data_version"}
+    'shared' True olan depolar birden fazla uvicorn worker'ı tarafından ortak kullanılabilir;
+    bu durumda yüklenen dosyalar da her worker'ın açabileceği dosyalara yazılır.
+    """
+    name = ""
+    shared = False
+
+    @abstractmethod
+    def create(self, session_id: str, created_at: float):
+        ...
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def update(self, session_id: str, **fields):
+        ...
+
+    @abstractmethod
+    def append_history(self, session_id: str, entries: List[Dict[str, Any]], limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Geçmişin sonuna ekler ve son 'limit' kaydı tutar; birleştirme deponun içinde, atomik
+        yapılır (aynı oturuma farklı worker'larda gelen istekler birbirinin kaydını ezmesin).
+        Güncel geçmişi döndürür, kayıt yoksa None.
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def purge_idle(self, before: float) -> List[Dict[str, Any]]:
+        """'before' zamanından beri erişilmeyen kayıtları siler ve silinenleri döndürür."""
+
+    @staticmethod
+    def _new_record(session_id: str, created_at: float) -> Dict[str, Any]:
+        return {
+            "id": session_id,
+            "created_at": created_at,
+            "last_accessed": created_at,
+            "history": [],
+            "data_source": None,
+            "data_version": 0,
+        }
+
+
+class MemorySessionBackend(SessionBackend):
+    """Tek süreçlik varsayılan depo (eski davranış). Sadece tek worker ile çalışır."""
+    name = "memory"
+
+    def __init__(self):
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, session_id: str, created_at: float):
+        with self._lock:
+            self._records[session_id] = self._new_record(session_id, created_at)
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(session_id)
+            return dict(record) if record else None
+
+    def update(self, session_id: str, **fields):
+        with self._lock:
+            if session_id in self._records:
+                self._records[session_id].update(fields)
+
+    def append_history(self, session_id: str, entries: List[Dict[str, Any]], limit: int) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            record = self._records.get(session_id)
+            if record is None:
+                return None
+            record["history"] = (record["history"] + entries)[-limit:]
+            return list(record["history"])
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._records.pop(session_id, None)
+
+    def purge_idle(self, before: float) -> List[Dict[str, Any]]:
+        with self._lock:
+            expired = [sid for sid, record in self._records.items() if record["last_accessed"] < before]
+            return [self._records.pop(sid) for sid in expired]
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Aynı makinedeki worker'ların paylaştığı SQLite dosyası. Redis kurulu olmayan
+    ortamlarda (veya Redis'in yerel yedeği olarak) kullanılır. WAL modu sayesinde
+    okumalar yazmaları beklemez.
+    """
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, created_at REAL, last_accessed REAL, "
+                "history TEXT, data_source TEXT, data_version INTEGER)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_last_accessed ON sessions (last_accessed)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @staticmethod
+    def _row_to_record(row) -> Dict[str, Any]:
+        session_id, created_at, last_accessed, history, data_source, data_version = row
+        return {
+            "id": session_id,
+            "created_at": created_at,
+            "last_accessed": last_accessed,
+            "history": json.loads(history) if history else [],
+            "data_source": json.loads(data_source) if data_source else None,
+            "data_version": data_version or 0,
+        }
+
+    def create(self, session_id: str, created_at: float):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO sessions VALUES (?, ?, ?, '[]', NULL, 0)",
+                (session_id, created_at, created_at),
+            )
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def update(self, session_id: str, **fields):
+        if not fields:
+            return
+        for key in ("history", "data_source"):
+            if key in fields:
+                fields[key] = json.dumps(fields[key], default=str) if fields[key] is not None else None
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE sessions SET {assignments} WHERE id = ?", (*fields.values(), session_id))
+
+    def append_history(self, session_id: str, entries: List[Dict[str, Any]], limit: int) -> Optional[List[Dict[str, Any]]]:
+        with self._connect() as conn:
+            # Okuma ve yazma arasına başka bir worker'ın yazması girmesin (yazma kilidi baştan alınır)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT history FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                if row is None:
+                    conn.execute("ROLLBACK")
+                    return None
+                history = ((json.loads(row[0]) if row[0] else []) + entries)[-limit:]
+                conn.execute(
+                    "UPDATE sessions SET history = ? WHERE id = ?", (json.dumps(history, default=str), session_id)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return history
+
+    def delete(self, session_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def purge_idle(self, before: float) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute("DELETE FROM sessions WHERE last_accessed < ? RETURNING *", (before,)).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+
+class RedisSessionBackend(SessionBackend):
+    """
+    Redis (veya Redis protokolünü konuşan herhangi bir sunucu: Valkey, KeyDB, yerel bir
+    test sunucusu) üzerinde paylaşılan depo. Boşta kalma süresi Redis'in kendi anahtar
+    TTL'i ile uygulanır.
+    """
+    name = "redis"
+    shared = True
+    KEY_PREFIX = "datachat:session:"
+
+    def __init__(self, url: str, ttl_seconds: int):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("Redis oturum deposu için 'redis' paketi kurulu olmalıdır.")
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+        self._watch_error = redis.WatchError
+        self.ttl_seconds = ttl_seconds
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.KEY_PREFIX}{session_id}"
+
+    def create(self, session_id: str, created_at: float):
+        record = self._new_record(session_id, created_at)
+        self._client.set(self._key(session_id), json.dumps(record), ex=self.ttl_seconds)
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raw = self._client.get(self._key(session_id))
+        return json.loads(raw) if raw else None
+
+    def _modify(self, session_id: str, change) -> Optional[Dict[str, Any]]:
+        """Kaydı 'change' ile değiştirip yazar; güncel kaydı (yoksa None) döndürür."""
+        key = self._key(session_id)
+        # Eşzamanlı güncellemelerde kayıt kaybolmasın diye WATCH ile iyimser kilit
+        with self._client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    if not raw:
+                        pipe.reset()
+                        return None
+                    record = json.loads(raw)
+                    change(record)
+                    pipe.multi()
+                    pipe.set(key, json.dumps(record, default=str), ex=self.ttl_seconds)
+                    pipe.execute()
+                    return record
+                except self._watch_error:
+                    continue  # Kayıt arada başka bir worker tarafından değişti, tekrar dene
+
+    def update(self, session_id: str, **fields):
+        self._modify(session_id, lambda record: record.update(fields))
+
+    def append_history(self, session_id: str, entries: List[Dict[str, Any]], limit: int) -> Optional[List[Dict[str, Any]]]:
+        def change(record):
+            record["history"] = (record["history"] + entries)[-limit:]
+
+        record = self._modify(session_id, change)
+        return record["history"] if record else None
+
+    def delete(self, session_id: str):
+        self._client.delete(self._key(session_id))
+
+    def purge_idle(self, before: float) -> List[Dict[str, Any]]:
+        # Süresi dolan anahtarları Redis kendisi siler
+        return []
+
+
+def create_backend(kind: str, url: Optional[str], data_dir: str, ttl_seconds: int) -> SessionBackend:
+    """SESSION_BACKEND ayarına göre oturum deposunu oluşturur."""
+    if kind == "memory":
+        return MemorySessionBackend()
+    if kind == "sqlite":
+        os.makedirs(data_dir, exist_ok=True)
+        return SQLiteSessionBackend(url or os.path.join(data_dir, "sessions.db"))
+    if kind == "redis":
+        return RedisSessionBackend(url or "redis://localhost:6379/0", ttl_seconds)
+    raise ValueError(f"Desteklenmeyen oturum deposu: {kind}. Geçerli değerler: memory, sqlite, redis")
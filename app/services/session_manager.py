@@ -1,80 +1,402 @@
+import asyncio
+import os
+import sys
+import threading
+import time
 import uuid
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from typing import Dict, Optional, List, Any
-from app.services.db_service import DatabaseManager
+from app.core.config import settings
+from app.services.db_service import DatabaseManager, IngestProgress
+from app.services.session_backends import SessionBackend, create_backend
 
 class SessionData:
     """
     Tek bir kullanıcının/sekmenin oturum verilerini tutar.
-    
+
     Attributes:
         db_manager (DatabaseManager): Kullanıcının aktif veritabanı bağlantısı.
         history (List): Konuşma geçmişi (Soru-Cevap çiftleri).
         created_at (datetime): Oturumun oluşturulma zamanı.
         last_accessed (datetime): Son işlem zamanı (Timeout kontrolü için).
+        ingest_progress (IngestProgress): Son dosya yüklemesinin ilerleme durumu.
+        lock (asyncio.Lock): Aynı oturumdaki isteklerin (sohbet, yükleme) sırayla işlenmesini sağlar.
+        data_version (int): Veri kaynağı her değiştiğinde artar; başka bir worker'daki
+            değişiklik bu sayı üzerinden fark edilir.
+        agent_cache (Dict): Şema değişmediği sürece yeniden kullanılan LLM ajanları.
+        closed (bool): Oturum bu süreçte kapatıldı/çıkarıldı mı? Nesneyi daha önce almış bir
+            istek kilidi aldıktan sonra buna bakar (veritabanı artık dispose edilmiştir).
     """
     def __init__(self, db_manager: Optional[DatabaseManager] = None):
         self.db_manager = db_manager
         self.history: List[Dict[str, Any]] = []  # Sohbet hafızası burada tutulur
         self.created_at = datetime.now()
         self.last_accessed = datetime.now()
+        self.ingest_progress: Optional[IngestProgress] = None
+        self.lock = asyncio.Lock()
+        self.data_version = 0
+        self.agent_cache: Dict[Any, Any] = {}
+        self.closed = False
+
+    def memory_bytes(self) -> int:
+        """
+        Oturumun yaklaşık bellek kullanımı: bellek içi DB + sonuç önbelleği + sohbet geçmişi.
+        """
+        size = sys.getsizeof(self.history)
+        for item in self.history:
+            size += sum(sys.getsizeof(value) for value in item.values())
+        if self.db_manager:
+            size += self.db_manager.memory_bytes + self.db_manager.result_cache.stats()["bytes"]
+        return size
 
 class SessionManager:
     """
-    Tüm aktif kullanıcı oturumlarını bellekte yöneten sınıf.
+    Tüm aktif kullanıcı oturumlarını yöneten sınıf.
+
+    Oturum kayıtları (sohbet geçmişi, veri kaynağı tarifi) bir SessionBackend'de tutulur.
+    Bu süreçteki SessionData nesneleri sadece açık DB bağlantılarını ve kilitleri tutan
+    yerel bir önbellektir. Paylaşılan depolarda (sqlite/redis) isteği hangi worker
+    karşılarsa karşılasın oturum depodan okunur ve verisi o worker'da yeniden açılır.
+
+    Tarayıcılar /session/end çağırmadığı için oturumlar kendiliğinden temizlenir:
+    arka plandaki süpürücü (sweeper) belirli süre kullanılmayan oturumları kapatır,
+    toplam bellek bütçesi aşılırsa en uzun süredir kullanılmayanları (LRU) çıkarır.
     """
-    def __init__(self):
-        # {session_id: SessionData} sözlüğü
-        self._sessions: Dict[str, SessionData] = {}
+    # Paylaşılan depoda 'last_accessed' her istekte değil, en fazla bu aralıkla yazılır
+    TOUCH_INTERVAL_SECONDS = 5
+
+    def __init__(self, backend: Optional[SessionBackend] = None):
+        self.backend = backend or create_backend(
+            settings.SESSION_BACKEND,
+            settings.SESSION_BACKEND_URL or None,
+            settings.SESSION_DATA_DIR,
+            settings.SESSION_IDLE_TTL_SECONDS,
+        )
+
+        # {session_id: SessionData} sözlüğü (en eski erişilen başta; LRU sırası)
+        self._sessions: "OrderedDict[str, SessionData]" = OrderedDict()
+        # Sözlüğe istek thread'leri ve süpürücü aynı anda erişir
+        self._lock = threading.RLock()
+
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        # Metrikler
+        self.evicted_idle = 0
+        self.evicted_memory = 0
+        self.closed = 0
+        self.hydrated = 0  # Başka bir worker'da oluşan verinin bu süreçte açılma sayısı
 
     def create_session(self) -> str:
         """Yeni bir benzersiz oturum ID'si oluşturur ve hafızada yer ayırır."""
         session_id = str(uuid.uuid4())
-        self._sessions[session_id] = SessionData()
+        self.backend.create(session_id, time.time())
+        with self._lock:
+            self._sessions[session_id] = SessionData()
         return session_id
 
     def get_session(self, session_id: str) -> Optional[SessionData]:
         """
         Verilen ID'ye ait oturum verisini döner.
-        Her çağrıldığında 'last_accessed' güncellenir.
+        Her çağrıldığında 'last_accessed' güncellenir ve oturum LRU sırasının sonuna alınır.
+        Paylaşılan depoda kayıt her seferinde depodan okunur: geçmiş güncellenir, veri
+        kaynağı başka bir worker'da değiştiyse yeniden açılır.
         """
-        if session_id in self._sessions:
-            session = self._sessions[session_id]
+        if not self.backend.shared:
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session is None:
+                    return None
+                session.last_accessed = datetime.now()
+                self._sessions.move_to_end(session_id)
+                return session
+
+        record = self.backend.load(session_id)
+        if record is None:
+            # Oturum başka bir worker'da kapatılmış veya süresi dolmuş
+            self._release_local(session_id)
+            return None
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = SessionData()
+                self._sessions[session_id] = session
             session.last_accessed = datetime.now()
-            return session
-        return None
+            self._sessions.move_to_end(session_id)
+            session.history = record["history"]
+            if session.data_version != record["data_version"]:
+                self._hydrate(session, record)
+
+        if time.time() - record["last_accessed"] > self.TOUCH_INTERVAL_SECONDS:
+            self.backend.update(session_id, last_accessed=time.time())
+        return session
+
+    def _hydrate(self, session: SessionData, record: Dict[str, Any]):
+        """Depodaki veri kaynağı tarifinden oturumun DB yöneticisini (yeniden) açar."""
+        old_manager = session.db_manager
+        session.db_manager = None
+        session.data_version = record["data_version"]
+        if record["data_source"]:
+            try:
+                session.db_manager = DatabaseManager.open_source(record["data_source"])
+                self.hydrated += 1
+            except Exception as e:
+                print(f"Uyarı: Oturum verisi açılamadı: {e}")
+        if old_manager:
+            try:
+                old_manager.dispose()
+            except Exception as e:
+                print(f"Uyarı: Eski DB kapatılırken hata oluştu: {e}")
+
+    def dataset_path(self, session_id: str, engine: Optional[str] = None) -> Optional[str]:
+        """
+        Paylaşılan depoda yüklenen dosyanın yazılacağı veritabanı dosyasının yolu.
+        Tek süreçlik depoda None döner (veri bellekte tutulur). Her yüklemede (ekleme
+        dahil) yeni bir dosya adı üretilir; böylece eski dosyayı okuyan worker'lar etkilenmez.
+        """
+        if not self.backend.shared:
+            return None
+        os.makedirs(settings.SESSION_DATA_DIR, exist_ok=True)
+        kind = engine or settings.UPLOAD_ENGINE
+        return os.path.join(settings.SESSION_DATA_DIR, f"{session_id}__{uuid.uuid4().hex[:8]}.{kind}")
+
+    def _bump_data_version(self, session_id: str, session: SessionData, **fields) -> Optional[Dict[str, Any]]:
+        """Veri sürümünü artırır ve depoya yazar; depodaki önceki kaydı döndürür."""
+        record = self.backend.load(session_id) if self.backend.shared else None
+        current = record["data_version"] if record else session.data_version
+        session.data_version = max(current, session.data_version) + 1
+        self.backend.update(session_id, data_version=session.data_version, **fields)
+        return record
 
     def set_db_for_session(self, session_id: str, db_manager: DatabaseManager):
         """
         Oturuma bir veritabanı yöneticisi (Excel veya SQL) atar.
         Eğer önceki bir bağlantı varsa onu güvenli bir şekilde kapatır.
         """
-        if session_id in self._sessions:
-            session = self._sessions[session_id]
-            
-            # Eğer zaten açık bir bağlantı varsa, önce onu temizle (Resource Leak önleme)
-            if session.db_manager:
-                try:
-                    session.db_manager.dispose()
-                except Exception as e:
-                    print(f"Uyarı: Eski DB kapatılırken hata oluştu: {e}")
-            
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            old_manager = session.db_manager
             session.db_manager = db_manager
             session.last_accessed = datetime.now()
+            record = self._bump_data_version(session_id, session, data_source=db_manager.source)
 
-    def close_session(self, session_id: str):
+        # Eğer zaten açık bir bağlantı varsa, önce onu temizle (Resource Leak önleme)
+        if old_manager:
+            try:
+                old_manager.dispose()
+            except Exception as e:
+                print(f"Uyarı: Eski DB kapatılırken hata oluştu: {e}")
+
+        # Önceki yüklemenin dosyası artık kullanılmıyor (diğer worker'lar bir sonraki istekte yeni dosyayı açar)
+        old_source = record["data_source"] if record else (old_manager.source if old_manager else None)
+        if old_source != db_manager.source:
+            DatabaseManager.remove_source_files(old_source)
+
+    def mark_data_changed(self, session_id: str, previous_source: Optional[Dict[str, Any]] = None):
         """
-        Oturumu tamamen sonlandırır, DB bağlantısını keser ve listeden siler.
+        Mevcut veri kaynağına ekleme yapıldığında diğer worker'ların veriyi yenilemesini sağlar.
+        Ekleme yeni bir dosyaya yazıldıysa depodaki veri kaynağı da bu dosyaya çevrilir ve
+        önceki dosya silinir (diğer worker'lar bir sonraki istekte yeni dosyayı açar).
         """
-        if session_id in self._sessions:
-            session = self._sessions[session_id]
-            
-            # SQLAlchemy bağlantısını kapat
-            if session.db_manager:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.db_manager is None:
+                return
+            source = session.db_manager.source
+            record = self._bump_data_version(session_id, session, data_source=source)
+
+        old_source = record["data_source"] if record else previous_source
+        if old_source and old_source != source:
+            DatabaseManager.remove_source_files(old_source)
+
+    def append_history(self, session_id: str, entries: List[Dict[str, Any]]):
+        """
+        Yeni sohbet kayıtlarını geçmişe ekler; sadece son SESSION_HISTORY_LIMIT kayıt tutulur.
+        Ekleme depoda atomik yapılır: aynı oturuma farklı worker'larda aynı anda cevaplanan
+        sorular birbirinin kaydını ezmez.
+        """
+        history = self.backend.append_history(session_id, entries, settings.SESSION_HISTORY_LIMIT)
+        if history is None:
+            return
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.history = history
+
+    @staticmethod
+    def _dispose_local(session: Optional[SessionData]):
+        if session is None:
+            return
+        session.closed = True
+        if session.db_manager:
+            try:
                 session.db_manager.dispose()
-            
-            # Oturumu sözlükten sil
+            except Exception as e:
+                print(f"Uyarı: Oturum DB'si kapatılırken hata oluştu: {e}")
+
+    def _release_local(self, session_id: str) -> Optional[SessionData]:
+        """Oturumun bu süreçteki bağlantılarını kapatır; depodaki kayda dokunmaz."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        self._dispose_local(session)
+        return session
+
+    def close_session(self, session_id: str):
+        """
+        Oturumu tamamen sonlandırır, DB bağlantısını keser, kaydı ve veri dosyasını siler.
+        """
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        self._close(session_id, session)
+
+    def _close(self, session_id: str, session: Optional[SessionData]):
+        """Bu süreçten çıkarılmış oturumun kaydını, bağlantılarını ve veri dosyasını siler."""
+        record = self.backend.load(session_id) if self.backend.shared else None
+        self.backend.delete(session_id)
+        self._dispose_local(session)
+        if session is None and record is None:
+            return
+
+        if record is not None:
+            DatabaseManager.remove_source_files(record["data_source"])
+        elif session.db_manager:
+            DatabaseManager.remove_source_files(session.db_manager.source)
+        self.closed += 1
+
+    # --- Otomatik temizlik (Eviction) ---
+
+    def sweep(self) -> Dict[str, int]:
+        """
+        Boşta kalma süresi (TTL) dolan oturumları kapatır, ardından toplam bellek
+        bütçe üstündeyse en eski erişilen oturumlardan başlayarak çıkarır.
+        O anda bir istek işleyen (kilidi tutulan) oturumlara dokunulmaz.
+
+        Paylaşılan depoda süresi dolan kayıtlar depodan silinir; bellek bütçesi için
+        ise sadece bu süreçteki bağlantılar bırakılır (veri dosyada kalır, gerekirse
+        bir sonraki istekte yeniden açılır).
+        """
+        now = datetime.now()
+        idle_limit = now - timedelta(seconds=settings.SESSION_IDLE_TTL_SECONDS)
+        shared = self.backend.shared
+
+        expired = []
+        if shared:
+            for record in self.backend.purge_idle(idle_limit.timestamp()):
+                self._release_local(record["id"])
+                DatabaseManager.remove_source_files(record["data_source"])
+                expired.append(record["id"])
+            self._remove_orphan_files(idle_limit.timestamp())
+
+        with self._lock:
+            snapshot = list(self._sessions.items())  # LRU sırasında (en eski başta)
+
+        idle = [
+            session_id for session_id, session in snapshot
+            if session.last_accessed < idle_limit and not session.lock.locked()
+            and self._evict(session_id, session.last_accessed)
+        ]
+        self.evicted_idle += len(set(idle) | set(expired))
+
+        idle_set = set(idle) | set(expired)
+        remaining = [(sid, session) for sid, session in snapshot if sid not in idle_set]
+        footprints = {sid: session.memory_bytes() for sid, session in remaining}
+        total = sum(footprints.values())
+
+        over_budget = []
+        for session_id, session in remaining:
+            if total <= settings.SESSION_MEMORY_BUDGET_BYTES:
+                break
+            if session.lock.locked() or not self._evict(session_id, session.last_accessed):
+                continue
+            over_budget.append(session_id)
+            total -= footprints[session_id]
+            self.evicted_memory += 1
+
+        return {"idle": len(idle_set), "memory": len(over_budget)}
+
+    def _evict(self, session_id: str, seen_access: datetime) -> bool:
+        """
+        Oturumu süpürücünün gördüğü haliyle hâlâ boştaysa çıkarır. Anlık görüntü ile çıkarma
+        arasında bir istek oturumu almış (get_session last_accessed'ı yeniler) veya kilidini
+        almış olabilir; bu yüzden ikisi de çıkarmadan hemen önce self._lock altında yeniden
+        kontrol edilir. Paylaşılan depoda sadece bu süreçteki bağlantılar bırakılır.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.last_accessed != seen_access or session.lock.locked():
+                return False
             del self._sessions[session_id]
+        if self.backend.shared:
+            self._dispose_local(session)
+        else:
+            self._close(session_id, session)
+        return True
+
+    def _remove_orphan_files(self, before: float):
+        """
+        Kaydı artık depoda olmayan oturumların veri dosyalarını siler (Redis'te kayıtlar
+        TTL ile kendiliğinden silinir; çöken worker'lar da dosya bırakabilir).
+        """
+        try:
+            names = os.listdir(settings.SESSION_DATA_DIR)
+        except FileNotFoundError:
+            return
+        for name in names:
+            session_id, sep, rest = name.partition("__")
+            if not sep or not rest.endswith(tuple(f".{kind}" for kind in DatabaseManager.UPLOAD_ENGINES)):
+                continue
+            path = os.path.join(settings.SESSION_DATA_DIR, name)
+            try:
+                if os.path.getmtime(path) >= before:
+                    continue
+            except FileNotFoundError:
+                continue
+            if self.backend.load(session_id) is None:
+                DatabaseManager.remove_source_files({"kind": "file", "path": path})
+
+    def _sweep_loop(self):
+        while not self._stop_event.wait(settings.SESSION_SWEEP_INTERVAL_SECONDS):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Uyarı: Oturum temizliği sırasında hata oluştu: {e}")
+
+    def start_sweeper(self):
+        """Arka plan süpürücüsünü başlatır (uygulama açılışında çağrılır)."""
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        self._stop_event.clear()
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop_event.set()
+        if self._sweeper:
+            self._sweeper.join(timeout=5)
+            self._sweeper = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Bu süreçteki (worker) aktif oturum sayısı, toplam bellek kullanımı ve temizlik sayaçları.
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "backend": self.backend.name,
+            "worker_pid": os.getpid(),
+            "active_sessions": len(sessions),
+            "memory_bytes": sum(session.memory_bytes() for session in sessions),
+            "memory_budget_bytes": settings.SESSION_MEMORY_BUDGET_BYTES,
+            "idle_ttl_seconds": settings.SESSION_IDLE_TTL_SECONDS,
+            "evicted_idle": self.evicted_idle,
+            "evicted_memory": self.evicted_memory,
+            "closed": self.closed,
+            "hydrated": self.hydrated,
+        }
 
-# Singleton Instance (Uygulama boyunca tek bir yönetici olacak)
-session_store = SessionManager()
\ No newline at end of file
+# Singleton Instance (Her worker sürecinde tek bir yönetici olacak; kayıtlar SESSION_BACKEND'de paylaşılır)
+session_store = SessionManager()
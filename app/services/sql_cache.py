@@ -0,0 +1,138 @@
+# app/services/sql_cache.py
+import difflib
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+
+class QuestionSQLCache:
+    """
+    Soru -> SQL önbelleği. Aynı şemaya aynı soru (aynı sohbet bağlamıyla) tekrar
+    sorulduğunda LLM'e gitmeden daha önce üretilmiş SQL kullanılır.
+
+    Anahtar: normalize edilmiş soru + şema parmak izi + SQL lehçesi + geçmiş bağlamı.
+    Kayıtlar 'ttl_seconds' sonra geçersiz olur; 'max_entries' aşılınca en uzun süredir
+    kullanılmayanlar (LRU) atılır. 'similarity' 0'dan büyükse birebir eşleşme olmadığında
+    aynı şema/bağlamdaki en benzer soru (difflib oranı) bu eşiği geçerse kullanılır.
+    """
+
+    # Türkçe büyük harflerin doğru küçültülmesi için (str.lower 'I' -> 'i' yapar)
+    _TURKISH_LOWER = str.maketrans({"I": "ı", "İ": "i"})
+    _NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+
+    def __init__(self, max_entries: int, ttl_seconds: int, similarity: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        # {anahtar: (normalize soru, kapsam, SQL, kayıt zamanı)}
+        self._entries: "OrderedDict[str, Tuple[str, str, str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def normalize_question(cls, question: str) -> str:
+        """Büyük/küçük harf, noktalama ve boşluk farklarını yok sayar."""
+        text = question.translate(cls._TURKISH_LOWER).lower()
+        text = re.sub(r"[^\w\s.,]", " ", text)
+        text = re.sub(r"(?<!\d)[.,]|[.,](?!\d)", " ", text)  # Ondalık ayırıcılar kalsın
+        return " ".join(text.split())
+
+    @staticmethod
+    def context_key(history: List[Dict[str, Any]]) -> str:
+        """Prompt'a eklenen son 3 soru/SQL çiftinden bağlam özeti üretir."""
+        recent = [(item.get("q"), item.get("sql")) for item in history[-3:]]
+        return hashlib.sha1(repr(recent).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _scope(fingerprint: str, dialect: Optional[str], context: str) -> str:
+        return f"{fingerprint}|{dialect}|{context}"
+
+    def get(self, question: str, fingerprint: str, dialect: Optional[str], context: str) -> Optional[Tuple[str, bool]]:
+        """
+        Önbellekteki SQL'i döndürür: (sql, yakın eşleşme mi). Bulunamazsa None.
+        """
+        normalized = self.normalize_question(question)
+        scope = self._scope(fingerprint, dialect, context)
+        key = f"{scope}|{normalized}"
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[3] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2], False
+
+            if self.similarity > 0:
+                match = self._closest(normalized, scope, now)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.near_hits += 1
+                    return self._entries[match][2], True
+
+            self.misses += 1
+            return None
+
+    def _closest(self, normalized: str, scope: str, now: float) -> Optional[str]:
+        """
+        Aynı kapsamdaki en benzer soruyu bulur. Sorudaki sayılar (yıl, adet, limit)
+        farklıysa SQL de farklı olacağından benzerliğe bakılmaz.
+        """
+        numbers = self._NUMBER.findall(normalized)
+        best_key, best_ratio = None, self.similarity
+        for key, (question, entry_scope, _, created_at) in self._entries.items():
+            if entry_scope != scope or now - created_at > self.ttl_seconds:
+                continue
+            if self._NUMBER.findall(question) != numbers:
+                continue
+            ratio = difflib.SequenceMatcher(None, normalized, question).ratio()
+            if ratio >= best_ratio:
+                best_key, best_ratio = key, ratio
+        return best_key
+
+    def put(self, question: str, fingerprint: str, dialect: Optional[str], context: str, sql: str):
+        normalized = self.normalize_question(question)
+        scope = self._scope(fingerprint, dialect, context)
+        key = f"{scope}|{normalized}"
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (normalized, scope, sql, time.time())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, fingerprint: str, dialect: Optional[str], context: str, sql: str):
+        """Çalışmayan bir SQL'i (ve ona yönlendiren yakın eşleşmeleri) önbellekten atar."""
+        scope = self._scope(fingerprint, dialect, context)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[1] == scope and entry[2] == sql]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity": self.similarity,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+            }
+
+
+# Singleton Instance (Aynı şemaya soru soran tüm oturumlar önbelleği paylaşır)
+sql_cache = QuestionSQLCache(settings.SQL_CACHE_MAX_ENTRIES, settings.SQL_CACHE_TTL_SECONDS, settings.SQL_CACHE_SIMILARITY)
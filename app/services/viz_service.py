@@ -1,50 +1,180 @@
-import pandas as pd
-from typing import List, Dict, Any, Union
+import datetime
+import warnings
+import numpy as np
+from typing import List, Dict, Any, Optional, Union
+from app.core.config import settings
+from app.services.columnar import ColumnarResult
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: sıralı (x, y) serisinden görsel şekli koruyan
+    'threshold' noktanın indekslerini seçer. İlk ve son nokta her zaman korunur;
+    aradaki her kovadan, önceki seçilen nokta ve sonraki kovanın ortalamasıyla en
+    büyük üçgeni oluşturan nokta alınır (tepe ve dipler kaybolmaz).
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = x - x[0]  # Büyük zaman damgalarında alan hesabının hassasiyeti için
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[selected] - avg_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (avg_y - y[selected])
+        )
+        selected = start + int(area.argmax())
+        indices[bucket + 1] = selected
+    return indices
+
+
+def top_n(labels: List[Any], values: List[float], limit: int, other_label: str = "Diğer") -> List[tuple]:
+    """
+    Değerleri etikete göre toplar. Etiket sayısı 'limit'i aşarsa en büyük limit-1 etiket
+    kalır, geri kalanların toplamı tek bir 'Diğer' diliminde gösterilir.
+    Sınır aşılmazsa sorgunun sırası korunur.
+    """
+    totals: Dict[Any, float] = {}
+    for label, value in zip(labels, values):
+        totals[label] = totals.get(label, 0.0) + value
+    if len(totals) <= limit:
+        return list(totals.items())
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    kept = ranked[:limit - 1]
+    kept.append((other_label, sum(value for _, value in ranked[limit - 1:])))
+    return kept
+
+
+def histogram(values: np.ndarray, bins: int) -> List[Dict[str, Any]]:
+    """Sayısal seriyi eşit genişlikte aralıklara böler: [{bin, bin_start, bin_end, count}]"""
+    counts, edges = np.histogram(values, bins=bins)
+    return [
+        {"bin": f"{start:g} – {end:g}", "bin_start": float(start), "bin_end": float(end), "count": int(count)}
+        for count, start, end in zip(counts, edges[:-1], edges[1:])
+    ]
+
 
 class VisualizationService:
+    # İstemcinin isteyebileceği en fazla grafik noktası (viewport genişliği)
+    MAX_POINTS_LIMIT = 5000
+
+    # Pasta grafikte okunabilir en fazla dilim
+    PIE_MAX_SLICES = 7
+
     @staticmethod
-    def suggest_chart(data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _looks_like_date(column: list) -> bool:
+        """Metin kolonunun ilk 10 dolu değeri tarih olarak okunabiliyor mu? (Hız için)"""
+        sample = [value for value in column[:50] if value is not None][:10]
+        if not sample:
+            return False
+        # pandas sadece tarih ayrıştırmada gerekir; açılışta yüklenmesin diye burada içe aktarılır
+        import pandas as pd
+
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                return bool(pd.to_datetime(pd.Series(sample), errors='coerce').notna().all())
+        except Exception:
+            return False
+
+    @classmethod
+    def column_kinds(cls, table: ColumnarResult, hints: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, str]:
+        """
+        Kolonları 'number', 'date' veya 'category' olarak sınıflar (tamamen NULL kolonlar
+        atlanır). Sürücünün döndürdüğü değer tiplerinden (ColumnarResult.types) çıkarılır;
+        DataFrame kurulmaz. Metin kolonlarının türü yüklemede çıkarılan istatistiklerden
+        ('hints', bkz. DatabaseManager.column_hints) okunur, yoksa küçük bir örnekle tarih aranır.
+        """
+        hints = hints or {}
+        kinds = {}
+        for name, kind, column in zip(table.columns, table.types, table.values):
+            if kind in ("int", "float"):
+                kinds[name] = "number"
+            elif kind in ("date", "datetime"):
+                kinds[name] = "date"
+            elif kind == "string" and name in hints:
+                kinds[name] = "date" if hints[name]["kind"] == "date" else "category"
+            elif kind == "string":
+                kinds[name] = "date" if cls._looks_like_date(column) else "category"
+            elif kind == "bool":
+                kinds[name] = "category"
+        return kinds
+
+    @classmethod
+    def _distinct(cls, column: list, hint: Optional[Dict[str, Any]]) -> int:
+        """
+        Kolondaki farklı (NULL olmayan) değer sayısı. Tablodaki farklı değer sayısı pasta
+        sınırının altındaysa sonuç da en fazla o kadardır; sadece tek değerli mi diye bakılır.
+        """
+        if hint is not None and hint["distinct_count"] <= cls.PIE_MAX_SLICES:
+            values = [value for value in column if value is not None]
+            return min(hint["distinct_count"], 2) if any(value != values[0] for value in values) else len(values[:1])
+        return len(set(column) - {None})
+
+    @classmethod
+    def _points(cls, max_points: Optional[int]) -> int:
+        return max(3, min(max_points or settings.CHART_MAX_POINTS, cls.MAX_POINTS_LIMIT))
+
+    @classmethod
+    def suggest_chart(
+        cls,
+        data: Union[ColumnarResult, List[Dict[str, Any]], None],
+        max_points: Optional[int] = None,
+        hints: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
         """
         Verilen veri setini analiz eder ve Frontend için en uygun grafik türünü önerir.
-        
+        Kolon tabanlı sonuç (ColumnarResult) satır dict'lerine çevrilmeden kullanılır.
+        Öneriye çizime hazır seri ('data') eklenir; seri en fazla 'max_points' noktadır
+        (varsayılan CHART_MAX_POINTS; istemcinin grafik genişliğine göre verilebilir).
+        'hints': sonuç kolonlarının tablo istatistikleri (tür ve farklı değer sayısı).
+
         Döndürdüğü format:
         {
-            "type":Str ("bar", "line", "pie", "table"),
+            "type":Str ("bar", "line", "pie", "histogram", "table"),
             "x_key": Str (Grafik ekseni için kolon adı),
             "y_key": Str (Değerler için kolon adı),
             "title": Str (Otomatik başlık önerisi),
-            "explanation": Str (Neden bu grafiğin seçildiği)
+            "explanation": Str (Neden bu grafiğin seçildiği),
+            "data": List (Çizime hazır seri),
+            "series": Dict (method: lttb | top_n | histogram | null, source_rows, points)
         }
         """
-        
+
         # 1. Veri Yoksa veya Boşsa -> Tablo
-        if not data or len(data) == 0:
+        if data is None or (data.count if isinstance(data, ColumnarResult) else len(data)) == 0:
             return {"type": "table", "explanation": "Veri yok."}
 
         try:
-            df = pd.DataFrame(data)
+            table = data if isinstance(data, ColumnarResult) else ColumnarResult.from_records(data)
+            kinds = cls.column_kinds(table, hints)
         except Exception:
             return {"type": "table", "explanation": "Veri yapısı bozuk."}
 
-        # Sütun tiplerini ayır
-        num_cols = df.select_dtypes(include=['number']).columns.tolist()
-        # Object (String) ve Category tiplerini al
-        cat_cols = df.select_dtypes(include=['object', 'category', 'bool']).columns.tolist()
-        
-        # Tarih tespiti (Pandas bazen tarihleri 'object' olarak görür, kontrol edelim)
-        date_cols = []
-        for col in cat_cols:
-            try:
-                # İlk 10 satıra bakarak tarih mi diye kontrol et (Hız için)
-                if pd.to_datetime(df[col].dropna().head(10), errors='coerce').notna().all():
-                    date_cols.append(col)
-            except:
-                pass
-        
-        # Tarih olarak tespit edilenleri kategorik listeden çıkar (Çakışmayı önle)
-        cat_cols = [c for c in cat_cols if c not in date_cols]
-
-        row_count = len(df)
+        # Sütun tiplerini ayır (tarihler kategorik listeye girmez, çakışma olmaz)
+        num_cols = [name for name, kind in kinds.items() if kind == "number"]
+        cat_cols = [name for name, kind in kinds.items() if kind == "category"]
+        date_cols = [name for name, kind in kinds.items() if kind == "date"]
+
+        suggestion = cls._choose(table, num_cols, cat_cols, date_cols, hints or {})
+        if suggestion["type"] != "table":
+            cls.attach_series(suggestion, table, max_points)
+        return suggestion
+
+    @classmethod
+    def _choose(
+        cls, table: ColumnarResult, num_cols: List[str], cat_cols: List[str], date_cols: List[str],
+        hints: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        column = dict(zip(table.columns, table.values))
 
         # --- HEURISTICS (KARAR MEKANİZMASI) ---
 
@@ -64,8 +194,9 @@ class VisualizationService:
         # Kural: 1 Kategorik + 1 Sayısal kolon var VE kategori sayısı az (<= 7).
         # Parça-Bütün ilişkisi için idealdir. Çok fazla dilim olursa okunmaz.
         if len(cat_cols) >= 1 and len(num_cols) >= 1:
-            unique_vals = df[cat_cols[0]].nunique()
-            if 1 < unique_vals <= 7 and (df[num_cols[0]] > 0).all():
+            unique_vals = cls._distinct(column[cat_cols[0]], hints.get(cat_cols[0]))
+            values = column[num_cols[0]]
+            if 1 < unique_vals <= cls.PIE_MAX_SLICES and all(value is not None and value > 0 for value in values):
                 return {
                     "type": "pie",
                     "label_key": cat_cols[0],
@@ -85,10 +216,10 @@ class VisualizationService:
                 "title": f"{cat_cols[0]} ve {num_cols[0]} Karşılaştırması",
                 "explanation": "Kategorik verileri karşılaştırmak için Çubuk Grafik seçildi."
             }
-            
+
         # SENARYO 4: Sadece Sayısal Veri (Bar Chart varsayımı)
         # Örn: Sadece "Yıl" ve "Satış" var ama Yıl sayısal görünüyor.
-        if len(num_cols) >= 2:
+        if len(num_cols) >= 2 and len(set(column[num_cols[0]])) <= settings.CHART_MAX_CATEGORIES:
              return {
                 "type": "bar",
                 "x_key": num_cols[0], # İlk sayıyı x ekseni varsayıyoruz (Genellikle ID veya Yıl olur)
@@ -97,8 +228,92 @@ class VisualizationService:
                 "explanation": "İki sayısal veri seti bulundu."
             }
 
+        # SENARYO 5: Geniş Sayısal Seri (Histogram)
+        # Kural: x ekseni çubuklara sığmayacak kadar çok farklı değer içeriyor (örn. ID)
+        # veya tek bir sayısal kolon var; tek tek çubuk yerine değerlerin dağılımı gösterilir.
+        if num_cols and table.count > settings.CHART_MAX_CATEGORIES:
+            target = num_cols[1] if len(num_cols) >= 2 else num_cols[0]
+            return {
+                "type": "histogram",
+                "x_key": "bin",
+                "y_key": "count",
+                "value_key": target,
+                "title": f"{target} Dağılımı",
+                "explanation": "Çok sayıda sayısal değer olduğu için Histogram seçildi."
+            }
+
         # HİÇBİR KALIB UYMAZSA -> TABLO
         return {
             "type": "table",
             "explanation": "Veri yapısı görselleştirme için belirgin bir desen içermiyor."
-        }
\ No newline at end of file
+        }
+
+    @classmethod
+    def attach_series(cls, suggestion: Dict[str, Any], source: ColumnarResult, max_points: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Öneriye 'source' sonucundan çizime hazır seriyi ekler (önceki seri varsa değiştirilir):
+            line: x'e göre sıralanır, 'max_points'i aşarsa LTTB ile seyreltilir
+            bar/pie: etikete göre toplanır, fazla kategoriler "Diğer"de birleşir
+            histogram: değerler CHART_HISTOGRAM_BINS aralığa bölünür
+        """
+        column = dict(zip(source.columns, source.values))
+        points = cls._points(max_points)
+        kind = suggestion["type"]
+        method = None
+
+        if kind == "line":
+            import pandas as pd
+
+            x_key, y_key = suggestion["x_key"], suggestion["y_key"]
+            x_values, y_values = column[x_key], column[y_key]
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                stamps = pd.to_datetime(pd.Series(x_values, dtype=object), errors='coerce')
+            keep = (stamps.notna() & pd.Series([value is not None for value in y_values])).to_numpy()
+            order = np.flatnonzero(keep)
+            order = order[np.argsort(stamps.to_numpy()[order], kind="stable")]
+            x = stamps.to_numpy()[order].astype("datetime64[ns]").astype(np.int64).astype(float)
+            y = np.array([float(y_values[idx]) for idx in order], dtype=float)
+            if len(order) > points:
+                order = order[lttb(x, y, points)]
+                method = "lttb"
+            data = [
+                {x_key: cls._label(x_values[idx]), y_key: float(y_values[idx])}
+                for idx in order
+            ]
+
+        elif kind in ("bar", "pie"):
+            label_key = suggestion.get("x_key") or suggestion["label_key"]
+            value_key = suggestion.get("y_key") or suggestion["value_key"]
+            labels, values = [], []
+            for label, value in zip(column[label_key], column[value_key]):
+                if value is not None:
+                    labels.append(cls._label(label))
+                    values.append(float(value))
+            limit = min(cls.PIE_MAX_SLICES if kind == "pie" else settings.CHART_MAX_CATEGORIES, points)
+            pairs = top_n(labels, values, limit)
+            if len(set(labels)) > limit:
+                method = "top_n"
+            data = [{label_key: label, value_key: value} for label, value in pairs]
+
+        elif kind == "histogram":
+            values = np.array([float(value) for value in column[suggestion["value_key"]] if value is not None], dtype=float)
+            values = values[np.isfinite(values)]
+            data = histogram(values, min(settings.CHART_HISTOGRAM_BINS, points)) if len(values) else []
+            method = "histogram"
+
+        else:
+            return suggestion
+
+        suggestion["data"] = data
+        suggestion["series"] = {"method": method, "source_rows": source.count, "points": len(data)}
+        return suggestion
+
+    @staticmethod
+    def _label(value: Any) -> Any:
+        """Eksen etiketi: tarihler ISO metin, NULL '(boş)'; diğerleri olduğu gibi."""
+        if value is None:
+            return "(boş)"
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        return value
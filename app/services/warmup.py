@@ -0,0 +1,53 @@
+import logging
+import time
+from typing import Dict
+
+from app.core.metrics import metrics
+from app.services.db_service import DatabaseManager
+from app.services.llm_service import SQLAgentService
+from app.services.security import SQLValidator
+
+logger = logging.getLogger(__name__)
+
+WARMUP_SECONDS = metrics.gauge(
+    "datachat_warmup_seconds", "Açılıştaki ısınma adımlarının süresi (llm, sql, dataframe)", labels=("step",)
+)
+
+# Her lehçede ayrıştırılan örnek sorgu (sqlglot lehçe modüllerini ve tokenizer'ını ilk kullanımda kurar)
+WARMUP_SQL = "SELECT a, COUNT(*) AS n FROM t WHERE b > 1 GROUP BY a ORDER BY n DESC"
+
+
+def _warm_sql():
+    for dialect in sorted(set(DatabaseManager.SQLGLOT_DIALECTS.values())):
+        SQLValidator.validate_and_fix(WARMUP_SQL, dialect=dialect)
+
+
+def _warm_dataframe():
+    # Dosya yükleme, kolon istatistikleri ve grafik önerisindeki tarih ayrıştırma pandas'ı kullanır
+    import pandas as pd
+
+    pd.to_datetime(pd.Series(["2025-01-01", "2025-02-01"]), errors="coerce")
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Ağır bağımlılıklar açılışta içe aktarılmaz, kullanıldıkları yolda yüklenir. Bu fonksiyon
+    (WARMUP_ON_STARTUP) açılıştan hemen sonra arka planda ilk isteğin ödeyeceği tek seferlik
+    maliyetleri öder:
+        llm: autogen'i yükler ve LLM istemcisini kurar
+        sql: sqlglot lehçelerini yükleyip örnek bir sorguyu doğrular
+        dataframe: pandas'ı yükler
+    Başarısız adım atlanır, uygulamayı durdurmaz. Döner: {adım: saniye}
+    """
+    timings = {}
+    for step, func in (("llm", SQLAgentService.warm_up), ("sql", _warm_sql), ("dataframe", _warm_dataframe)):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            print(f"Uyarı: Isınma adımı atlandı ({step}): {e}")
+            continue
+        timings[step] = round(time.perf_counter() - start, 3)
+        WARMUP_SECONDS.set(timings[step], step=step)
+    logger.info("Isınma tamamlandı: %s", timings)
+    return timings
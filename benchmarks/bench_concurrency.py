@@ -0,0 +1,100 @@
+"""
+/chat için eşzamanlı yük testi: engelleyici işlerin thread havuzunda çalışmasının
+(blocking_pool) event loop içinde çalışmaya göre kazancını ölçer.
+
+Kullanım:
+    python -m benchmarks.bench_concurrency --sessions 8 --requests 64 --llm-latency 0.5
+
+Groq çağrısı yerine, SQLAgentService.process_request 'llm-latency' saniye bekleyip
+(time.sleep, yani gerçek LLM çağrısı gibi engelleyici) SQL'i çalıştıran bir sürümle
+değiştirilir. İki mod karşılaştırılır:
+    inline: İşler eski davranıştaki gibi doğrudan event loop'ta çalışır.
+    pool:   İşler blocking_pool üzerinden thread havuzunda çalışır.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from app.core.concurrency import blocking_pool
+from app.main import app
+from app.services.llm_service import SQLAgentService
+from benchmarks.bench_upload_engines import make_csv
+
+
+def fake_process_request(latency: float):
+    def process_request(self, user_question: str):
+        time.sleep(latency)  # LLM gidiş-dönüşü
+        result = self.db_manager.execute_safe_query(
+            "SELECT region, SUM(amount) AS total FROM sales GROUP BY region", use_cache=False
+        )
+        return {"sql": "...", "result": result, "visualization": {"type": "table"}}
+    return process_request
+
+
+async def run_inline(func, *args, reject_when_busy=True, **kwargs):
+    return func(*args, **kwargs)
+
+
+async def run_scenario(sessions: int, requests: int, rows: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        content = make_csv(rows)
+        headers = []
+        for _ in range(sessions):
+            session_id = (await client.post("/session/start")).json()["session_id"]
+            header = {"X-Session-ID": session_id}
+            await client.post("/upload/file", files={"file": ("sales.csv", content)}, headers=header)
+            headers.append(header)
+
+        latencies = []
+
+        async def ask(i: int):
+            start = time.perf_counter()
+            response = await client.post("/chat", json={"question": f"soru {i}"}, headers=headers[i % sessions])
+            latencies.append(time.perf_counter() - start)
+            return response.status_code
+
+        start = time.perf_counter()
+        codes = await asyncio.gather(*(ask(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+        for header in headers:
+            await client.delete("/session/end", headers=header)
+
+    return {
+        "elapsed": elapsed,
+        "throughput": requests / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": sorted(latencies)[int(len(latencies) * 0.95) - 1],
+        "rejected": sum(1 for code in codes if code == 503),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--rows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    SQLAgentService.process_request = fake_process_request(args.llm_latency)
+    pooled_run = blocking_pool.run
+
+    results = {}
+    for mode in ("inline", "pool"):
+        blocking_pool.run = run_inline if mode == "inline" else pooled_run
+        results[mode] = asyncio.run(run_scenario(args.sessions, args.requests, args.rows))
+
+    print(f"{args.requests} istek, {args.sessions} oturum, LLM gecikmesi {args.llm_latency}s, "
+          f"havuz {blocking_pool.max_workers} thread")
+    print(f"{'mod':<8}{'süre':>10}{'istek/sn':>12}{'p50':>10}{'p95':>10}{'503':>6}")
+    for mode, r in results.items():
+        print(f"{mode:<8}{r['elapsed']:>9.2f}s{r['throughput']:>12.2f}{r['p50']:>9.2f}s{r['p95']:>9.2f}s{r['rejected']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Sorgu sonucu formatlarını karşılaştırır: satır tabanlı JSON (eski format),
+kolon tabanlı JSON ve Arrow IPC.
+
+Kullanım:
+    python -m benchmarks.bench_result_format --rows 100,10000,100000
+
+Sentetik satış tablosundan sorgu çalıştırılır; her format için sonucun
+oluşturulması + serileştirilmesi (medyan süre) ve yanıt boyutu yazdırılır.
+"rows(dict)" ölçümü eski execute_safe_query yolunu (satır başına dict) temsil eder.
+"""
+import argparse
+import json
+import statistics
+import time
+
+from app.services.columnar import ColumnarResult
+from app.services.db_service import DatabaseManager
+from benchmarks.bench_upload_engines import make_csv
+
+SQL = "SELECT * FROM sales LIMIT {rows}"
+
+
+def dumps(payload) -> bytes:
+    # FastAPI'nin JSONResponse'u gibi (ensure_ascii=False, ayırıcılar sıkıştırılmış)
+    return json.dumps(payload, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def measure(func, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="100,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--engine", default="sqlite")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.rows.split(",")]
+    manager, _ = DatabaseManager.from_file(make_csv(max(sizes)), "sales.csv", engine=args.engine)
+
+    print(f"{'satır':>8} {'format':<16} {'süre':>10} {'boyut':>12}")
+    for rows in sizes:
+        with manager.engine.connect() as conn:
+            result = conn.exec_driver_sql(SQL.format(rows=rows))
+            keys, fetched = list(result.keys()), result.fetchall()
+
+        def rows_json():
+            return dumps({"data": [dict(zip(keys, row)) for row in fetched], "count": len(fetched)})
+
+        def columnar_json():
+            return dumps(ColumnarResult.from_rows(keys, fetched).to_json())
+
+        def arrow_ipc():
+            return ColumnarResult.from_rows(keys, fetched).to_ipc()
+
+        for name, func in (("rows(dict)", rows_json), ("columnar+json", columnar_json), ("arrow", arrow_ipc)):
+            elapsed, size = measure(func, args.repeat)
+            print(f"{rows:>8} {name:<16} {elapsed * 1000:>8.1f}ms {size / 1024:>10.1f}KB")
+    manager.dispose()
+
+
+if __name__ == "__main__":
+    main()
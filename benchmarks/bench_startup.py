@@ -0,0 +1,206 @@
+"""
+Soğuk açılış (cold start) ölçümü: her ölçüm ayrı, taze bir Python sürecinde yapılır
+(modül önbelleği ve ilk kullanım maliyetleri her seferinde baştan ödenir).
+
+Kullanım:
+    python -m benchmarks.bench_startup --repeat 5
+    python -m benchmarks.bench_startup --output benchmarks/baselines/startup.json
+    python -m benchmarks.bench_startup --baseline benchmarks/baselines/startup.json
+
+Metrikler (tekrarların medyanı, saniye):
+    startup.import:        'import app.main'
+    startup.lifespan:      uygulamanın istek kabul etmeye hazır olması (lifespan açılışı)
+    startup.warmup:        arka plan ısınmasının (WARMUP_ON_STARTUP) bitmesi
+    cold.first_upload / cold.first_chat:  ısınma kapalıyken açılıştan sonraki ilk istekler
+    warm.first_upload / warm.first_chat:  ısınma bittikten sonraki ilk istekler
+    warm.second_chat:      aynı süreçte ikinci /chat (ilk kullanım maliyeti olmayan durum)
+
+LLM olarak sahte istemci (benchmarks.fake_llm) kullanılır; API anahtarı gerekmez.
+Ayrıca 'python -X importtime' çıktısından açılışta en uzun süren içe aktarmalar listelenir.
+--baseline ile karşılaştırma bench_suite'teki gibidir (kötüleşmede çıkış kodu 1).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+RESULT_PREFIX = "BENCH_STARTUP_RESULT "
+
+SCRIPT = [
+    {"pattern": r"^bölge toplamı (?P<n>\d+)", "responses": [
+        "SELECT region, SUM(amount) AS total FROM sales WHERE amount > {n} GROUP BY region ORDER BY total DESC",
+    ]},
+]
+
+
+def child_import() -> dict:
+    start = time.perf_counter()
+    import app.main  # noqa: F401
+
+    return {"startup.import": time.perf_counter() - start}
+
+
+def child_requests(warmup: bool, rows: int, llm_latency: float) -> dict:
+    """Açılıştan sonraki ilk yükleme ve sohbet isteklerini ölçer (ortam değişkenleri çağıran süreçte ayarlanır)."""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from benchmarks.bench_upload_engines import make_csv
+    from benchmarks.fake_llm import ScriptedLLMClient
+
+    ScriptedLLMClient.configure(SCRIPT, latency=llm_latency)
+    content = make_csv(rows)
+    prefix = "warm" if warmup else "cold"
+    results = {}
+
+    start = time.perf_counter()
+    with TestClient(app) as client:
+        results["startup.lifespan"] = time.perf_counter() - start
+        if warmup:
+            while not app.state.warmup.done():
+                time.sleep(0.01)
+            results["startup.warmup"] = time.perf_counter() - start
+
+        headers = {"X-Session-ID": client.post("/session/start").json()["session_id"]}
+        start = time.perf_counter()
+        response = client.post("/upload/file", files={"file": ("sales.csv", content)}, headers=headers)
+        results[f"{prefix}.first_upload"] = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f"Yükleme başarısız: {response.text[:300]}")
+
+        for index, name in enumerate(("first_chat", "second_chat")):
+            start = time.perf_counter()
+            response = client.post("/chat", json={"question": f"bölge toplamı {index}"}, headers=headers)
+            results[f"{prefix}.{name}"] = time.perf_counter() - start
+            if response.status_code != 200 or "error" in response.json():
+                raise RuntimeError(f"/chat başarısız: {response.text[:300]}")
+    # Isınma açıkken ikinci sohbet ile aynı (sıcak) durumdadır; tek metrik olarak raporlanır
+    results.pop("cold.second_chat", None)
+    return results
+
+
+def run_child(mode: str, env: dict, args) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.bench_startup", "--child", mode,
+        "--rows", str(args.rows), "--llm-latency", str(args.llm_latency),
+    ]
+    completed = subprocess.run(
+        command, env={**os.environ, **env}, capture_output=True, text=True, encoding="utf-8",
+    )
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"Ölçüm süreci başarısız ({mode}):\n{completed.stderr[-2000:]}")
+
+
+def slowest_imports(limit: int) -> list:
+    """'python -X importtime -c "import app.main"' çıktısından en uzun süren üst seviye paketler."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"], capture_output=True, text=True, encoding="utf-8",
+    )
+    totals = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            cumulative = int(cumulative)
+        except ValueError:
+            continue
+        package = name.strip().split(".")[0]
+        # Her paketin en dıştaki (kümülatif en büyük) kaydı alınır
+        totals[package] = max(totals.get(package, 0), cumulative)
+    totals.pop("app", None)
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [[package, round(micros / 1e6, 3)] for package, micros in ranked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=10_000, help="İlk yüklemedeki CSV satır sayısı")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Sahte LLM çağrısı başına gecikme (s)")
+    parser.add_argument("--output", help="Sonuçların yazılacağı JSON dosyası")
+    parser.add_argument("--baseline", help="Karşılaştırılacak temel çizgi JSON dosyası")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="İzin verilen kötüleşme oranı")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="Bundan küçük süre farkları (s) gürültü sayılır")
+    parser.add_argument("--child", choices=["import", "requests"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        if args.child == "import":
+            result = child_import()
+        else:
+            warmup = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+            result = child_requests(warmup, args.rows, args.llm_latency)
+        print(RESULT_PREFIX + json.dumps(result))
+        return
+
+    # bench_suite autogen'i içe aktarır; alt süreçlerin ölçümünü etkilemesin diye sadece burada yüklenir
+    from benchmarks.bench_suite import Recorder, compare, git_commit
+
+    env = {"LLM_CLIENT": "benchmarks.fake_llm:ScriptedLLMClient"}
+    samples = {}
+    for index in range(args.repeat):
+        print(f"tekrar {index + 1}/{args.repeat}")
+        runs = (
+            ("import", env),
+            ("requests", {**env, "WARMUP_ON_STARTUP": "false"}),
+            ("requests", {**env, "WARMUP_ON_STARTUP": "true"}),
+        )
+        for mode, run_env in runs:
+            for name, value in run_child(mode, run_env, args).items():
+                # Açılış (lifespan) süresi ısınma kapalıyken ölçülür; açıkken de ısınma arka planda olduğu için aynıdır
+                if name == "startup.lifespan" and run_env.get("WARMUP_ON_STARTUP") == "true":
+                    continue
+                samples.setdefault(name, []).append(value)
+
+    print("\nsonuçlar (medyan)")
+    recorder = Recorder()
+    for name in sorted(samples):
+        recorder.add(name, statistics.median(samples[name]), samples=len(samples[name]))
+
+    imports = slowest_imports(10)
+    print("\nen uzun süren içe aktarmalar ('import app.main', kümülatif)")
+    for package, seconds in imports:
+        print(f"  {package:<40}{seconds * 1000:>12.1f}ms")
+
+    report = {
+        "meta": {
+            "benchmark": "startup",
+            "repeat": args.repeat,
+            "rows": args.rows,
+            "llm_latency": args.llm_latency,
+            "slowest_imports": imports,
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "metrics": recorder.metrics,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2, ensure_ascii=False, sort_keys=True)
+            handle.write("\n")
+        print(f"\nSonuçlar yazıldı: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        regressions = compare(recorder.metrics, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print(f"\n{len(regressions)} metrik temel çizgiye göre kötüleşti.")
+            sys.exit(1)
+        print("\nKötüleşme yok.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Uçtan uca ölçüm paketi: API anahtarı olmadan, deterministik sahte LLM ile
+(benchmarks.fake_llm) tüm ana yolları ölçer ve sonuçları makine tarafından
+okunabilir bir temel çizgi (baseline) JSON'u olarak yazar.
+
+Kullanım:
+    python -m benchmarks.bench_suite --profile quick --output benchmarks/baselines/quick.json
+    python -m benchmarks.bench_suite --profile quick --baseline benchmarks/baselines/quick.json
+
+Senaryolar (istekler httpx.ASGITransport ile doğrudan uygulamaya gider):
+    ingest:     /upload/file, her boyut ve biçim (CSV/XLSX) için
+    schema:     get_schema_info, önbelleksiz (/schema/refresh) ve önbellekten
+    chat:       /chat uçtan uca: ilk denemede doğru SQL, bir yeniden deneme (hatalı kolon)
+                ve aynı sorunun tekrarında soru -> SQL önbelleğinden cevap
+    export:     /export/result (CSV ve Excel), tablonun tamamı
+    concurrent: birden çok oturumdan eşzamanlı /chat istekleri (throughput, p50/p95, 503)
+
+--baseline verilirse her metrik temel çizgiyle karşılaştırılır; 'tolerance' oranından
+(ve gürültü için 'min-delta' saniyeden) fazla kötüleşen metrikler listelenir ve
+komut 1 koduyla çıkar. Süreler saniye, throughput istek/saniyedir.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+from autogen.io import IOStream
+
+from app.core.config import settings
+from benchmarks.datasets import XLSX_MAX_ROWS, dataset
+from benchmarks.fake_llm import ScriptedLLMClient
+
+PROFILES = {
+    "quick": {
+        "sizes": [10_000, 100_000], "formats": ["csv", "xlsx"], "xlsx_max_rows": 10_000,
+        "work_rows": 100_000, "chat_requests": 10, "sessions": 4, "concurrent_requests": 32, "repeat": 3,
+    },
+    "full": {
+        "sizes": [10_000, 100_000, 1_000_000, 10_000_000], "formats": ["csv", "xlsx"], "xlsx_max_rows": 1_000_000,
+        "work_rows": 1_000_000, "chat_requests": 20, "sessions": 8, "concurrent_requests": 128, "repeat": 3,
+    },
+}
+
+GOOD_SQL = (
+    "SELECT region, SUM(amount) AS total FROM sales WHERE amount > {n} "
+    "GROUP BY region ORDER BY total DESC"
+)
+
+# Soru kalıbı -> sırayla cevaplar (ilk deneme, düzeltmeler); {n} sorudaki sayıdır
+SCRIPT = [
+    {"pattern": r"^bölge toplamı (?P<n>\d+)", "responses": [GOOD_SQL]},
+    {"pattern": r"^hatalı kolon (?P<n>\d+)", "responses": [
+        "SELECT regin, SUM(amount) AS total FROM sales WHERE amount > {n} GROUP BY regin",
+        GOOD_SQL,
+    ]},
+    {"pattern": r"^aylık (?P<n>\d+)", "responses": [
+        "SELECT substr(order_date, 1, 7) AS month, COUNT(*) AS orders FROM sales "
+        "WHERE amount > {n} GROUP BY month ORDER BY month",
+    ]},
+]
+
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, int(round(fraction * len(ordered))) - 1))]
+
+
+class SilentIOStream:
+    """autogen'in konuşma dökümünü (her LLM mesajı stdout'a yazılır) ölçüm çıktısından gizler."""
+
+    def print(self, *objects, sep: str = " ", end: str = "\n", flush: bool = False):
+        pass
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        return ""
+
+
+class Recorder:
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name: str, value: float, unit: str = "s", better: str = "lower", **extra):
+        self.metrics[name] = {"value": round(value, 6), "unit": unit, "better": better, **extra}
+        shown = f"{value * 1000:.1f}ms" if unit == "s" else f"{value:.2f} {unit}"
+        print(f"  {name:<40}{shown:>14}")
+
+    def timings(self, name: str, samples, **extra):
+        self.add(f"{name}.p50", statistics.median(samples), **extra)
+        self.add(f"{name}.p95", percentile(samples, 0.95), **extra)
+
+
+async def start_session(client: httpx.AsyncClient) -> dict:
+    response = await client.post("/session/start")
+    return {"X-Session-ID": response.json()["session_id"]}
+
+
+async def upload(client: httpx.AsyncClient, headers: dict, path: str, engine: str):
+    with open(path, "rb") as handle:
+        response = await client.post(
+            "/upload/file", files={"file": ("sales" + os.path.splitext(path)[1], handle)},
+            data={"engine": engine}, headers=headers,
+        )
+    if response.status_code != 200:
+        raise RuntimeError(f"Yükleme başarısız ({path}): {response.text[:300]}")
+
+
+async def chat(client: httpx.AsyncClient, headers: dict, question: str) -> dict:
+    response = await client.post("/chat", json={"question": question}, headers=headers)
+    body = response.json() if response.status_code == 200 else {"error": response.text, "status": response.status_code}
+    if "error" in body:
+        raise RuntimeError(f"/chat başarısız ({question}): {str(body['error'])[:300]}")
+    return body
+
+
+async def bench_ingest(client, recorder: Recorder, config: dict, engine: str):
+    print("ingest")
+    headers = await start_session(client)
+    for fmt in config["formats"]:
+        limit = min(config["xlsx_max_rows"], XLSX_MAX_ROWS) if fmt == "xlsx" else None
+        for rows in config["sizes"]:
+            if limit is not None and rows > limit:
+                continue
+            path = dataset(rows, fmt)
+            samples = []
+            for _ in range(config["repeat"] if rows <= 100_000 else 1):
+                start = time.perf_counter()
+                await upload(client, headers, path, engine)
+                samples.append(time.perf_counter() - start)
+            elapsed = statistics.median(samples)
+            recorder.add(f"ingest.{fmt}.{rows}", elapsed)
+            recorder.add(f"ingest.{fmt}.{rows}.rows_per_s", rows / elapsed, unit="satır/s", better="higher")
+    await client.delete("/session/end", headers=headers)
+
+
+async def bench_schema(client, recorder: Recorder, headers: dict, config: dict):
+    from app.services.session_manager import session_store
+
+    print("schema")
+    manager = session_store.get_session(headers["X-Session-ID"]).db_manager
+    cold = []
+    for _ in range(config["repeat"]):
+        start = time.perf_counter()
+        response = await client.post("/schema/refresh", headers=headers)
+        cold.append(time.perf_counter() - start)
+        response.raise_for_status()
+    recorder.add("schema.cold", statistics.median(cold))
+
+    warm = []
+    for _ in range(config["repeat"] * 10):
+        start = time.perf_counter()
+        manager.get_schema_info()
+        warm.append(time.perf_counter() - start)
+    recorder.add("schema.warm", statistics.median(warm))
+
+
+async def bench_chat(client, recorder: Recorder, headers: dict, config: dict):
+    print("chat")
+    count = config["chat_requests"]
+    for name, template, expected_attempts in (("first_try", "bölge toplamı {}", 1), ("retry", "hatalı kolon {}", 2)):
+        samples, calls = [], ScriptedLLMClient.calls
+        for i in range(count):
+            start = time.perf_counter()
+            body = await chat(client, headers, template.format(1000 + i))
+            samples.append(time.perf_counter() - start)
+            attempts = body.get("usage", {}).get("attempts")
+            if attempts != expected_attempts:
+                raise RuntimeError(f"chat.{name}: {expected_attempts} deneme bekleniyordu, {attempts} oldu")
+        recorder.timings(f"chat.{name}", samples)
+        recorder.add(f"chat.{name}.llm_calls", (ScriptedLLMClient.calls - calls) / count, unit="çağrı", better="lower")
+
+    # Aynı soru tekrar tekrar: önbellek anahtarı son 3 turu içerdiği için birkaç tekrardan
+    # sonra bağlam sabitlenir ve SQL önbellekten gelir (LLM çağrılmaz)
+    for _ in range(4):
+        await chat(client, headers, "bölge toplamı 999")
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        body = await chat(client, headers, "bölge toplamı 999")
+        samples.append(time.perf_counter() - start)
+        if body.get("cache") != "hit":
+            raise RuntimeError(f"chat.cached: önbellek isabeti bekleniyordu, {body.get('cache')} oldu")
+    recorder.timings("chat.cached", samples)
+
+
+async def bench_export(client, recorder: Recorder, headers: dict, config: dict):
+    print("export")
+    rows = min(config["work_rows"], settings.EXPORT_MAX_ROWS)
+    for fmt in ("csv", "excel"):
+        samples, size = [], 0
+        for _ in range(config["repeat"]):
+            start = time.perf_counter()
+            response = await client.post("/export/result", json={"sql": "SELECT * FROM sales", "format": fmt}, headers=headers)
+            response.raise_for_status()
+            size = len(response.content)
+            samples.append(time.perf_counter() - start)
+        elapsed = statistics.median(samples)
+        recorder.add(f"export.{fmt}", elapsed, rows=rows, bytes=size)
+        recorder.add(f"export.{fmt}.rows_per_s", rows / elapsed, unit="satır/s", better="higher")
+
+
+async def bench_concurrent(client, recorder: Recorder, config: dict, engine: str):
+    print("concurrent")
+    path = dataset(config["work_rows"], "csv")
+    sessions = [await start_session(client) for _ in range(config["sessions"])]
+    for headers in sessions:
+        await upload(client, headers, path, engine)
+
+    latencies, codes = [], []
+
+    async def ask(i: int):
+        start = time.perf_counter()
+        response = await client.post("/chat", json={"question": f"aylık {i}"}, headers=sessions[i % len(sessions)])
+        latencies.append(time.perf_counter() - start)
+        codes.append(response.status_code)
+
+    total = config["concurrent_requests"]
+    start = time.perf_counter()
+    await asyncio.gather(*(ask(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+
+    recorder.add("concurrent.throughput", total / elapsed, unit="istek/s", better="higher")
+    recorder.timings("concurrent.latency", latencies)
+    recorder.add("concurrent.rejected", sum(1 for code in codes if code == 503), unit="istek", better="lower")
+    for headers in sessions:
+        await client.delete("/session/end", headers=headers)
+
+
+async def run_suite(config: dict, engine: str) -> dict:
+    from app.main import app
+
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await bench_ingest(client, recorder, config, engine)
+
+        headers = await start_session(client)
+        await upload(client, headers, dataset(config["work_rows"], "csv"), engine)
+        await bench_schema(client, recorder, headers, config)
+        await bench_chat(client, recorder, headers, config)
+        await bench_export(client, recorder, headers, config)
+        await client.delete("/session/end", headers=headers)
+
+        await bench_concurrent(client, recorder, config, engine)
+    return recorder.metrics
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def compare(metrics: dict, baseline: dict, tolerance: float, min_delta: float) -> list:
+    """Temel çizgiye göre kötüleşen metrikler: [(ad, temel, yeni, oran)]."""
+    regressions = []
+    print(f"\n{'metrik':<40}{'temel':>14}{'yeni':>14}{'değişim':>10}")
+    for name, base in baseline.get("metrics", {}).items():
+        current = metrics.get(name)
+        if current is None or not base["value"]:
+            continue
+        old, new = base["value"], current["value"]
+        change = new / old - 1
+        if base["better"] == "lower":
+            worse = change > tolerance and (base["unit"] != "s" or new - old > min_delta)
+        else:
+            worse = change < -tolerance
+        print(f"{name:<40}{old:>14.4f}{new:>14.4f}{change:>+9.0%}{'  <-- KÖTÜLEŞME' if worse else ''}")
+        if worse:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--sizes", help="Virgülle ayrılmış satır sayıları (profili ezer)")
+    parser.add_argument("--work-rows", type=int, help="chat/export/concurrent senaryolarının veri seti boyutu")
+    parser.add_argument("--engine", default=settings.UPLOAD_ENGINE)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Sahte LLM çağrısı başına gecikme (s)")
+    parser.add_argument("--llm-latency-per-token", type=float, default=0.0)
+    parser.add_argument("--output", help="Sonuçların yazılacağı JSON dosyası")
+    parser.add_argument("--baseline", help="Karşılaştırılacak temel çizgi JSON dosyası")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="İzin verilen kötüleşme oranı")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="Bundan küçük süre farkları (s) gürültü sayılır")
+    args = parser.parse_args()
+
+    config = dict(PROFILES[args.profile])
+    if args.sizes:
+        config["sizes"] = [int(value) for value in args.sizes.split(",")]
+    if args.work_rows:
+        config["work_rows"] = args.work_rows
+
+    settings.LLM_CLIENT = "benchmarks.fake_llm:ScriptedLLMClient"
+    IOStream.set_global_default(SilentIOStream())
+    logging.getLogger("autogen.oai.client").setLevel(logging.WARNING)
+    ScriptedLLMClient.configure(SCRIPT, latency=args.llm_latency, latency_per_token=args.llm_latency_per_token)
+
+    print(f"profil {args.profile}, motor {args.engine}, LLM gecikmesi {args.llm_latency}s")
+    metrics = asyncio.run(run_suite(config, args.engine))
+
+    report = {
+        "meta": {
+            "profile": args.profile,
+            "engine": args.engine,
+            "llm_latency": args.llm_latency,
+            "llm_latency_per_token": args.llm_latency_per_token,
+            "config": config,
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "metrics": metrics,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2, ensure_ascii=False, sort_keys=True)
+            handle.write("\n")
+        print(f"\nSonuçlar yazıldı: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        regressions = compare(metrics, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print(f"\n{len(regressions)} metrik temel çizgiye göre kötüleşti.")
+            sys.exit(1)
+        print("\nKötüleşme yok.")
+
+
+if __name__ == "__main__":
+    main()
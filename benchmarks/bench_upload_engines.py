@@ -0,0 +1,81 @@
+"""
+Yüklenen dosyalar için SQLite ve DuckDB motorlarını karşılaştırır.
+
+Kullanım:
+    python -m benchmarks.bench_upload_engines --rows 1000000
+
+Sentetik bir satış CSV'si üretilir, her iki motora yüklenir ve tipik
+GROUP BY / aggregate sorguları birkaç kez çalıştırılıp medyan süreleri yazdırılır.
+"""
+import argparse
+import io
+import random
+import statistics
+import time
+
+from app.services.db_service import DatabaseManager
+
+QUERIES = {
+    "group_by_region": "SELECT region, SUM(amount) AS total FROM sales GROUP BY region ORDER BY total DESC",
+    "monthly_avg": "SELECT substr(order_date, 1, 7) AS month, AVG(amount) AS avg_amount, COUNT(*) AS orders "
+                   "FROM sales GROUP BY month ORDER BY month",
+    "distinct_customers": "SELECT category, COUNT(DISTINCT customer_id) AS customers FROM sales GROUP BY category",
+    "filtered_top": "SELECT customer_id, SUM(amount) AS total FROM sales WHERE status = 'completed' "
+                    "GROUP BY customer_id ORDER BY total DESC LIMIT 10",
+}
+
+
+def make_csv(rows: int, seed: int = 42) -> bytes:
+    rng = random.Random(seed)
+    regions = ["Marmara", "Ege", "Akdeniz", "İç Anadolu", "Karadeniz", "Doğu Anadolu", "Güneydoğu"]
+    categories = ["Elektronik", "Giyim", "Gıda", "Kozmetik", "Kitap"]
+    statuses = ["completed", "cancelled", "pending"]
+    out = io.StringIO()
+    out.write("order_id,customer_id,region,category,status,order_date,amount\n")
+    for i in range(rows):
+        out.write(
+            f"{i},{rng.randint(1, rows // 10 + 1)},{rng.choice(regions)},{rng.choice(categories)},"
+            f"{rng.choice(statuses)},2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d},"
+            f"{rng.uniform(5, 5000):.2f}\n"
+        )
+    return out.getvalue().encode("utf-8")
+
+
+def bench_engine(kind: str, content: bytes, repeat: int) -> dict:
+    start = time.perf_counter()
+    manager, _ = DatabaseManager.from_file(content, "sales.csv", engine=kind)
+    ingest = time.perf_counter() - start
+
+    timings = {"ingest": ingest}
+    for name, sql in QUERIES.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = manager.execute_safe_query(sql, use_cache=False)
+            samples.append(time.perf_counter() - start)
+            if "error" in result:
+                raise RuntimeError(f"{kind}/{name}: {result['error']}")
+        timings[name] = statistics.median(samples)
+    manager.dispose()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--engines", default="sqlite,duckdb")
+    args = parser.parse_args()
+
+    content = make_csv(args.rows)
+    print(f"{args.rows} satır, {len(content) / 1e6:.1f} MB CSV")
+    results = {kind: bench_engine(kind, content, args.repeat) for kind in args.engines.split(",")}
+
+    kinds = list(results)
+    print(f"{'ölçüm':<22}" + "".join(f"{kind:>12}" for kind in kinds))
+    for name in results[kinds[0]]:
+        print(f"{name:<22}" + "".join(f"{results[kind][name] * 1000:>10.1f}ms" for kind in kinds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Çok worker'lı (uvicorn --workers N) çalışmada throughput ölçümü.
+
+Kullanım:
+    python -m benchmarks.bench_workers --workers 1 2 4 --sessions 8 --requests 200
+
+Her worker sayısı için ayrı bir uvicorn süreci SESSION_BACKEND=sqlite ile başlatılır;
+oturumlar ve yüklenen dosyalar tüm worker'lar arasında paylaşılır. Her oturuma bir
+CSV yüklenir, ardından CPU ağırlıklı /export/result (CSV) istekleri eşzamanlı
+gönderilir. İsteklerin hangi worker'lara dağıldığı /session/stats'taki worker_pid
+ile sayılır; 401 dönen istek olmamalıdır.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.bench_upload_engines import make_csv
+
+EXPORT_SQL = "SELECT * FROM sales"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, data_dir: str) -> subprocess.Popen:
+    env = dict(os.environ, SESSION_BACKEND="sqlite", SESSION_DATA_DIR=data_dir, SESSION_BACKEND_URL="")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+
+
+def wait_ready(base_url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(f"{base_url}/session/stats", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("Sunucu zamanında ayağa kalkmadı.")
+
+
+async def run_scenario(base_url: str, sessions: int, requests: int, rows: int, concurrency: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        content = make_csv(rows)
+        headers = []
+        for _ in range(sessions):
+            session_id = (await client.post("/session/start")).json()["session_id"]
+            header = {"X-Session-ID": session_id}
+            response = await client.post("/upload/file", files={"file": ("sales.csv", content)}, headers=header)
+            response.raise_for_status()
+            headers.append(header)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def export(i: int) -> int:
+            async with semaphore:
+                response = await client.post(
+                    "/export/result", json={"sql": EXPORT_SQL, "format": "csv"}, headers=headers[i % sessions]
+                )
+                return response.status_code
+
+        start = time.perf_counter()
+        codes = await asyncio.gather(*(export(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+        # Keep-alive bağlantısı hep aynı worker'a gider; her örnek için yeni bağlantı aç
+        pids = Counter()
+        for _ in range(min(requests, 50)):
+            response = await client.get("/session/stats", headers={"Connection": "close"})
+            pids[response.json()["worker_pid"]] += 1
+
+        for header in headers:
+            await client.delete("/session/end", headers=header)
+
+    return {
+        "elapsed": elapsed,
+        "throughput": requests / elapsed,
+        "codes": Counter(codes),
+        "workers_seen": len(pids),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"{args.requests} export isteği, {args.sessions} oturum, {args.rows} satır, CPU sayısı {os.cpu_count()}")
+    print(f"{'worker':<8}{'süre':>10}{'istek/sn':>12}{'görülen worker':>16}  durum kodları")
+    for workers in args.workers:
+        port = free_port()
+        with tempfile.TemporaryDirectory() as data_dir:
+            server = start_server(workers, port, data_dir)
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                wait_ready(base_url)
+                r = asyncio.run(run_scenario(base_url, args.sessions, args.requests, args.rows, args.concurrency))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+        print(f"{workers:<8}{r['elapsed']:>9.2f}s{r['throughput']:>12.2f}{r['workers_seen']:>16}  {dict(r['codes'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Ölçümler için sentetik satış veri setleri (CSV / XLSX), 10K'dan 10M satıra kadar.
+
+Kullanım:
+    python -m benchmarks.datasets --rows 10000,1000000 --formats csv,xlsx
+
+Dosyalar parça parça (vektörel) üretilip diske yazılır; 10M satırlık CSV bile bellekte
+tek parça olarak tutulmaz. Aynı (satır, biçim, tohum) için dosya bir kez üretilir ve
+BENCH_DATA_DIR dizininde (varsayılan: sistemin geçici dizini) yeniden kullanılır.
+Kolonlar bench_upload_engines.make_csv ile aynıdır.
+"""
+import argparse
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+REGIONS = np.array(["Marmara", "Ege", "Akdeniz", "İç Anadolu", "Karadeniz", "Doğu Anadolu", "Güneydoğu"])
+CATEGORIES = np.array(["Elektronik", "Giyim", "Gıda", "Kozmetik", "Kitap"])
+STATUSES = np.array(["completed", "cancelled", "pending"])
+# 2025'in ay/gün (1-28) kombinasyonları; tarih kolonu indeksle seçilir (satır başına biçimlendirme yok)
+DATES = np.array([f"2025-{month:02d}-{day:02d}" for month in range(1, 13) for day in range(1, 29)])
+
+CHUNK_ROWS = 250_000
+
+# Excel sayfasının satır sınırı (başlık satırı hariç)
+XLSX_MAX_ROWS = 1_048_575
+
+
+def data_dir() -> str:
+    path = os.getenv("BENCH_DATA_DIR") or os.path.join(tempfile.gettempdir(), "datachat-bench")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def frames(rows: int, seed: int = 42, chunk_rows: int = CHUNK_ROWS):
+    """Satış tablosunu chunk_rows'luk DataFrame parçaları olarak üretir (deterministik)."""
+    customers = rows // 10 + 1
+    for offset in range(0, rows, chunk_rows):
+        size = min(chunk_rows, rows - offset)
+        rng = np.random.default_rng([seed, offset])
+        yield pd.DataFrame({
+            "order_id": np.arange(offset, offset + size),
+            "customer_id": rng.integers(1, customers + 1, size),
+            "region": REGIONS[rng.integers(0, len(REGIONS), size)],
+            "category": CATEGORIES[rng.integers(0, len(CATEGORIES), size)],
+            "status": STATUSES[rng.integers(0, len(STATUSES), size)],
+            "order_date": DATES[rng.integers(0, len(DATES), size)],
+            "amount": np.round(rng.uniform(5, 5000, size), 2),
+        })
+
+
+def write_csv(path: str, rows: int, seed: int = 42):
+    with open(path, "w", encoding="utf-8", newline="") as handle:
+        for index, frame in enumerate(frames(rows, seed)):
+            frame.to_csv(handle, header=index == 0, index=False)
+
+
+def write_xlsx(path: str, rows: int, seed: int = 42):
+    if rows > XLSX_MAX_ROWS:
+        raise ValueError(f"XLSX en fazla {XLSX_MAX_ROWS:,} satır alabilir ({rows:,} istendi).")
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("sales")
+    header = True
+    for frame in frames(rows, seed):
+        if header:
+            sheet.append(list(frame.columns))
+            header = False
+        for row in frame.itertuples(index=False):
+            sheet.append([value.item() if hasattr(value, "item") else value for value in row])
+    workbook.save(path)
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx}
+
+
+def dataset(rows: int, fmt: str = "csv", seed: int = 42) -> str:
+    """Veri setinin yolunu döndürür; dosya yoksa üretir."""
+    if fmt not in WRITERS:
+        raise ValueError(f"Desteklenmeyen biçim: {fmt}")
+    path = os.path.join(data_dir(), f"sales_{rows}_{seed}.{fmt}")
+    if not os.path.exists(path):
+        partial = path + ".part"
+        WRITERS[fmt](partial, rows, seed)
+        os.replace(partial, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10000,100000,1000000,10000000")
+    parser.add_argument("--formats", default="csv")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for fmt in args.formats.split(","):
+        for rows in (int(value) for value in args.rows.split(",")):
+            path = dataset(rows, fmt, args.seed)
+            print(f"{fmt:<5}{rows:>12,} satır  {os.path.getsize(path) / 1e6:>9.1f} MB  {path}")
+
+
+if __name__ == "__main__":
+    main()
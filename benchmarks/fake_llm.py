@@ -0,0 +1,138 @@
+"""
+Ölçümler için Groq yerine kullanılan deterministik, yerel LLM istemcisi.
+
+Uygulamaya LLM_CLIENT ayarıyla takılır (autogen ModelClient olarak kaydedilir):
+    LLM_CLIENT=benchmarks.fake_llm:ScriptedLLMClient
+
+Soru, betikteki düzenli ifadelerle eşleştirilir ve eşleşen kuralın cevapları sırayla
+döndürülür: ilk mesaj için ilk cevap, her düzeltme isteği ("HATALI SQL") için bir
+sonraki cevap. Cevaplar str.format şablonudur; düzenli ifadenin adlandırılmış grupları
+yerine konur (örn. soruya göre değişen bir filtre değeri, sonuç önbelleğini atlatmak için).
+Kuralın isteğe bağlı "when" ifadesi mesajın tamamında aranır; örn. spekülatif adayların
+prompt'una eklenen "YAKLAŞIM: ..." ipucuna göre farklı cevap vermek için.
+Her çağrı 'latency' + 'latency_per_token' x (cevap token sayısı) saniye bekler.
+
+Ayrı bir süreçte (uvicorn) çalışırken betik ortam değişkenlerinden okunur:
+    FAKE_LLM_SCRIPT: [{"pattern": "...", "responses": ["SELECT ..."]}, ...] içeren JSON dosyası
+    FAKE_LLM_LATENCY, FAKE_LLM_LATENCY_PER_TOKEN: saniye
+"""
+import json
+import os
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+CHARS_PER_TOKEN = 3
+
+
+class ScriptedLLMClient:
+    """autogen ModelClient protokolünü uygulayan, betiklenmiş SQL döndüren istemci."""
+
+    script: List[Tuple[re.Pattern, Optional[re.Pattern], List[str]]] = []
+    default_response = "SELECT 1 AS sonuc"
+    latency = 0.0
+    latency_per_token = 0.0
+
+    # Tüm istemcilerin toplam çağrı sayısı (ölçümlerde LLM gidiş-dönüşlerini saymak için)
+    calls = 0
+    _calls_lock = threading.Lock()
+
+    @classmethod
+    def configure(
+        cls,
+        script: List[Dict[str, Any]],
+        latency: float = 0.0,
+        latency_per_token: float = 0.0,
+        default_response: Optional[str] = None,
+    ):
+        """Betiği ve gecikmeyi ayarlar: script = [{"pattern": regex, "when": regex?, "responses": [sql, ...]}, ...]."""
+        cls.script = [
+            (
+                re.compile(rule["pattern"], re.IGNORECASE),
+                re.compile(rule["when"], re.IGNORECASE) if rule.get("when") else None,
+                list(rule["responses"]),
+            )
+            for rule in script
+        ]
+        cls.latency = latency
+        cls.latency_per_token = latency_per_token
+        if default_response is not None:
+            cls.default_response = default_response
+        cls.calls = 0
+
+    @classmethod
+    def configure_from_env(cls):
+        path = os.getenv("FAKE_LLM_SCRIPT")
+        if not path:
+            return
+        with open(path, encoding="utf-8") as handle:
+            script = json.load(handle)
+        cls.configure(
+            script,
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0")),
+            latency_per_token=float(os.getenv("FAKE_LLM_LATENCY_PER_TOKEN", "0")),
+        )
+
+    def __init__(self, config: Dict[str, Any], **kwargs):
+        self.model = config.get("model", "scripted")
+        # Soru -> bu ajanın o soru için kaçıncı cevabı (ajanlar oturuma özel olduğundan
+        # aynı sorunun eşzamanlı farklı oturumlardaki denemeleri karışmaz)
+        self._attempts: Dict[str, int] = {}
+
+    def _respond(self, content: str) -> str:
+        match = re.search(r"SORU: (.*)", content)
+        question = match.group(1).strip() if match else content
+        attempt = self._attempts.get(question, -1) + 1 if "HATALI SQL:" in content else 0
+        self._attempts[question] = attempt
+
+        for pattern, when, responses in self.script:
+            found = pattern.search(question)
+            if found and (when is None or when.search(content)):
+                return responses[min(attempt, len(responses) - 1)].format(**found.groupdict())
+        return self.default_response
+
+    def create(self, params: Dict[str, Any]):
+        messages = params.get("messages") or []
+        content = str(messages[-1].get("content", "")) if messages else ""
+        sql = self._respond(content)
+
+        prompt_tokens = sum(len(str(message.get("content") or "")) for message in messages) // CHARS_PER_TOKEN + 1
+        completion_tokens = len(sql) // CHARS_PER_TOKEN + 1
+        delay = self.latency + self.latency_per_token * completion_tokens
+        if delay > 0:
+            time.sleep(delay)  # Gerçek LLM çağrısı gibi engelleyici
+        with self._calls_lock:
+            ScriptedLLMClient.calls += 1
+
+        message = SimpleNamespace(content=sql, function_call=None, tool_calls=None)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason="stop")],
+            model=self.model,
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ),
+            cost=0.0,
+        )
+
+    def message_retrieval(self, response) -> List[str]:
+        return [choice.message.content for choice in response.choices]
+
+    def cost(self, response) -> float:
+        return 0.0
+
+    @staticmethod
+    def get_usage(response) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+            "total_tokens": response.usage.total_tokens,
+            "cost": 0.0,
+            "model": response.model,
+        }
+
+
+ScriptedLLMClient.configure_from_env()
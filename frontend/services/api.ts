@@ -42,13 +42,20 @@ export interface SchemaResponse {
 }
 
 export interface VizSuggestion {
-  type: 'bar' | 'line' | 'pie' | 'table';
+  type: 'bar' | 'line' | 'pie' | 'histogram' | 'table';
   x_key?: string;
   y_key?: string;
   label_key?: string;
   value_key?: string;
   title?: string;
   explanation?: string;
+  // Sunucuda seyreltilmiş, çizime hazır seri (en fazla chart_points nokta)
+  data?: Record<string, any>[];
+  series?: {
+    method: 'lttb' | 'top_n' | 'histogram' | null;
+    source_rows: number;
+    points: number;
+  };
 }
 
 export interface ChatResponse {